@@ -0,0 +1,248 @@
+import queue
+import threading
+import time
+import traceback
+
+from engine import *
+import profiler
+import session
+import spatial
+
+# Runs a world on a thread of its own, so the GUI and the physics each go
+# at their own pace: a slow step doesn't freeze the window, and dragging
+# the window or typing doesn't stall the simulation.
+#
+# The thread owns the world. Any change to it is sent (see send()) as a
+# session.edit, or as a function of the world, and run between steps, in
+# the order sent. Edits are what a session.recorder logs. After
+# every run of steps, or of commands, the thread publishes a frame: a
+# read-only copy of what drawing and picking need. There are two frames in
+# play, the one the GUI last took and the one being built; a new frame is
+# a new object, so the GUI can go on drawing from the old one while the
+# thread fills in the next, and publishing is a swap of one reference.
+
+########################
+#       FRAMES         #
+########################
+
+class frame():
+    def __init__(self, sim, previous=None, hist=None):
+        # the lists are shared with the previous frame while the topology
+        # stays the same; they are tuples, so nobody can change them
+        if previous and previous.version == sim.version:
+            self.points = previous.points
+            self.links = previous.links
+            self.forces = previous.forces
+            self.point_index = previous.point_index
+            self.link_ends = previous.link_ends
+            self.force_points = previous.force_points
+        else:
+            self.points = tuple(sim.points)
+            self.links = tuple(sim.links)
+            self.forces = tuple(sim.forces)
+            # point -> its place in points and positions; not to be changed
+            self.point_index = {p: i for i, p in enumerate(self.points)}
+            # places in points of the ends of each link and of the point
+            # each force is on
+            index = self.point_index
+            self.link_ends = tuple([(index[l.p1], index[l.p2]) for l in self.links])
+            self.force_points = tuple([index[f.point] for f in self.forces])
+        self.floor = sim.floor
+        self.version = sim.version
+        self.time = sim.time
+        self.steps = sim.steps
+        self.dt = sim.dt
+
+        # (x, y) and (vx, vy) of each point, in the order of self.points
+        self.positions = tuple([(p.pos.x, p.pos.y) for p in sim.points])
+        self.velocities = tuple([(p.vel.x, p.vel.y) for p in sim.points])
+
+        self.history_range = (hist.first, hist.last_frame()) if hist else None
+        self.history_position = hist.position if hist else None
+        self.sleeping = sim.sleeper.num_sleeping() if sim.sleeper else 0
+        # text of the physics profiler and of the world's diagnostics,
+        # when there are any
+        self.hud = None
+        self.energy = None
+        # a spatial.pick_index with its grids built, see publish()
+        self.picker = None
+
+    def position_of(self):
+        # point -> (x, y)
+        return dict(zip(self.points, self.positions))
+
+    def position(self, p):
+        return self.positions[self.point_index[p]]
+
+########################
+#    PHYSICS THREAD    #
+########################
+
+# steps sim with stepper (an engine.fixed_stepper), capturing into hist
+# (a history.history) when given, or drives it from replay (a
+# trajectory.replayer) instead
+class physics_thread():
+    def __init__(self, sim, stepper, hist=None, replay=None, period=1/240, recorder=None):
+        self.sim = sim
+        self.stepper = stepper
+        self.hist = hist
+        self.replay = replay
+        # the thread sleeps out the rest of each period when it has time
+        # to spare, leaving it to the GUI
+        self.period = period
+
+        self.running = False
+        self.stopping = False
+        self.commands = queue.Queue()
+        # a session.recorder to log the edits to
+        self.recorder = recorder
+
+        # set to a profiler.profiler with profile(); it belongs to this
+        # thread and its text goes out with the frames
+        self.profiler = None
+        self.hud_every = 15
+        self.publishes = 0
+
+        self.lock = threading.Lock()
+        self.front = frame(sim, hist=hist)
+        self.front.picker = spatial.pick_index(self.front).build()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopping = True
+        self.commands.put(None)
+        self.thread.join()
+        if self.recorder:
+            self.recorder.close(self.sim)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def latest(self):
+        with self.lock:
+            return self.front
+
+    def send(self, command):
+        # a session.edit, or command(sim), runs on the physics thread
+        # before the next step
+        self.commands.put(command)
+
+    def set_running(self, running):
+        self.send(session.edit("run", on=running))
+
+    def run_edit(self, e):
+        event = e.resolve(self.sim, self)
+        if event is None:
+            return
+        if self.recorder:
+            self.recorder.log(self.sim.steps, event)
+        session.apply(self.sim, event, self)
+
+    # what session.apply() leaves to the owner of the world
+
+    def rewind(self, event):
+        self.hist.restore(event["frame"])
+
+    def camera(self, event):
+        pass
+
+    def profile(self, on):
+        # profile(True) times the engine's phases on this thread
+        def command(sim):
+            if on and not self.profiler:
+                self.profiler = profiler.profiler()
+            elif not on:
+                self.profiler = None
+            sim.profiler = self.profiler
+        self.send(command)
+
+    def wait(self):
+        # blocks until everything sent so far has run and been published
+        done = threading.Event()
+        def command(sim):
+            self.publish()
+            done.set()
+        self.send(command)
+        done.wait()
+
+    def run_commands(self, timeout=0):
+        # runs whatever is queued, waiting up to `timeout` for the first
+        # one; True if anything ran
+        try:
+            command = self.commands.get(timeout=timeout) if timeout > 0 else self.commands.get_nowait()
+        except queue.Empty:
+            return False
+
+        while command is not None:
+            try:
+                if isinstance(command, session.edit):
+                    self.run_edit(command)
+                else:
+                    command(self.sim)
+            except Exception:
+                # a bad edit shouldn't take the simulation down with it
+                traceback.print_exc()
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                break
+        return True
+
+    def advance(self, now):
+        if self.replay:
+            self.replay.advance(now - self.last)
+            return 1
+        steps = self.stepper.advance(now)
+        if steps and self.hist:
+            self.hist.capture()
+        return steps
+
+    def publish(self):
+        new = frame(self.sim, self.front, self.hist)
+        # the pick grids are built here rather than on the first click,
+        # which would hold up the GUI for as long as a build takes
+        new.picker = spatial.pick_index(new).build()
+        prof = self.profiler
+        if prof and prof.frames % self.hud_every == 0:
+            new.hud = prof.text()
+        elif prof:
+            new.hud = self.front.hud
+        diag = self.sim.diagnostics
+        if diag and (self.publishes % self.hud_every == 0 or not self.front.energy):
+            new.energy = diag.text()
+        elif diag:
+            new.energy = self.front.energy
+        self.publishes += 1
+        with self.lock:
+            self.front = new
+
+    def run(self):
+        self.last = time.perf_counter()
+        changed = True
+        while not self.stopping:
+            now = time.perf_counter()
+            prof = self.profiler
+            if prof:
+                prof.begin_frame(now)
+
+            stepped = 0
+            if self.running:
+                stepped = self.advance(now)
+            else:
+                self.stepper.reset()
+            self.last = now
+            if stepped or changed:
+                self.publish()
+
+            if prof:
+                t = time.perf_counter()
+                prof.add("physics", t - now)
+                prof.end_frame(t)
+            changed = self.run_commands(self.period - (time.perf_counter() - now))
@@ -0,0 +1,353 @@
+import argparse
+import copy
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+
+from engine import *
+from renderer import *
+from spatial import *
+import background
+import scenes
+
+########################
+#       TIMING         #
+########################
+
+# runs fn(n) with n growing until a run takes at least `budget` seconds,
+# returns (seconds per unit of n, n)
+def time_per(fn, budget=0.5, start=1, limit=10**7):
+    n = start
+    while True:
+        t = time.perf_counter()
+        fn(n)
+        elapsed = time.perf_counter() - t
+        if elapsed >= budget or n >= limit:
+            return elapsed / n, n
+        n = min(limit, max(n * 2, int(n * budget / max(elapsed, 1E-9) * 1.2)))
+
+########################
+#     BENCHMARKS       #
+########################
+
+def bench_step(sim, budget):
+    per, n = time_per(sim.step, budget)
+    return {"steps_per_sec": 1 / per, "ms_per_step": per * 1000, "repeats": n}
+
+def bench_link_forces(sim, budget):
+    links = sim.links
+
+    def run(n):
+        for i in range(n):
+            for l in links:
+                l.apply_force()
+        for p in sim.points:
+            p.clear_accel()
+
+    per, n = time_per(run, budget)
+    return {"ms_per_pass": per * 1000, "us_per_link": per * 1E6 / max(len(links), 1), "repeats": n}
+
+def bench_floor(sim, budget):
+    # everything resting on the floor is the expensive case
+    points = sim.points
+    floor = sim.floor or ground(0, "green", 0.5, 0.8)
+    saved = [p.pos.y for p in points]
+    for p in points:
+        p.pos.y = floor.height - 1
+
+    def run(n):
+        for i in range(n):
+            floor.apply_force(points, sim.dt, sim.gravity)
+        for p in points:
+            p.clear_accel()
+
+    per, n = time_per(run, budget)
+    for p, y in zip(points, saved):
+        p.pos.y = y
+    return {"ms_per_pass": per * 1000, "us_per_point": per * 1E6 / max(len(points), 1), "repeats": n}
+
+def bench_contacts(sim, budget):
+    import collision
+
+    c = collision.collider(sim)
+
+    def run(n):
+        for i in range(n):
+            c.apply(sim.points, sim.links, sim.dt)
+        for p in sim.points:
+            p.clear_accel()
+
+    per, n = time_per(run, budget)
+    return {"ms_per_pass": per * 1000, "us_per_point": per * 1E6 / max(len(sim.points), 1),
+            "contacts": c.contacts, "repeats": n}
+
+def bench_soa_step(sim, budget):
+    import soa
+
+    aw = soa.from_world(sim)
+    per, n = time_per(aw.step, budget)
+    return {"steps_per_sec": 1 / per, "ms_per_step": per * 1000, "repeats": n}
+
+def bench_parallel_step(sim, budget):
+    import os
+    import soa
+    import parallel
+
+    aw = soa.from_world(sim)
+    with parallel.parallel_stepper(aw) as ps:
+        per, n = time_per(ps.step, budget)
+    return {"steps_per_sec": 1 / per, "ms_per_step": per * 1000, "workers": os.cpu_count(),
+            "pieces": len(ps.pieces), "repeats": n}
+
+def bench_render(sim, budget, canvas):
+    cam = camera("bench", vec2(0, 0), 1, "active")
+    r = canvas_renderer(canvas, 900, 500)
+
+    t = time.perf_counter()
+    r.draw(sim, cam, point_labels="n")
+    first = time.perf_counter() - t
+
+    def idle(n):
+        for i in range(n):
+            r.draw(sim, cam, point_labels="n")
+
+    def moving(n):
+        for i in range(n):
+            sim.step()
+            r.draw(sim, cam, point_labels="n")
+
+    # whole scene in view, far enough out for the level-of-detail rules
+    xs = [p.pos.x for p in sim.points]
+    ys = [p.pos.y for p in sim.points]
+    far = camera("far", vec2((min(xs) + max(xs))/2, (min(ys) + max(ys))/2),
+                 max(max(xs) - min(xs), 1) / 800, "active")
+
+    def zoomed_out(n):
+        for i in range(n):
+            sim.step()
+            r.draw(sim, far, point_labels="n")
+
+    idle_per, idle_n = time_per(idle, budget)
+    step_per, _ = time_per(sim.step, budget / 2)
+    moving_per, moving_n = time_per(moving, budget)
+    far_per, _ = time_per(zoomed_out, budget)
+
+    canvas.delete("all")
+    return {"first_frame_ms": first * 1000,
+            "idle_frame_ms": idle_per * 1000,
+            "moving_frame_ms": max(moving_per - step_per, 0) * 1000,
+            "zoomed_out_frame_ms": max(far_per - step_per, 0) * 1000,
+            "repeats": moving_n}
+
+def bench_offscreen(sim, budget):
+    # the same frames as bench_render, drawn into pixels without Tk
+    import os
+    import offscreen
+
+    r = offscreen.offscreen_renderer(900, 500)
+    cam = camera("bench", vec2(0, 0), 1, "active")
+    far = offscreen.fit_camera(r.positions(sim), 900, 500)
+
+    def moving(n):
+        for i in range(n):
+            sim.step()
+            r.draw(sim, cam, point_labels="n")
+
+    def zoomed_out(n):
+        for i in range(n):
+            sim.step()
+            r.draw(sim, far)
+
+    def encode(n):
+        pixels = r.draw(sim, far)
+        for i in range(n):
+            offscreen.write_png(pixels, os.devnull)
+
+    step_per, _ = time_per(sim.step, budget / 2)
+    moving_per, n = time_per(moving, budget)
+    far_per, _ = time_per(zoomed_out, budget)
+    png_per, _ = time_per(encode, budget)
+    return {"moving_frame_ms": max(moving_per - step_per, 0) * 1000,
+            "zoomed_out_frame_ms": max(far_per - step_per, 0) * 1000,
+            "png_ms": png_per * 1000,
+            "repeats": n}
+
+def bench_pick(sim, budget):
+    rng = random.Random(1)
+    xs = [p.pos.x for p in sim.points]
+    ys = [p.pos.y for p in sim.points]
+    x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+    queries = [(rng.uniform(x0, x1), rng.uniform(y0, y1)) for i in range(1000)]
+    picker = pick_index(sim)
+
+    def rebuild(n):
+        for i in range(n):
+            picker.grids = {}
+            picker.grid("point")
+            picker.grid("link")
+
+    def query(n):
+        for i in range(n):
+            x, y = queries[i % len(queries)]
+            picker.closest_point(x, y)
+            picker.closest_link(x, y)
+
+    def moving(n):
+        # one published frame per step, with its grids built the way the
+        # physics thread does, and a click on each
+        view = None
+        for i in range(n):
+            sim.step()
+            view = background.frame(sim, view)
+            frame_picker = pick_index(view).build()
+            x, y = queries[i % len(queries)]
+            frame_picker.closest_point(x, y)
+
+    rebuild_per, _ = time_per(rebuild, budget)
+    query_per, n = time_per(query, budget)
+    step_per, _ = time_per(sim.step, budget / 2)
+    moving_per, _ = time_per(moving, budget)
+    return {"rebuild_ms": rebuild_per * 1000, "query_us": query_per * 1E6 / 2,
+            "moving_frame_ms": max(moving_per - step_per, 0) * 1000, "repeats": n}
+
+def bench_sleep(sim, budget, seconds=10):
+    # the same scene stepped with and without a sleeper; points that were
+    # put to sleep while still moving end up away from where they'd be
+    import islands
+
+    awake = copy.deepcopy(sim)
+    steps = int(seconds / sim.dt)
+    t = time.perf_counter()
+    awake.step(steps)
+    awake_time = time.perf_counter() - t
+
+    sim.sleeper = islands.sleeper(sim)
+    t = time.perf_counter()
+    sim.step(steps)
+    sleep_time = time.perf_counter() - t
+
+    xs = [p.pos.x for p in awake.points]
+    ys = [p.pos.y for p in awake.points]
+    size = max(max(xs) - min(xs), max(ys) - min(ys), 1E-9)
+    error = max(p.pos.dist(q.pos) for p, q in zip(sim.points, awake.points))
+    result = {"sleeping_points": sim.sleeper.num_sleeping(), "speedup": awake_time / sleep_time,
+              "max_error": error / size, "seconds": seconds}
+    sim.sleeper = None
+    return result
+
+def bench_edit(sim, budget):
+    # delete random points (with their links) and put them back
+    rng = random.Random(2)
+
+    def run(n):
+        for i in range(n):
+            p = sim.points[rng.randrange(len(sim.points))]
+            attached = sim.links_of(p)
+            sim.remove_point(p)
+            sim.add_point(p)
+            for l in attached:
+                sim.add_link(l)
+
+    per, n = time_per(run, budget)
+    return {"us_per_delete_and_restore": per * 1E6, "repeats": n}
+
+benchmarks = {"step": bench_step,
+              "link_forces": bench_link_forces,
+              "floor": bench_floor,
+              "contacts": bench_contacts,
+              "soa_step": bench_soa_step,
+              "parallel_step": bench_parallel_step,
+              "render": bench_render,
+              "offscreen": bench_offscreen,
+              "pick": bench_pick,
+              "sleep": bench_sleep,
+              "edit": bench_edit}
+
+def make_canvas():
+    # rendering needs a display; everything else runs without one
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception as e:
+        return None, str(e)
+
+    canvas = tkinter.Canvas(root, width=900, height=500)
+    canvas.pack()
+    return canvas, None
+
+########################
+#       RUNNER         #
+########################
+
+def run(scene_names, sizes, names, budget, log=None):
+    results = []
+    canvas, no_canvas = make_canvas() if "render" in names else (None, None)
+
+    for scene in scene_names:
+        for size in sizes:
+            sim = scenes.get_scene(scene + ":" + str(size))
+
+            for name in names:
+                row = {"scene": scene, "size": size, "n_points": len(sim.points),
+                       "n_links": len(sim.links), "benchmark": name}
+                try:
+                    if name == "render":
+                        if canvas is None:
+                            raise RuntimeError("no display: " + no_canvas)
+                        row.update(bench_render(sim, budget, canvas))
+                    else:
+                        row.update(benchmarks[name](sim, budget))
+                except ImportError as e:
+                    row["skipped"] = str(e)
+                except RuntimeError as e:
+                    row["skipped"] = str(e)
+
+                results.append(row)
+                if log:
+                    log(row)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time physics, rendering, picking and edits on generated scenes.")
+    parser.add_argument("-s", "--scenes", default="truss,chain,cloth,cranes",
+                        help="comma separated generators from scenes.py")
+    parser.add_argument("-n", "--sizes", default="100,1000,10000,100000",
+                        help="comma separated point counts")
+    parser.add_argument("-b", "--benchmarks", default=",".join(benchmarks),
+                        help="comma separated, any of: " + ", ".join(benchmarks))
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds to spend per measurement")
+    parser.add_argument("-o", "--out", default="benchmark.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks.split(",")
+    for name in names:
+        if not name in benchmarks:
+            parser.error("unknown benchmark '" + name + "'")
+
+    def log(row):
+        shown = {k: (round(v, 3) if isinstance(v, float) else v) for k, v in row.items()}
+        print(shown, file=sys.stderr)
+
+    results = run(args.scenes.split(","), [int(s) for s in args.sizes.split(",")],
+                  names, args.budget, log)
+
+    report = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "budget": args.budget,
+              "results": results}
+    try:
+        import numpy
+        report["numpy"] = numpy.__version__
+    except ImportError:
+        pass
+
+    with open(args.out, "w") as out:
+        json.dump(report, out, indent=1)
+
+if __name__ == "__main__":
+    main()
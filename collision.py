@@ -0,0 +1,267 @@
+import math
+
+from engine import *
+
+# Contact between points (discs of `radius`) and between points and the
+# links of other structures. Response is the floor's: the closing speed
+# along the contact normal is reflected with the floor's elasticity, and
+# sliding is resisted by friction with the floor's k as its coefficient.
+# The two sides are pushed apart by their overlap, split by inverse mass.
+# Static points, and points of islands a sleeper has put to rest, don't
+# move; touching a resting one wakes its island.
+
+########################
+#     BROAD PHASE      #
+########################
+
+def cell_of(x, y, cell):
+    return (math.floor(x / cell), math.floor(y / cell))
+
+def bin_points(points, cell):
+    cells = {}
+    for p in points:
+        key = cell_of(p.pos.x, p.pos.y, cell)
+        bucket = cells.get(key)
+        if bucket is None:
+            cells[key] = [p]
+        else:
+            bucket.append(p)
+    return cells
+
+def bin_links(links, cell, pad):
+    # a link goes in every cell its bounding box, grown by `pad`, touches,
+    # so finding the links near a point is a look at the point's own cell.
+    # Entries are (x0, y0, x1, y1, link) with that grown box, for a quick
+    # rejection before the exact test
+    floor = math.floor
+    cells = {}
+    for l in links:
+        a = l.p1.pos
+        b = l.p2.pos
+        x0 = min(a.x, b.x) - pad
+        y0 = min(a.y, b.y) - pad
+        x1 = max(a.x, b.x) + pad
+        y1 = max(a.y, b.y) + pad
+        entry = (x0, y0, x1, y1, l)
+        for cx in range(floor(x0 / cell), floor(x1 / cell) + 1):
+            for cy in range(floor(y0 / cell), floor(y1 / cell) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = [entry]
+                else:
+                    bucket.append(entry)
+    return cells
+
+neighbour_cells = [(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)]
+
+########################
+#      COLLIDER        #
+########################
+
+# sim.collider = collider(sim) turns contacts on; world.step() calls
+# apply() after the floor
+class collider():
+    def __init__(self, sim, radius=1, elasticity=None, k=None, link_cell=None):
+        self.sim = sim
+        self.radius = radius
+        # None takes the value from sim.floor when stepping
+        self.elasticity = elasticity
+        self.k = k
+
+        # points are binned at their diameter, so a 3x3 block of cells
+        # holds everything one can touch. Links are binned at about a link
+        # length so they don't spread over too many cells
+        self.point_cell = 2 * radius
+        if link_cell is None:
+            rest = [l.dist for l in sim.links]
+            link_cell = max(2 * radius, sum(rest) / len(rest) if rest else 0)
+        self.link_cell = link_cell
+
+        # grids of whatever a sleeper has put to rest, kept until the
+        # sleeper's active lists change
+        self.resting_key = None
+        self.resting_points = {}
+        self.resting_links = {}
+        # the same points binned at link_cell, to go over moving links
+        self.resting_points_coarse = {}
+
+        # contacts resolved in the last apply()
+        self.contacts = 0
+
+    def response(self):
+        floor = self.sim.floor
+        e = self.elasticity if self.elasticity is not None else (floor.elasticity if floor else 0.5)
+        k = self.k if self.k is not None else (floor.k if floor else 0.8)
+        return e, k
+
+    def update_resting(self):
+        sim = self.sim
+        sleeper = sim.sleeper
+        if not sleeper:
+            self.resting_key = None
+            self.resting_points = {}
+            self.resting_links = {}
+            self.resting_points_coarse = {}
+            return
+
+        key = (sleeper.active, sim.version)
+        if key == self.resting_key:
+            return
+        self.resting_key = key
+
+        island_of = sleeper.island_of
+        points = [p for p in sim.points if island_of[p].sleeping]
+        links = [l for l in sim.links if island_of[l.p1].sleeping]
+        self.resting_points = bin_points(points, self.point_cell)
+        self.resting_links = bin_links(links, self.link_cell, self.radius)
+        self.resting_points_coarse = bin_points(points, self.link_cell)
+
+    def linked(self, p, q):
+        for l in self.sim.point_links[p]:
+            if l.p1 is q or l.p2 is q:
+                return True
+        return False
+
+    def apply(self, points, links, dt):
+        # points and links are the ones being stepped: everything, or the
+        # awake part if there is a sleeper
+        self.update_resting()
+        point_cell = self.point_cell
+        link_cell = self.link_cell
+        r = self.radius
+        reach2 = 4 * r * r
+        e, k = self.response()
+        self.contacts = 0
+
+        moving_points = bin_points(points, point_cell)
+        moving_links = bin_links(links, link_cell, r)
+        resting_points = self.resting_points
+        resting_links = self.resting_links
+        order = {p: i for i, p in enumerate(points)}
+
+        for p in points:
+            x = p.pos.x
+            y = p.pos.y
+            cx, cy = cell_of(x, y, point_cell)
+            i = order[p]
+
+            for dx, dy in neighbour_cells:
+                key = (cx + dx, cy + dy)
+                for q in moving_points.get(key, ()):
+                    # each moving pair once
+                    if order[q] > i and (q.pos.x - x)**2 + (q.pos.y - y)**2 < reach2:
+                        self.point_point(p, q, False, e, k, dt)
+                if resting_points:
+                    for q in resting_points.get(key, ()):
+                        if (q.pos.x - x)**2 + (q.pos.y - y)**2 < reach2:
+                            self.point_point(p, q, True, e, k, dt)
+
+            key = cell_of(x, y, link_cell)
+            for x0, y0, x1, y1, l in moving_links.get(key, ()):
+                if x0 < x < x1 and y0 < y < y1:
+                    self.point_link(p, False, l, False, e, k, dt)
+            for x0, y0, x1, y1, l in resting_links.get(key, ()):
+                if x0 < x < x1 and y0 < y < y1:
+                    self.point_link(p, False, l, True, e, k, dt)
+
+        # resting points against moving links
+        coarse = self.resting_points_coarse
+        if coarse:
+            for key, cell_links in moving_links.items():
+                for q in coarse.get(key, ()):
+                    x = q.pos.x
+                    y = q.pos.y
+                    for x0, y0, x1, y1, l in cell_links:
+                        if x0 < x < x1 and y0 < y < y1:
+                            self.point_link(q, True, l, False, e, k, dt)
+
+    def point_point(self, p, q, q_resting, e, k, dt):
+        nx = p.pos.x - q.pos.x
+        ny = p.pos.y - q.pos.y
+        d2 = nx * nx + ny * ny
+        reach = 2 * self.radius
+        if d2 >= reach * reach or d2 == 0 or self.linked(p, q):
+            return
+
+        d = math.sqrt(d2)
+        self.resolve(((p, 1, False),), ((q, 1, q_resting),), nx / d, ny / d, reach - d, e, k, dt)
+
+    def point_link(self, p, p_resting, l, l_resting, e, k, dt):
+        a = l.p1
+        b = l.p2
+        if p is a or p is b:
+            return
+
+        ax = a.pos.x
+        ay = a.pos.y
+        ex = b.pos.x - ax
+        ey = b.pos.y - ay
+        length2 = ex * ex + ey * ey
+        if length2 == 0:
+            return
+
+        # closest point on the link; the ends are left to point_point
+        t = ((p.pos.x - ax) * ex + (p.pos.y - ay) * ey) / length2
+        if t <= 0 or t >= 1:
+            return
+
+        nx = p.pos.x - (ax + ex * t)
+        ny = p.pos.y - (ay + ey * t)
+        d2 = nx * nx + ny * ny
+        r = self.radius
+        if d2 >= r * r or d2 == 0:
+            return
+
+        d = math.sqrt(d2)
+        self.resolve(((p, 1, p_resting),), ((a, 1 - t, l_resting), (b, t, l_resting)),
+                     nx / d, ny / d, r - d, e, k, dt)
+
+    def resolve(self, side_a, side_b, nx, ny, overlap, e, k, dt):
+        # side_a and side_b are (point, weight, resting) tuples, the contact
+        # being the weighted sum of their points; (nx, ny) points from b
+        # to a
+        parts = []
+        w = 0
+        vx = 0
+        vy = 0
+        for sign, side in ((1, side_a), (-1, side_b)):
+            for p, weight, resting in side:
+                if resting:
+                    self.sim.sleeper.wake_point(p)
+                    inv = 0
+                else:
+                    inv = 0 if p.static else 1 / p.mass
+                vx += sign * weight * p.vel.x
+                vy += sign * weight * p.vel.y
+                w += weight * weight * inv
+                if inv:
+                    parts.append((p, sign * weight * inv))
+        if w == 0:
+            return
+        self.contacts += 1
+
+        # separate
+        s = overlap / w
+        for p, f in parts:
+            p.pos.x += nx * s * f
+            p.pos.y += ny * s * f
+
+        vn = vx * nx + vy * ny
+        if vn >= 0:
+            return
+
+        # normal impulse with the floor's bounce, friction impulse capped
+        # so it can stop the sliding but not reverse it
+        jn = -(1 + e) * vn / w
+        tx = -ny
+        ty = nx
+        vt = vx * tx + vy * ty
+        jt = -math.copysign(min(k * jn, abs(vt) / w), vt)
+
+        # applied as forces over this step; apply_force_xy divides by the
+        # mass, so the weight alone goes in here
+        ix = (jn * nx + jt * tx) / dt
+        iy = (jn * ny + jt * ty) / dt
+        for p, f in parts:
+            g = f * p.mass
+            p.apply_force_xy(ix * g, iy * g)
@@ -0,0 +1,387 @@
+import collections
+import csv
+import math
+from array import array
+
+from engine import *
+
+# Energy and momentum of a world over time, for checking that a run is
+# physically sane. With sim.diagnostics = diagnostics(sim), every `every`
+# steps one step of world.step() runs through the passes below instead of
+# the usual ones: they apply the same forces and integrate the same way,
+# and add up the totals while they are at it, so a sample costs a little
+# more than a step rather than another pass over everything.
+#
+# A sample is the state at the start of the step it was taken in:
+#   kinetic     sum of m v^2 / 2 over moving points
+#   gravity     sum of -m g.x over moving points (zero at the origin)
+#   spring      sum of k (length - rest)^2 / 2 over links
+#   force       sum of -F.x over constant forces on moving points
+#   total       the four above
+#   momentum_x, momentum_y
+# and, per link in world order, strain (length - rest) / rest and
+# tension k (length - rest), positive when stretched.
+#
+# Drag, the floor and contacts only take energy out, so the total should
+# never rise by much. It counts as blown up once it has risen above the
+# first sample by more than `max_gain` times the largest energy seen
+# (kinetic plus spring plus the size of the potentials), or stopped being
+# a number. `blown_up` is then the time it happened, and with stop=True
+# step() raises RuntimeError, for batch runs.
+
+########################
+#       TERMS          #
+########################
+
+def point_terms(points, gravity):
+    # (kinetic, gravity, momentum_x, momentum_y)
+    gx = gravity.x
+    gy = gravity.y
+    kinetic = 0
+    potential = 0
+    px = 0
+    py = 0
+    for p in points:
+        if p.static:
+            continue
+        m = p.mass
+        vx = p.vel.x
+        vy = p.vel.y
+        kinetic += m * (vx * vx + vy * vy)
+        potential -= m * (gx * p.pos.x + gy * p.pos.y)
+        px += m * vx
+        py += m * vy
+    return kinetic / 2, potential, px, py
+
+def link_terms(links):
+    # (spring, strains, tensions)
+    spring = 0
+    strains = array("d")
+    tensions = array("d")
+    for l in links:
+        a = l.p1.pos
+        b = l.p2.pos
+        stretch = math.hypot(b.x - a.x, b.y - a.y) - l.dist
+        t = l.k * stretch
+        spring += t * stretch
+        strains.append(stretch / l.dist if l.dist else 0)
+        tensions.append(t)
+    return spring / 2, strains, tensions
+
+def force_terms(forces):
+    potential = 0
+    for f in forces:
+        p = f.point
+        if not p.static:
+            potential -= f.force.x * p.pos.x + f.force.y * p.pos.y
+    return potential
+
+########################
+#     DIAGNOSTICS      #
+########################
+
+class diagnostics():
+    names = ("time", "steps", "kinetic", "gravity", "spring", "force", "total",
+             "momentum_x", "momentum_y")
+
+    def __init__(self, sim, every=10, history=10000, links=True, max_gain=0.5, stop=False):
+        self.sim = sim
+        self.every = every
+        # per-link series can be left out for very large worlds
+        self.links = links
+        self.max_gain = max_gain
+        self.stop = stop
+
+        # name -> the last `history` samples
+        self.series = {name: collections.deque(maxlen=history) for name in self.names}
+        # per sample: strains and tensions, and the links they are for
+        # (the same tuple while the topology doesn't change; None for an
+        # array_world, whose links are numbered)
+        self.strain = collections.deque(maxlen=history)
+        self.tension = collections.deque(maxlen=history)
+        self.link_lists = collections.deque(maxlen=history)
+        self.link_list = None
+        self.link_list_version = None
+        self.link_positions = {}
+
+        # total of the first sample, largest energy seen, and how far the
+        # total has risen above the first, relative to that
+        self.start = None
+        self.scale = 0
+        self.gain = 0
+        self.worst_gain = 0
+        self.blown_up = None
+
+        # sums of the sampled step in progress
+        self.current = None
+
+        # terms of what a sleeper has put to rest, kept until the
+        # sleeper's active lists change
+        self.resting_key = None
+        self.resting = None
+
+    def steps_to_sample(self):
+        return self.every - self.sim.steps % self.every
+
+    # the passes of a sampled step; world.measured_step() runs them in
+    # place of apply_forces(), apply_links() and integrate()
+
+    def forces_pass(self, forces):
+        potential = 0
+        for f in forces:
+            p = f.point
+            if not p.static:
+                potential -= f.force.x * p.pos.x + f.force.y * p.pos.y
+            f.apply()
+        self.current["force"] = potential
+
+    def links_pass(self, links):
+        spring = 0
+        strains = array("d")
+        tensions = array("d")
+        add_strain = strains.append
+        add_tension = tensions.append
+        for l in links:
+            p1 = l.p1
+            p2 = l.p2
+            dx = p2.pos.x - p1.pos.x
+            dy = p2.pos.y - p1.pos.y
+            length = math.hypot(dx, dy)
+            stretch = length - l.dist
+            t = l.k * stretch
+            spring += t * stretch
+            add_strain(stretch / l.dist if l.dist else 0)
+            add_tension(t)
+            if length == l.dist:
+                continue
+
+            s = t / length
+            p1.apply_force_xy(dx * s, dy * s)
+            p2.apply_force_xy(-dx * s, -dy * s)
+
+        current = self.current
+        current["spring"] = spring / 2
+        current["strain"] = strains
+        current["tension"] = tensions
+
+    def integrate_pass(self, sim, points):
+        dt = sim.dt
+        gravity = sim.gravity
+        drag_coeff = sim.drag_coeff
+        gx = gravity.x
+        gy = gravity.y
+        kinetic = 0
+        potential = 0
+        px = 0
+        py = 0
+
+        for p in points:
+            if not p.static:
+                m = p.mass
+                vx = p.vel.x
+                vy = p.vel.y
+                kinetic += m * (vx * vx + vy * vy)
+                potential -= m * (gx * p.pos.x + gy * p.pos.y)
+                px += m * vx
+                py += m * vy
+
+            p.apply_gravity(gravity)
+            p.apply_drag(drag_coeff)
+            p.update_vel(dt)
+            p.update_pos(dt)
+            p.clear_accel()
+
+        current = self.current
+        current["kinetic"] = kinetic / 2
+        current["gravity"] = potential
+        current["momentum_x"] = px
+        current["momentum_y"] = py
+
+    def begin(self, sim):
+        self.current = {"time": sim.time, "steps": sim.steps}
+
+    def end(self, sim, links):
+        # adds in whatever the sleeper left out of the step and records
+        current = self.current
+        self.current = None
+        strains = current.pop("strain")
+        tensions = current.pop("tension")
+
+        if links is not sim.links:
+            # only the awake part was stepped
+            kinetic, potential, spring, force, rest_strains, rest_tensions, rest_links = self.resting_terms()
+            current["kinetic"] += kinetic
+            current["gravity"] += potential
+            current["spring"] += spring
+            current["force"] += force
+            if self.links:
+                strains, tensions = self.merge(links, strains, tensions, rest_links, rest_strains, rest_tensions)
+
+        self.record(current, strains, tensions)
+
+    def resting_terms(self):
+        sim = self.sim
+        sleeper = sim.sleeper
+        key = (sleeper.active, sim.version)
+        if key != self.resting_key:
+            island_of = sleeper.island_of
+            points = [p for p in sim.points if island_of[p].sleeping]
+            links = [l for l in sim.links if island_of[l.p1].sleeping]
+            forces = [f for f in sim.forces if island_of[f.point].sleeping]
+            kinetic, potential, px, py = point_terms(points, sim.gravity)
+            spring, strains, tensions = link_terms(links)
+            self.resting = (kinetic, potential, spring, force_terms(forces), strains, tensions, links)
+            self.resting_key = key
+        return self.resting
+
+    def merge(self, links, strains, tensions, rest_links, rest_strains, rest_tensions):
+        # both parts back into world order
+        index = self.sim.link_index
+        n = len(self.sim.links)
+        all_strains = array("d", bytes(8 * n))
+        all_tensions = array("d", bytes(8 * n))
+        for part, s, t in ((links, strains, tensions), (rest_links, rest_strains, rest_tensions)):
+            for l, a, b in zip(part, s, t):
+                i = index[l]
+                all_strains[i] = a
+                all_tensions[i] = b
+        return all_strains, all_tensions
+
+    def measure(self):
+        # a sample of the current state in a pass of its own, for the
+        # integrators that don't go through measured_step(), and for
+        # array_worlds
+        sim = self.sim
+        current = {"time": sim.time, "steps": sim.steps}
+        if hasattr(sim, "link_lengths"):
+            strains, tensions = self.measure_arrays(sim, current)
+        else:
+            kinetic, potential, px, py = point_terms(sim.points, sim.gravity)
+            spring, strains, tensions = link_terms(sim.links)
+            current.update(kinetic=kinetic, gravity=potential, spring=spring, force=force_terms(sim.forces),
+                           momentum_x=px, momentum_y=py)
+        self.record(current, strains, tensions)
+
+    def measure_arrays(self, aw, current):
+        import numpy as np
+
+        moving = ~aw.static
+        m = aw.mass[moving]
+        pos = aw.pos[moving]
+        vel = aw.vel[moving]
+        g = aw.gravity
+        current["kinetic"] = float((m * (vel * vel).sum(axis=1)).sum()) / 2
+        current["gravity"] = -float((m * (pos @ g)).sum())
+        current["momentum_x"] = float((m * vel[:, 0]).sum())
+        current["momentum_y"] = float((m * vel[:, 1]).sum())
+
+        on = moving[aw.force_idx]
+        current["force"] = -float((aw.force_vec[on] * aw.pos[aw.force_idx[on]]).sum())
+
+        stretch = aw.link_lengths() - aw.rest
+        tensions = aw.k * stretch
+        current["spring"] = float((tensions * stretch).sum()) / 2
+        strains = np.divide(stretch, aw.rest, out=np.zeros_like(stretch), where=aw.rest != 0)
+        return strains, tensions
+
+    def record(self, current, strains, tensions):
+        sim = self.sim
+        kinetic = current["kinetic"]
+        total = kinetic + current["gravity"] + current["spring"] + current["force"]
+        current["total"] = total
+        for name in self.names:
+            self.series[name].append(current[name])
+
+        if self.links:
+            if not hasattr(sim, "link_lengths") and sim.version != self.link_list_version:
+                self.link_list = tuple(sim.links)
+                self.link_list_version = sim.version
+                self.link_positions = {}
+            self.strain.append(strains)
+            self.tension.append(tensions)
+            self.link_lists.append(self.link_list)
+
+        # blow-up check
+        size = kinetic + current["spring"] + abs(current["gravity"]) + abs(current["force"])
+        if self.start is None:
+            self.start = total
+        if size > self.scale:
+            self.scale = size
+        self.gain = (total - self.start) / self.scale if self.scale else 0
+        self.worst_gain = max(self.worst_gain, self.gain)
+
+        if self.blown_up is None and (not math.isfinite(total) or self.gain > self.max_gain):
+            self.blown_up = current["time"]
+            if self.stop:
+                raise RuntimeError("energy blew up at t = " + str(current["time"]) + " (step "
+                                   + str(current["steps"]) + ")")
+
+    ########################
+    #      READING         #
+    ########################
+
+    def latest(self):
+        # the last sample as a dict, with `gain`
+        if not self.series["time"]:
+            return None
+        result = {name: self.series[name][-1] for name in self.names}
+        result["gain"] = self.gain
+        return result
+
+    def link_series(self, link):
+        # (times, strains, tensions) of one link, over the samples it was
+        # in the world for. link is a link, or a link number for array_worlds
+        times = []
+        strains = []
+        tensions = []
+        for t, links, s, f in zip(self.series["time"], self.link_lists, self.strain, self.tension):
+            if links is None:
+                i = link
+            else:
+                positions = self.link_positions.get(id(links))
+                if positions is None or positions[0] is not links:
+                    positions = (links, {l: i for i, l in enumerate(links)})
+                    self.link_positions[id(links)] = positions
+                i = positions[1].get(link)
+                if i is None:
+                    continue
+            times.append(t)
+            strains.append(float(s[i]))
+            tensions.append(float(f[i]))
+        return times, strains, tensions
+
+    def max_strain(self):
+        # (strain, link) of the most strained link in the last sample,
+        # link being a number for array_worlds
+        if not self.strain or not len(self.strain[-1]):
+            return 0, None
+        strains = self.strain[-1]
+        i = max(range(len(strains)), key=lambda j: abs(strains[j]))
+        links = self.link_lists[-1]
+        return float(strains[i]), (links[i] if links is not None else i)
+
+    def text(self):
+        # a few lines for an on-screen overlay
+        s = self.latest()
+        if not s:
+            return "no samples yet"
+        lines = ["t %10.3f  energy gain %+.3f" % (s["time"], s["gain"]),
+                 "%-10s %14.4g" % ("total", s["total"])]
+        for name in ("kinetic", "gravity", "spring", "force"):
+            lines.append("%-10s %14.4g" % (name, s[name]))
+        lines.append("%-10s %+.3g, %+.3g" % ("momentum", s["momentum_x"], s["momentum_y"]))
+        if self.links:
+            strain, link = self.max_strain()
+            if link is not None:
+                name = link if isinstance(link, int) else link.get_name()
+                lines.append("%-10s %+.3g (%s)" % ("max strain", strain, name))
+        if self.blown_up is not None:
+            lines.append("BLOWN UP at t %.3f" % self.blown_up)
+        return "\n".join(lines)
+
+    def dump_csv(self, path):
+        # the totals, one row per sample
+        with open(path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(self.names)
+            writer.writerows(zip(*[self.series[name] for name in self.names]))
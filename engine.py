@@ -0,0 +1,728 @@
+import math
+import time
+from array import array
+
+from vector2 import *
+
+drag_coeff = 1E-5
+gravity = vec2(0, -9.81) # m/s^2
+
+########################
+#       GROUND         #
+########################
+
+class ground():
+    def __init__(self, height, color, elasticity, k):
+        self.height = height
+        self.color = color
+        self.elasticity = elasticity
+        self.k = k
+
+    def get_height(self):
+        return self.height
+
+    def get_color(self):
+        return self.color
+
+    def apply_force(self, points, dt, gravity=gravity):
+        height = self.height
+        bounce = -(self.elasticity + 1) / dt
+        friction = gravity.mag() * self.k
+        for p in points:
+            pos = p.pos
+            if pos.y > height:
+                continue
+
+            # normal force
+            if pos.y < height:
+                p.apply_force_xy(0, p.mass * p.vel.y * bounce)
+                p.accel += gravity
+                pos.y = height
+
+            # friction, against the direction of sliding
+            vx = p.vel.x
+            if vx > 0:
+                p.apply_force_xy(-p.mass * friction, 0)
+            elif vx < 0:
+                p.apply_force_xy(p.mass * friction, 0)
+
+########################
+#       LINK           #
+########################
+
+class rigid_link():
+    def __init__(self, name, p1, p2, color, k=1000):
+        self.name = name
+        self.p1 = p1
+        self.p2 = p2
+        self.dist = get_dist_between(p1, p2)
+        # spring coefficient
+        self.k = k
+        self.color = color
+
+    def get_k(self):
+        return self.k
+
+    def get_name(self):
+        return self.name
+
+    def get_color(self):
+        return self.color
+
+    def apply_force(self):
+        # spring force along the link, written out on the components so a
+        # step allocates nothing
+        pos1 = self.p1.pos
+        pos2 = self.p2.pos
+        dx = pos2.x - pos1.x
+        dy = pos2.y - pos1.y
+        length = math.hypot(dx, dy)
+        if length == self.dist:
+            return
+
+        s = self.k * (length - self.dist) / length
+        self.p1.apply_force_xy(dx * s, dy * s)
+        self.p2.apply_force_xy(-dx * s, -dy * s)
+
+    def get_midpoint(self):
+        return (self.p1.get_pos() + self.p2.get_pos())/2
+
+########################
+#     POINT MASS       #
+########################
+
+class point():
+    def __init__(self, name, pos, vel, color, mass=1, static=False):
+        self.name = name
+        # position and velocity are updated in place, so each point gets
+        # its own copies rather than sharing whatever it was given
+        self.pos = pos.copy()
+        self.vel = vel.copy()
+        self.accel = vec2()
+        self.mass = mass
+        self.static = static
+        self.color = color
+
+        self.limit_axis = None
+
+    def get_name(self):
+        return self.name
+    def get_pos(self):
+        return self.pos
+    def get_vel(self):
+        return self.vel
+    def get_mass(self):
+        return self.mass
+    def get_color(self):
+        return self.color
+
+    def get_unit_vector_towards(self, p2):
+        return (p2.pos - self.pos)/(p2.pos - self.pos).mag()
+
+    def get_vector_towards(self, p2):
+        if type(p2) is point:
+            return p2.pos - self.pos
+        else:
+            return p2 - self.pos
+
+    def clear_accel(self):
+        # call this every tick to not have residual forces from
+        # previous frame
+        self.accel.set(0, 0)
+
+    def apply_force(self, force):
+        self.accel.add_scaled(force, 1/self.mass)
+
+    def apply_force_xy(self, fx, fy):
+        accel = self.accel
+        accel.x += fx / self.mass
+        accel.y += fy / self.mass
+
+    def apply_gravity(self, gravity=gravity):
+        self.accel += gravity
+
+    def apply_drag(self, drag_coeff=drag_coeff):
+        # |v|^2 * c against the direction of motion
+        vel = self.vel
+        s = -math.hypot(vel.x, vel.y) * drag_coeff / self.mass
+        self.accel.add_scaled(vel, s)
+
+    def update_vel(self, dt):
+        vel = self.vel
+        if not self.static:
+            vel.add_scaled(self.accel, dt)
+
+        axis = self.limit_axis
+        if axis:
+            d = vel.dot(axis)
+            vel.set(axis.x * d, axis.y * d)
+
+    def update_pos(self, dt):
+        if not self.static:
+            self.pos.add_scaled(self.vel, dt)
+
+    def set_limit_axis(self, vec):
+        if vec == "x":
+            self.limit_axis = vec2(1,0)
+        elif vec == "y":
+            self.limit_axis = vec2(0, 1)
+        else:
+            self.limit_axis = vec.normalized()
+
+########################
+#    CONSTANT FORCE    #
+########################
+
+class const_force():
+    def __init__(self, name, point, force):
+        self.name = name
+        self.point = point
+        self.force = force
+
+    def apply(self):
+        self.point.apply_force(self.force)
+
+def get_dist_between(p1, p2):
+    if type(p1) is point:
+        p1 = p1.pos
+    if type(p2) is point:
+        p2 = p2.pos
+    return p1.dist(p2)
+
+########################
+#      SNAPSHOTS       #
+########################
+
+# everything a step reads or writes, so restoring one puts the world back
+# exactly. Points, links and forces are kept by reference (a restore
+# brings back deleted ones), their state by value in flat arrays
+class snapshot():
+    def __init__(self, sim):
+        self.points = list(sim.points)
+        self.links = list(sim.links)
+        self.forces = list(sim.forces)
+
+        # x, y, vx, vy per point
+        state = array("d")
+        for p in self.points:
+            state.extend((p.pos.x, p.pos.y, p.vel.x, p.vel.y))
+        self.state = state
+        self.point_attrs = [(p.mass, p.static, p.limit_axis) for p in self.points]
+        # rest length, k per link
+        self.link_state = array("d")
+        for l in self.links:
+            self.link_state.extend((l.dist, l.k))
+        # fx, fy per force
+        self.force_state = array("d")
+        for f in self.forces:
+            self.force_state.extend((f.force.x, f.force.y))
+
+        self.time = sim.time
+        self.steps = sim.steps
+
+    def nbytes(self):
+        # roughly, for keeping an eye on history size
+        return (self.state.itemsize * (len(self.state) + len(self.link_state) + len(self.force_state))
+                + 8 * 5 * len(self.points) + 8 * (len(self.links) + len(self.forces)))
+
+def run_until_adaptive(sim, t, max_steps=None):
+    # for either kind of world: the last step is shortened to land on t,
+    # and the step size control carries on from the unshortened one
+    steps = 0
+    while sim.time < t - 1E-12 and (max_steps is None or steps < max_steps):
+        dt = sim.dt
+        rejected = sim.rejected_steps
+        if sim.time + dt > t:
+            sim.dt = t - sim.time
+        sim.step()
+        if sim.rejected_steps == rejected:
+            sim.dt = max(sim.dt, dt)
+        steps += 1
+
+def load_states(points, states):
+    # (x, y, vx, vy) per point back into the points
+    for p, (x, y, vx, vy) in zip(points, states):
+        p.pos.set(x, y)
+        p.vel.set(vx, vy)
+
+# O(1) removal from a list whose order doesn't matter: the last element
+# takes the removed one's slot
+def swap_remove(lst, index, obj):
+    i = index.pop(obj)
+    last = lst.pop()
+    if not last is obj:
+        lst[i] = last
+        index[last] = i
+
+# step size control for the "adaptive" integrator. The step doubling
+# error of a first order method goes with dt^2, so the step that would
+# just meet the tolerance is dt * sqrt(tol/err); aim a bit under it and
+# change by at most 5x down or 1.5x up per step, since a rejected step
+# costs three wasted ones
+def next_dt(dt, err, tol, dt_min, dt_max):
+    factor = 0.8 * math.sqrt(tol / err) if err else 1.5
+    return min(max(dt * min(max(factor, 0.2), 1.5), dt_min), dt_max)
+
+########################
+#       WORLD          #
+########################
+
+# owns everything the physics needs and nothing the GUI needs, so it
+# can be stepped on machines without a display
+class world():
+    def __init__(self, points=None, links=None, forces=None, floor=None,
+                 dt=0.0025, gravity=None, drag_coeff=drag_coeff, integrator="explicit"):
+        self.points = points if points is not None else []
+        self.links = links if links is not None else []
+        self.forces = forces if forces is not None else []
+        self.floor = floor
+
+        self.dt = dt
+        self.gravity = gravity if gravity is not None else vec2(0, -9.81)
+        self.drag_coeff = drag_coeff
+
+        # "explicit" is the semi-implicit Euler below. "implicit" is
+        # backward Euler on the link springs (needs NumPy, see implicit.py)
+        # and stays stable at much larger dt. "adaptive" is the explicit
+        # step with dt chosen every step by step doubling: one step of dt
+        # against two of dt/2, retried smaller while the two disagree by
+        # more than `tolerance` (in length units, velocities times dt)
+        self.integrator = integrator
+        self.tolerance = 1E-2
+        self.dt_min = 1E-5
+        self.dt_max = 0.05
+        # dt of the last accepted adaptive step (self.dt is the next try),
+        # and how many tries were thrown away so far
+        self.last_dt = dt
+        self.rejected_steps = 0
+
+        # set to a profiler.profiler to time each phase of step()
+        self.profiler = None
+        # set to an islands.sleeper to stop stepping structures that have
+        # come to rest (not with the implicit integrator)
+        self.sleeper = None
+        # set to a collision.collider for contacts between points and links
+        # (not with the implicit integrator)
+        self.collider = None
+        # set to a diagnostics.diagnostics to sample energy and momentum
+        self.diagnostics = None
+
+        self.time = 0
+        self.steps = 0
+        # bumped on every add/remove, so whoever caches anything about the
+        # topology (renderers, indices) can tell when to rebuild
+        self.version = 0
+        # the soa.array_world the implicit integrator steps, and the
+        # version it was built at. Only positions and velocities go back
+        # and forth between steps; masses, link constants and the like
+        # are read again when the topology changes, on reindex() and on
+        # restore()
+        self.implicit_world = None
+        self.implicit_version = None
+
+        self.reindex()
+
+    def reindex(self):
+        # rebuild the index and adjacency tables from the lists; only
+        # needed if the lists were edited directly instead of through
+        # add_*/remove_*
+        self.point_index = {p: i for i, p in enumerate(self.points)}
+        self.link_index = {l: i for i, l in enumerate(self.links)}
+        self.force_index = {f: i for i, f in enumerate(self.forces)}
+
+        # point -> its links / forces, as insertion-ordered dicts used as sets
+        self.point_links = {p: {} for p in self.points}
+        self.point_forces = {p: {} for p in self.points}
+        for l in self.links:
+            self.point_links[l.p1][l] = None
+            self.point_links[l.p2][l] = None
+        for f in self.forces:
+            self.point_forces[f.point][f] = None
+
+        self.version += 1
+
+    def add_point(self, p):
+        self.point_index[p] = len(self.points)
+        self.points.append(p)
+        self.point_links[p] = {}
+        self.point_forces[p] = {}
+        self.version += 1
+        return p
+
+    def remove_point(self, p):
+        # links and forces hanging on the point go with it
+        for l in list(self.point_links[p]):
+            self.remove_link(l)
+        for f in list(self.point_forces[p]):
+            self.remove_force(f)
+
+        swap_remove(self.points, self.point_index, p)
+        del self.point_links[p]
+        del self.point_forces[p]
+        self.version += 1
+
+    def add_link(self, l):
+        self.link_index[l] = len(self.links)
+        self.links.append(l)
+        self.point_links[l.p1][l] = None
+        self.point_links[l.p2][l] = None
+        self.version += 1
+        return l
+
+    def remove_link(self, l):
+        swap_remove(self.links, self.link_index, l)
+        self.point_links[l.p1].pop(l, None)
+        self.point_links[l.p2].pop(l, None)
+        self.version += 1
+
+    def add_force(self, f):
+        self.force_index[f] = len(self.forces)
+        self.forces.append(f)
+        self.point_forces[f.point][f] = None
+        self.version += 1
+        return f
+
+    def remove_force(self, f):
+        swap_remove(self.forces, self.force_index, f)
+        self.point_forces[f.point].pop(f, None)
+        self.version += 1
+
+    def checkpoint(self):
+        return snapshot(self)
+
+    def restore(self, snap):
+        # topology first, only if it changed since the snapshot
+        if self.points != snap.points or self.links != snap.links or self.forces != snap.forces:
+            self.points[:] = snap.points
+            self.links[:] = snap.links
+            self.forces[:] = snap.forces
+            self.reindex()
+
+        state = snap.state
+        for i, p in enumerate(self.points):
+            j = 4 * i
+            p.pos.set(state[j], state[j + 1])
+            p.vel.set(state[j + 2], state[j + 3])
+            p.mass, p.static, p.limit_axis = snap.point_attrs[i]
+            p.clear_accel()
+        for i, l in enumerate(self.links):
+            l.dist = snap.link_state[2 * i]
+            l.k = snap.link_state[2 * i + 1]
+        for i, f in enumerate(self.forces):
+            f.force = vec2(snap.force_state[2 * i], snap.force_state[2 * i + 1])
+
+        self.time = snap.time
+        self.steps = snap.steps
+        self.implicit_world = None
+
+        # sleeping islands may not be at rest any more
+        if self.sleeper:
+            self.sleeper.wake_all()
+
+    def links_of(self, p):
+        return list(self.point_links[p])
+
+    def forces_of(self, p):
+        return list(self.point_forces[p])
+
+    def degree(self, p):
+        return len(self.point_links[p])
+
+    def neighbours(self, p):
+        result = []
+        for l in self.point_links[p]:
+            result.append(l.p2 if l.p1 is p else l.p1)
+        return result
+
+    # the phases of one explicit step, in order. Each works on the lists
+    # it is given, which are the world's own unless a sleeper has taken
+    # resting islands out
+    def apply_floor(self, points):
+        if self.floor:
+            self.floor.apply_force(points, self.dt, self.gravity)
+
+    def apply_contacts(self, points, links):
+        if self.collider:
+            self.collider.apply(points, links, self.dt)
+
+    def apply_forces(self, forces):
+        for f in forces:
+            f.apply()
+
+    def apply_links(self, links):
+        for l in links:
+            l.apply_force()
+
+    def integrate(self, points):
+        dt = self.dt
+        gravity = self.gravity
+        drag_coeff = self.drag_coeff
+
+        for p in points:
+            p.apply_gravity(gravity)
+            p.apply_drag(drag_coeff)
+            p.update_vel(dt)
+            p.update_pos(dt)
+            p.clear_accel()
+
+    def explicit_step(self, points, links, forces):
+        self.apply_floor(points)
+        self.apply_contacts(points, links)
+        self.apply_forces(forces)
+        self.apply_links(links)
+        self.integrate(points)
+
+    def measured_step(self, points, links, forces):
+        # explicit_step() that also takes a diagnostics sample on the way
+        diag = self.diagnostics
+        diag.begin(self)
+        self.apply_floor(points)
+        self.apply_contacts(points, links)
+        diag.forces_pass(forces)
+        diag.links_pass(links)
+        diag.integrate_pass(self, points)
+        diag.end(self, links)
+
+    def step(self, n=1):
+        diag = self.diagnostics
+        if self.integrator == "implicit":
+            # samples in a pass of their own between stretches of steps
+            while diag and n > 0:
+                if self.steps % diag.every == 0:
+                    diag.measure()
+                run = min(n, diag.steps_to_sample())
+                self.step_implicit(run)
+                n -= run
+            if n > 0:
+                self.step_implicit(n)
+            return
+
+        # with a sleeper, steps run in stretches between its checks, and
+        # with diagnostics, each stretch starts with the sampled step. A
+        # contact that wakes an island ends the stretch after that step,
+        # so the next one steps the island too; the same steps come out
+        # however they are split into step() calls
+        sleeper = self.sleeper
+        while n > 0:
+            start = self.steps
+            if sleeper:
+                sleeper.sync()
+                run = min(n, sleeper.steps_to_check())
+                active = sleeper.active
+                points, links, forces = active
+            else:
+                run = n
+                points, links, forces = self.points, self.links, self.forces
+
+            if diag:
+                run = min(run, diag.steps_to_sample())
+                if self.steps % diag.every == 0:
+                    if self.integrator == "adaptive":
+                        diag.measure()
+                    else:
+                        self.step_measured(points, links, forces)
+                        run -= 1
+
+            if sleeper and sleeper.active is not active:
+                # the sampled step woke an island
+                run = 0
+            if self.integrator == "adaptive":
+                self.step_adaptive(run, points, links, forces)
+            elif self.profiler:
+                self.step_profiled(run, points, links, forces)
+            else:
+                for i in range(run):
+                    self.explicit_step(points, links, forces)
+
+                    self.steps += 1
+                    self.time += self.dt
+                    if sleeper and sleeper.active is not active:
+                        break
+
+            n -= self.steps - start
+            if sleeper:
+                sleeper.update()
+
+    def step_measured(self, points, links, forces):
+        # one sampled step, timed as a whole if there is a profiler
+        prof = self.profiler
+        if prof:
+            t = time.perf_counter()
+        self.measured_step(points, links, forces)
+        self.steps += 1
+        self.time += self.dt
+        if prof:
+            prof.add("diagnostics", time.perf_counter() - t)
+            prof.count("steps")
+            prof.count("points_stepped", len(points))
+
+    def step_profiled(self, n, points, links, forces):
+        # same as step(), timing each phase into self.profiler
+        clock = time.perf_counter
+        timings = [0, 0, 0, 0, 0]
+        phases = ((self.apply_floor, (points,)), (self.apply_contacts, (points, links)),
+                  (self.apply_forces, (forces,)), (self.apply_links, (links,)), (self.integrate, (points,)))
+
+        sleeper = self.sleeper
+        active = sleeper.active if sleeper else None
+        start = self.steps
+        for i in range(n):
+            for j, (phase, args) in enumerate(phases):
+                t = clock()
+                phase(*args)
+                timings[j] += clock() - t
+
+            self.steps += 1
+            self.time += self.dt
+            if sleeper and sleeper.active is not active:
+                break
+        n = self.steps - start
+
+        prof = self.profiler
+        for name, seconds in zip(("floor", "contacts", "const_forces", "links", "integrate"), timings):
+            if name != "contacts" or self.collider:
+                prof.add(name, seconds)
+        prof.count("steps", n)
+        prof.count("points_stepped", len(points) * n)
+
+    def step_adaptive(self, n, points, links, forces):
+        rejected = self.rejected_steps
+        sleeper = self.sleeper
+        active = sleeper.active if sleeper else None
+        start = self.steps
+        for i in range(n):
+            if sleeper and sleeper.active is not active:
+                break
+            saved = [(p.pos.x, p.pos.y, p.vel.x, p.vel.y) for p in points]
+            h = saved_dt = self.dt
+            while True:
+                self.dt = h
+                self.explicit_step(points, links, forces)
+                full = [(p.pos.x, p.pos.y, p.vel.x, p.vel.y) for p in points]
+
+                load_states(points, saved)
+                self.dt = h / 2
+                self.explicit_step(points, links, forces)
+                self.explicit_step(points, links, forces)
+
+                err = 0
+                for p, (x, y, vx, vy) in zip(points, full):
+                    pos = p.pos
+                    vel = p.vel
+                    err = max(err, abs(pos.x - x), abs(pos.y - y), h * abs(vel.x - vx), h * abs(vel.y - vy))
+
+                if err <= self.tolerance or h <= self.dt_min:
+                    break
+                self.rejected_steps += 1
+                h = next_dt(h, err, self.tolerance, self.dt_min, h)
+                load_states(points, saved)
+
+            # keep the two half steps, they are the better estimate. After
+            # a rejection, don't grow straight back into it
+            self.last_dt = h
+            self.dt = next_dt(h, err, self.tolerance, self.dt_min, h if h < saved_dt else self.dt_max)
+            self.steps += 1
+            self.time += h
+
+        if self.profiler:
+            self.profiler.count("steps", self.steps - start)
+            self.profiler.count("rejected_steps", self.rejected_steps - rejected)
+
+    def step_implicit(self, n):
+        import soa
+
+        if self.sleeper or self.collider:
+            raise ValueError("the implicit integrator doesn't do sleeping or contacts")
+        prof = self.profiler
+        if prof:
+            t = time.perf_counter()
+
+        aw = self.implicit_world
+        if aw is None or self.implicit_version != self.version:
+            aw = self.implicit_world = soa.from_world(self)
+            self.implicit_version = self.version
+        else:
+            aw.load(self)
+        aw.step(n)
+        aw.sync()
+
+        self.time = aw.time
+        self.steps = aw.steps
+        if prof:
+            prof.add("implicit", time.perf_counter() - t)
+            prof.count("steps", n)
+            prof.count("points_stepped", len(self.points) * n)
+
+    def run_until(self, t, max_steps=None):
+        if self.integrator == "adaptive":
+            run_until_adaptive(self, t, max_steps)
+            return
+
+        # steps are never cut short, so the world ends at or just past t
+        n = math.ceil((t - self.time)/self.dt - 1E-9)
+        if max_steps is not None:
+            n = min(n, max_steps)
+        if n > 0:
+            self.step(n)
+
+########################
+#    FIXED STEPPER     #
+########################
+
+# decouples physics from frame rate: each advance() runs however many
+# fixed-size sim.dt steps fit in the wall-clock time since the last call
+# (or exactly `substeps` of them if that is set), so a slow renderer no
+# longer slows down the simulation and stiff links keep their small dt
+class fixed_stepper():
+    def __init__(self, sim, substeps=None, max_steps=400, time_scale=1):
+        self.sim = sim
+        self.substeps = substeps
+        # cap on catch-up steps per call, so a long stall doesn't make the
+        # next frame take even longer
+        self.max_steps = max_steps
+        self.time_scale = time_scale
+
+        self.accumulator = 0
+        self.last = None
+        self.dropped_time = 0
+
+    def reset(self):
+        # forget elapsed time, e.g. while paused
+        self.accumulator = 0
+        self.last = None
+
+    def advance(self, now=None):
+        if now is None:
+            now = time.perf_counter()
+
+        if self.last is None:
+            self.last = now
+        elapsed = now - self.last
+        self.last = now
+
+        sim = self.sim
+        if sim.integrator == "adaptive" and not self.substeps:
+            # steps don't have a fixed length, so go by time instead
+            target = sim.time + elapsed * self.time_scale
+            steps = sim.steps
+            sim.run_until(target, self.max_steps)
+            self.dropped_time += max(target - sim.time, 0)
+            return sim.steps - steps
+
+        dt = self.sim.dt
+        if self.substeps:
+            n = self.substeps
+        else:
+            self.accumulator += elapsed * self.time_scale
+            n = int(self.accumulator / dt)
+            self.accumulator -= n * dt
+
+        if n > self.max_steps:
+            if not self.substeps:
+                self.dropped_time += (n - self.max_steps) * dt
+            n = self.max_steps
+
+        if n > 0:
+            self.sim.step(n)
+
+        return n
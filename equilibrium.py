@@ -0,0 +1,177 @@
+import numpy as np
+
+from engine import *
+import soa
+from implicit import link_stiffness, conjugate_gradient, constraint_projector, constraint_basis
+
+########################
+#     EQUILIBRIUM      #
+########################
+
+# resting shape of a structure found directly instead of by running
+# damped dynamics until it stops moving
+class equilibrium():
+    def __init__(self, aw, points, links, pos, tension, iterations, residual, converged):
+        # the array_world that was solved, and the world's point and link
+        # objects when it was built from one
+        self.aw = aw
+        self.points = points
+        self.links = links
+        # link -> its place in links
+        self.link_index = {l: i for i, l in enumerate(links)} if links is not None else None
+        # (N, 2) equilibrium positions, same order as points
+        self.pos = pos
+        # per link k * (length - rest length), positive means the link is
+        # being pulled apart, same order as links
+        self.tension = tension
+        self.iterations = iterations
+        self.residual = residual
+        self.converged = converged
+
+    def get_tension(self, link):
+        # link is a rigid_link, or a link number for an array_world
+        if isinstance(link, rigid_link):
+            if self.links is None:
+                raise ValueError("links of an array_world are asked for by number")
+            return self.tension[self.link_index[link]]
+        return self.tension[link]
+
+    def apply(self):
+        # move the points to their equilibrium positions, at rest
+        if self.points is None:
+            self.aw.pos[:] = self.pos
+            self.aw.vel[:] = 0
+            return
+        for p, (x, y) in zip(self.points, self.pos.tolist()):
+            p.pos.set(x, y)
+            p.vel.set(0, 0)
+
+def static_forces(aw, pos):
+    # everything that still acts on a structure at rest: link springs,
+    # gravity and constant forces. Floor contact and drag are left out.
+    n = len(pos)
+    f = aw.mass[:, None] * aw.gravity
+
+    if len(aw.force_idx):
+        f[:, 0] += np.bincount(aw.force_idx, weights=aw.force_vec[:, 0], minlength=n)
+        f[:, 1] += np.bincount(aw.force_idx, weights=aw.force_vec[:, 1], minlength=n)
+
+    if len(aw.link_i):
+        d = pos[aw.link_j] - pos[aw.link_i]
+        length = np.hypot(d[:, 0], d[:, 1])
+        scale = np.divide(aw.k * (length - aw.rest), length, out=np.zeros_like(length), where=length > 0)
+        lf = d * scale[:, None]
+        f[:, 0] += np.bincount(aw.link_i, weights=lf[:, 0], minlength=n) - np.bincount(aw.link_j, weights=lf[:, 0], minlength=n)
+        f[:, 1] += np.bincount(aw.link_i, weights=lf[:, 1], minlength=n) - np.bincount(aw.link_j, weights=lf[:, 1], minlength=n)
+
+    return f
+
+def potential_energy(aw, pos):
+    # spring energy plus the work potential of gravity and constant forces
+    energy = -(aw.mass[:, None] * aw.gravity * pos).sum()
+
+    if len(aw.force_idx):
+        energy -= (aw.force_vec * pos[aw.force_idx]).sum()
+
+    if len(aw.link_i):
+        d = pos[aw.link_j] - pos[aw.link_i]
+        length = np.hypot(d[:, 0], d[:, 1])
+        energy += 0.5 * (aw.k * (length - aw.rest) ** 2).sum()
+
+    return energy
+
+def direct_step(stiffness, basis, f, damping):
+    # Newton step from a sparse LU factorisation of the tangent stiffness
+    # restricted to the free directions; None if it is singular
+    import scipy.sparse
+    import scipy.sparse.linalg
+
+    if not basis.shape[1]:
+        return np.zeros_like(f)
+    k = (basis.T @ stiffness.sparse() @ basis).tocsc()
+    if damping:
+        k = k + damping * scipy.sparse.identity(k.shape[0], format="csc")
+    try:
+        y = scipy.sparse.linalg.splu(k).solve(basis.T @ f.reshape(-1))
+    except RuntimeError:
+        return None
+    if not np.isfinite(y).all():
+        return None
+    return (basis @ y).reshape(f.shape)
+
+def cg_step(stiffness, project, f, damping):
+    # the same step by Jacobi preconditioned CG, without scipy. Converges
+    # slowly on big trusses: hundreds of iterations per Newton step
+    precond = stiffness.diagonal() + damping
+    precond[precond <= 0] = 1
+
+    def matvec(u):
+        return stiffness.matvec(u) + damping * u
+
+    return conjugate_gradient(matvec, f, precond, project, tol=1E-10)[0]
+
+# Newton iteration on the link stiffness system, with a backtracking line
+# search on potential energy and Levenberg damping for when the tangent
+# stiffness is singular (mechanisms, slack links). tol is relative to the
+# total applied load. Each Newton step is a sparse direct solve with
+# scipy, or CG when scipy isn't installed.
+def solve_equilibrium(sim, tol=1E-9, max_iter=100):
+    aw = soa.from_world(sim) if isinstance(sim, world) else sim
+    project = constraint_projector(aw.static, aw.axis)
+    try:
+        basis = constraint_basis(aw.static, aw.axis)
+    except ImportError:
+        basis = None
+
+    pos = aw.pos.copy()
+    load = np.sqrt(((aw.mass[:, None] * aw.gravity) ** 2).sum() + (aw.force_vec ** 2).sum())
+    limit = tol * max(load, 1E-300)
+    k_max = aw.k.max() if len(aw.k) else 1
+
+    damping = 0
+    energy = potential_energy(aw, pos)
+    f = project(static_forces(aw, pos))
+    residual = np.sqrt((f * f).sum())
+    iterations = 0
+
+    while iterations < max_iter and residual > limit:
+        iterations += 1
+
+        stiffness = link_stiffness(pos, aw.link_i, aw.link_j, aw.rest, aw.k)
+        if basis is not None:
+            dx = direct_step(stiffness, basis, f, damping)
+            if dx is None:
+                damping = max(damping * 10, 1E-8 * k_max)
+                continue
+        else:
+            dx = cg_step(stiffness, project, f, damping)
+
+        # backtrack until the energy goes down, or the residual does once
+        # the energy differences are down in the rounding noise
+        accepted = False
+        t = 1
+        while t > 1E-6:
+            trial = pos + t * dx
+            trial_energy = potential_energy(aw, trial)
+            trial_f = project(static_forces(aw, trial))
+            trial_residual = np.sqrt((trial_f * trial_f).sum())
+
+            if trial_energy < energy - 1E-12 * abs(energy) or trial_residual < residual:
+                accepted = True
+                break
+            t *= 0.5
+
+        if accepted:
+            pos, energy, f, residual = trial, trial_energy, trial_f, trial_residual
+            damping *= 0.1
+        else:
+            damping = max(damping * 10, 1E-8 * k_max)
+
+    if len(aw.link_i):
+        d = pos[aw.link_j] - pos[aw.link_i]
+        tension = aw.k * (np.hypot(d[:, 0], d[:, 1]) - aw.rest)
+    else:
+        tension = np.zeros(0)
+
+    links = sim.links if isinstance(sim, world) else None
+    return equilibrium(aw, aw.points, links, pos, tension, iterations, residual, residual <= limit)
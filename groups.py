@@ -0,0 +1,275 @@
+import math
+
+# Named groups of points with aggregate queries: total mass, centre of
+# mass, bounding box, momentum and the net constant force on them.
+#
+# Groups live in a group_set bound to a world (an engine.world, an
+# array_world, or a background.frame). The first query after the world
+# has stepped works out the aggregates of every group in the set in one
+# pass over their members, and every other query until the next step is
+# a lookup. Masses, member indices and forces only change with the
+# membership or the topology, so they are worked out again only then.
+#
+# Members are point objects, or point numbers for an array_world.
+
+########################
+#       GROUP          #
+########################
+
+class group():
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        # insertion-ordered dict used as a set, like world.point_links
+        self.members = {}
+
+        # filled in by the group_set
+        self.mass = 0
+        self.net_force = (0, 0)
+        self.com = None
+        self.bounds = None
+        self.momentum = (0, 0)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __contains__(self, p):
+        return p in self.members
+
+    def changed(self):
+        self.owner.changes += 1
+
+    def add(self, p):
+        if not p in self.members:
+            self.members[p] = None
+            self.changed()
+
+    def discard(self, p):
+        if p in self.members:
+            del self.members[p]
+            self.changed()
+
+    def toggle(self, p):
+        if p in self.members:
+            self.discard(p)
+        else:
+            self.add(p)
+
+    def clear(self):
+        if self.members:
+            self.members = {}
+            self.changed()
+
+    # aggregates as of the world's current step
+
+    def total_mass(self):
+        self.owner.update()
+        return self.mass
+
+    def centre_of_mass(self):
+        # (x, y), or None for an empty or massless group
+        self.owner.update()
+        return self.com
+
+    def bounding_box(self):
+        # (x0, y0, x1, y1), or None for an empty group
+        self.owner.update()
+        return self.bounds
+
+    def total_momentum(self):
+        self.owner.update()
+        return self.momentum
+
+    def applied_force(self):
+        # sum of the constant forces on the members
+        self.owner.update()
+        return self.net_force
+
+########################
+#      GROUP SET       #
+########################
+
+class group_set():
+    def __init__(self, sim):
+        # sim can be swapped for another view of the same world, e.g. the
+        # GUI's latest frame
+        self.sim = sim
+        self.groups = {}
+
+        # bumped by any membership change
+        self.changes = 0
+        self.layout_key = None
+        self.stamp = None
+
+    def __getitem__(self, name):
+        return self.groups[name]
+
+    def __contains__(self, name):
+        return name in self.groups
+
+    def __iter__(self):
+        return iter(self.groups.values())
+
+    def new(self, name, points=()):
+        g = self.groups[name] = group(self, name)
+        for p in points:
+            g.add(p)
+        self.changes += 1
+        return g
+
+    def get(self, name):
+        # the group called name, made empty if there isn't one yet
+        g = self.groups.get(name)
+        return g if g is not None else self.new(name)
+
+    def remove(self, name):
+        del self.groups[name]
+        self.changes += 1
+
+    def prune(self, alive):
+        # drop members that are no longer in the world; alive is anything
+        # that supports `in`, e.g. world.point_index or frame.point_index
+        for g in self.groups.values():
+            for p in [p for p in g.members if not p in alive]:
+                g.discard(p)
+
+    def update(self):
+        sim = self.sim
+        stamp = (id(sim), getattr(sim, "version", None), sim.steps, sim.time, self.changes)
+        if stamp == self.stamp:
+            return
+        self.stamp = stamp
+
+        layout_key = (getattr(sim, "version", None), self.changes, hasattr(sim, "link_lengths"))
+        if layout_key != self.layout_key:
+            self.layout()
+            self.layout_key = layout_key
+
+        if hasattr(sim, "link_lengths"):
+            self.update_arrays()
+        elif hasattr(sim, "positions"):
+            self.update_frame()
+        else:
+            self.update_points()
+
+    def layout(self):
+        # the parts that only change with membership or topology: masses
+        # and constant forces
+        sim = self.sim
+        groups = [g for g in self.groups.values() if g.members]
+        for g in self.groups.values():
+            g.mass = 0
+            g.net_force = (0, 0)
+            g.com = None
+            g.bounds = None
+            g.momentum = (0, 0)
+
+        if hasattr(sim, "link_lengths"):
+            import numpy as np
+
+            # members of all groups back to back, and where each group
+            # starts, for one reduceat pass per aggregate
+            self.index = np.array([i for g in groups for i in g.members], dtype=np.intp)
+            self.starts = np.cumsum([0] + [len(g) for g in groups[:-1]], dtype=np.intp)
+            self.member_mass = sim.mass[self.index]
+            masses = np.add.reduceat(self.member_mass, self.starts) if groups else []
+            fx = np.bincount(sim.force_idx, weights=sim.force_vec[:, 0], minlength=len(sim.pos))
+            fy = np.bincount(sim.force_idx, weights=sim.force_vec[:, 1], minlength=len(sim.pos))
+            for g, mass in zip(groups, masses):
+                idx = np.fromiter(g.members, dtype=np.intp, count=len(g))
+                g.mass = float(mass)
+                g.net_force = (float(fx[idx].sum()), float(fy[idx].sum()))
+        else:
+            by_point = {}
+            for f in sim.forces:
+                fx, fy = by_point.get(f.point, (0, 0))
+                by_point[f.point] = (fx + f.force.x, fy + f.force.y)
+            for g in groups:
+                g.mass = sum(p.mass for p in g.members)
+                fx = 0
+                fy = 0
+                for p in g.members:
+                    if p in by_point:
+                        fx += by_point[p][0]
+                        fy += by_point[p][1]
+                g.net_force = (fx, fy)
+
+        self.active = groups
+
+    def update_points(self):
+        for g in self.active:
+            sx = sy = mx = my = 0
+            x0 = y0 = math.inf
+            x1 = y1 = -math.inf
+            for p in g.members:
+                m = p.mass
+                x = p.pos.x
+                y = p.pos.y
+                sx += m * x
+                sy += m * y
+                mx += m * p.vel.x
+                my += m * p.vel.y
+                if x < x0:
+                    x0 = x
+                if x > x1:
+                    x1 = x
+                if y < y0:
+                    y0 = y
+                if y > y1:
+                    y1 = y
+            self.store(g, sx, sy, mx, my, (x0, y0, x1, y1))
+
+    def update_frame(self):
+        # a background.frame: its own positions and velocities
+        frame = self.sim
+        index = frame.point_index
+        positions = frame.positions
+        velocities = frame.velocities
+        for g in self.active:
+            sx = sy = mx = my = 0
+            x0 = y0 = math.inf
+            x1 = y1 = -math.inf
+            for p in g.members:
+                i = index[p]
+                m = p.mass
+                x, y = positions[i]
+                vx, vy = velocities[i]
+                sx += m * x
+                sy += m * y
+                mx += m * vx
+                my += m * vy
+                if x < x0:
+                    x0 = x
+                if x > x1:
+                    x1 = x
+                if y < y0:
+                    y0 = y
+                if y > y1:
+                    y1 = y
+            self.store(g, sx, sy, mx, my, (x0, y0, x1, y1))
+
+    def update_arrays(self):
+        import numpy as np
+
+        if not self.active:
+            return
+        aw = self.sim
+        starts = self.starts
+        m = self.member_mass
+        pos = aw.pos[self.index]
+        vel = aw.vel[self.index]
+        sums = np.add.reduceat(np.column_stack((m * pos[:, 0], m * pos[:, 1],
+                                                m * vel[:, 0], m * vel[:, 1])), starts)
+        lows = np.minimum.reduceat(pos, starts)
+        highs = np.maximum.reduceat(pos, starts)
+        for g, (sx, sy, mx, my), (x0, y0), (x1, y1) in zip(self.active, sums.tolist(),
+                                                           lows.tolist(), highs.tolist()):
+            self.store(g, sx, sy, mx, my, (x0, y0, x1, y1))
+
+    def store(self, g, sx, sy, mx, my, bounds):
+        g.com = (sx / g.mass, sy / g.mass) if g.mass else None
+        g.momentum = (mx, my)
+        g.bounds = bounds
@@ -0,0 +1,162 @@
+import collections
+from array import array
+
+from engine import *
+
+# A rewindable history of a world: a full snapshot (keyframe) every
+# `keyframe_every` frames and, in between, deltas holding only the points
+# whose position or velocity changed since the frame before. Resting
+# structures cost next to nothing per frame. A new keyframe is also taken
+# whenever the topology changes, so deltas never span an edit.
+#
+# At most `max_frames` frames are kept; the oldest keyframe and its deltas
+# are dropped as a block when the history grows past that.
+
+########################
+#       DELTAS         #
+########################
+
+class delta():
+    def __init__(self, index, values, time, steps):
+        # point indices, and x, y, vx, vy for each of them
+        self.index = index
+        self.values = values
+        self.time = time
+        self.steps = steps
+
+    def nbytes(self):
+        return self.index.itemsize * len(self.index) + self.values.itemsize * len(self.values)
+
+    def apply(self, points):
+        values = self.values
+        for n, i in enumerate(self.index):
+            j = 4 * n
+            p = points[i]
+            p.pos.set(values[j], values[j + 1])
+            p.vel.set(values[j + 2], values[j + 3])
+
+def point_states(points):
+    return [(p.pos.x, p.pos.y, p.vel.x, p.vel.y) for p in points]
+
+def diff(old, new, time, steps):
+    index = array("i")
+    values = array("d")
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            index.append(i)
+            values.extend(b)
+    return delta(index, values, time, steps)
+
+########################
+#       HISTORY        #
+########################
+
+# a keyframe and the deltas that follow it
+class block():
+    def __init__(self, key, version):
+        self.key = key
+        self.version = version
+        self.deltas = []
+
+    def __len__(self):
+        return 1 + len(self.deltas)
+
+class history():
+    def __init__(self, sim, max_frames=2000, keyframe_every=50, every=1):
+        self.sim = sim
+        self.max_frames = max_frames
+        self.keyframe_every = keyframe_every
+        # with step(), capture every `every` steps
+        self.every = every
+
+        self.blocks = collections.deque()
+        # absolute number of the oldest frame kept, and of the frame the
+        # world is at (the last one, unless restore() went back)
+        self.first = 0
+        self.position = -1
+        # point states of the last captured frame, to diff against
+        self.last = None
+
+    def __len__(self):
+        return sum(len(b) for b in self.blocks)
+
+    def last_frame(self):
+        return self.first + len(self) - 1
+
+    def capture(self):
+        sim = self.sim
+        if self.position < self.last_frame():
+            # the world was rewound and has moved on: that is a new branch
+            self.truncate(self.position)
+
+        states = point_states(sim.points)
+        current = self.blocks[-1] if self.blocks else None
+        if (current is None or current.version != sim.version
+                or len(current) >= self.keyframe_every):
+            self.blocks.append(block(sim.checkpoint(), sim.version))
+        else:
+            current.deltas.append(diff(self.last, states, sim.time, sim.steps))
+        self.last = states
+        self.position = self.last_frame()
+
+        while len(self) > self.max_frames and len(self.blocks) > 1:
+            self.first += len(self.blocks.popleft())
+
+    def step(self, n=1):
+        # step the world n times, capturing every `every` steps
+        while n > 0:
+            todo = min(n, self.every - self.sim.steps % self.every)
+            self.sim.step(todo)
+            n -= todo
+            if self.sim.steps % self.every == 0:
+                self.capture()
+
+    def locate(self, frame):
+        # (block, number of deltas into it) of an absolute frame number
+        if not self.blocks or frame < self.first or frame > self.last_frame():
+            raise IndexError("frame " + str(frame) + " is not in the history ("
+                             + str(self.first) + " to " + str(self.last_frame()) + ")")
+        i = frame - self.first
+        for b in self.blocks:
+            if i < len(b):
+                return b, i
+            i -= len(b)
+
+    def restore(self, frame):
+        # put the world back to an absolute frame number: its keyframe,
+        # then the deltas up to it
+        b, i = self.locate(frame)
+        sim = self.sim
+        sim.restore(b.key)
+        for d in b.deltas[:i]:
+            d.apply(sim.points)
+        if i:
+            sim.time = b.deltas[i - 1].time
+            sim.steps = b.deltas[i - 1].steps
+
+        self.position = frame
+        self.last = point_states(sim.points)
+
+    def time_of(self, frame):
+        b, i = self.locate(frame)
+        return b.deltas[i - 1].time if i else b.key.time
+
+    def steps_of(self, frame):
+        b, i = self.locate(frame)
+        return b.deltas[i - 1].steps if i else b.key.steps
+
+    def truncate(self, frame):
+        # forget everything after an absolute frame number
+        b, i = self.locate(frame)
+        while self.blocks[-1] is not b:
+            self.blocks.pop()
+        del b.deltas[i:]
+
+    def back(self, frames=1):
+        self.restore(max(self.position - frames, self.first))
+
+    def forward(self, frames=1):
+        self.restore(min(self.position + frames, self.last_frame()))
+
+    def nbytes(self):
+        return sum(b.key.nbytes() + sum(d.nbytes() for d in b.deltas) for b in self.blocks)
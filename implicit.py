@@ -0,0 +1,202 @@
+import numpy as np
+
+########################
+#   SPRING STIFFNESS   #
+########################
+
+# linearized rigid_link forces around the current positions. For a link
+# p1 -> p2 with unit direction n, length l and rest length L the force on
+# p1 changes with the relative displacement u = u2 - u1 as
+#
+#     k * (n n^T + (1 - L/l) (I - n n^T)) u
+#
+# The transverse term goes negative for compressed links; clamping it at
+# zero keeps the matrix positive semi-definite so conjugate gradient can
+# solve it, at the price of treating buckling slightly explicitly.
+class link_stiffness():
+    def __init__(self, pos, link_i, link_j, rest, k):
+        self.link_i = link_i
+        self.link_j = link_j
+        self.n_points = len(pos)
+
+        d = pos[link_j] - pos[link_i]
+        length = np.hypot(d[:, 0], d[:, 1])
+        self.n = np.divide(d, length[:, None], out=np.zeros_like(d), where=length[:, None] > 0)
+        transverse = np.clip(1 - np.divide(rest, length, out=np.ones_like(length), where=length > 0), 0, None)
+
+        self.k_axial = k * (1 - transverse)
+        self.k_trans = k * transverse
+        self.k = k
+
+    def matvec(self, u):
+        # u is (N, 2); returns -df/dx u, also (N, 2)
+        n = self.n
+        rel = u[self.link_j] - u[self.link_i]
+        along = (rel * n).sum(axis=1)
+        f = n * (self.k_axial * along)[:, None] + rel * self.k_trans[:, None]
+
+        count = self.n_points
+        out = np.empty_like(u)
+        out[:, 0] = np.bincount(self.link_i, weights=f[:, 0], minlength=count) - np.bincount(self.link_j, weights=f[:, 0], minlength=count)
+        out[:, 1] = np.bincount(self.link_i, weights=f[:, 1], minlength=count) - np.bincount(self.link_j, weights=f[:, 1], minlength=count)
+        return -out
+
+    def diagonal(self):
+        # per point, per axis diagonal of the matrix, used as a
+        # Jacobi preconditioner
+        count = self.n_points
+        nn = self.n * self.n
+        dx = self.k_axial * nn[:, 0] + self.k_trans
+        dy = self.k_axial * nn[:, 1] + self.k_trans
+        diag = np.empty((count, 2))
+        diag[:, 0] = np.bincount(self.link_i, weights=dx, minlength=count) + np.bincount(self.link_j, weights=dx, minlength=count)
+        diag[:, 1] = np.bincount(self.link_i, weights=dy, minlength=count) + np.bincount(self.link_j, weights=dy, minlength=count)
+        return diag
+
+    def sparse(self):
+        # the whole matrix as a (2N, 2N) scipy.sparse CSR matrix, with
+        # point i's x and y at rows 2i and 2i + 1, for direct solvers
+        import scipy.sparse
+
+        n = self.n
+        # per link 2x2 block k_axial n n^T + k_trans I, as xx, xy, yx, yy
+        blocks = np.empty((len(n), 4))
+        blocks[:, 0] = self.k_axial * n[:, 0] * n[:, 0] + self.k_trans
+        blocks[:, 1] = self.k_axial * n[:, 0] * n[:, 1]
+        blocks[:, 2] = blocks[:, 1]
+        blocks[:, 3] = self.k_axial * n[:, 1] * n[:, 1] + self.k_trans
+
+        rows = []
+        cols = []
+        vals = []
+        for a, b, sign in ((self.link_i, self.link_i, 1), (self.link_j, self.link_j, 1),
+                           (self.link_i, self.link_j, -1), (self.link_j, self.link_i, -1)):
+            for c, (r, q) in enumerate(((0, 0), (0, 1), (1, 0), (1, 1))):
+                rows.append(2 * a + r)
+                cols.append(2 * b + q)
+                vals.append(sign * blocks[:, c])
+
+        size = 2 * self.n_points
+        return scipy.sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                       shape=(size, size))
+
+########################
+#  CONJUGATE GRADIENT  #
+########################
+
+# preconditioned CG on (N, 2) shaped vectors. `project` removes
+# constrained directions (static points, limit axes) so they stay out
+# of the solve entirely.
+def conjugate_gradient(matvec, b, precond=None, project=None, x0=None, tol=1E-8, max_iter=None):
+    if project is None:
+        project = lambda v: v
+    if precond is None:
+        precond = np.ones_like(b)
+    if max_iter is None:
+        max_iter = 2 * b.size
+
+    x = np.zeros_like(b) if x0 is None else project(x0.copy())
+    r = project(b - matvec(x))
+    z = project(r / precond)
+    p = z.copy()
+    rz = (r * z).sum()
+
+    limit = tol * max(np.sqrt((project(b) ** 2).sum()), 1E-300)
+    iterations = 0
+
+    while iterations < max_iter and np.sqrt((r * r).sum()) > limit:
+        ap = project(matvec(p))
+        pap = (p * ap).sum()
+        if pap <= 0:
+            break
+
+        alpha = rz / pap
+        x += alpha * p
+        r -= alpha * ap
+        z = project(r / precond)
+
+        rz_new = (r * z).sum()
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+        iterations += 1
+
+    return x, iterations
+
+def constraint_projector(static, axis):
+    # zero the rows of static points and keep only the component along
+    # the limit axis for limited ones
+    free = (~static).astype(np.float64)[:, None]
+    limited = np.flatnonzero(axis.any(axis=1))
+
+    def project(v):
+        v = v * free
+        if len(limited):
+            ax = axis[limited]
+            v[limited] = ax * (v[limited] * ax).sum(axis=1)[:, None]
+        return v
+
+    return project
+
+def constraint_basis(static, axis):
+    # the same constraints for direct solvers: a sparse (2N, m) matrix
+    # whose columns are the m directions the points are free to move in,
+    # x and y of free points and the limit axis of limited ones
+    import scipy.sparse
+
+    limited = axis.any(axis=1)
+    rows = []
+    vals = []
+    cols = []
+    column = 0
+    for i, (fixed, lim) in enumerate(zip(static.tolist(), limited.tolist())):
+        if fixed:
+            continue
+        if lim:
+            rows += [2 * i, 2 * i + 1]
+            vals += [axis[i, 0], axis[i, 1]]
+            cols += [column, column]
+            column += 1
+        else:
+            rows += [2 * i, 2 * i + 1]
+            vals += [1.0, 1.0]
+            cols += [column, column + 1]
+            column += 2
+    return scipy.sparse.csr_matrix((vals, (rows, cols)), shape=(2 * len(static), column))
+
+########################
+#    BACKWARD EULER    #
+########################
+
+# one linearly implicit (backward) Euler step of an array_world.
+# Springs are implicit; floor contact, constant forces, gravity and drag
+# stay explicit. Solves
+#
+#     (M + dt^2 K) dv = dt (f - dt K v)
+#
+# for the velocity change dv, which stays stable at timesteps far above
+# what the stiffest link allows with the explicit integrator.
+def backward_euler_step(aw, tol=1E-8, max_iter=None):
+    dt = aw.dt
+    f = aw.net_forces()
+
+    stiffness = link_stiffness(aw.pos, aw.link_i, aw.link_j, aw.rest, aw.k)
+    mass = aw.mass[:, None]
+
+    def matvec(u):
+        return mass * u + (dt * dt) * stiffness.matvec(u)
+
+    rhs = dt * (f - dt * stiffness.matvec(aw.vel))
+    precond = mass + (dt * dt) * stiffness.diagonal()
+    project = constraint_projector(aw.static, aw.axis)
+
+    dv, iterations = conjugate_gradient(matvec, rhs, precond, project, tol=tol, max_iter=max_iter)
+
+    aw.vel += dv
+    if len(aw.limited):
+        ax = aw.axis[aw.limited]
+        v = aw.vel[aw.limited]
+        aw.vel[aw.limited] = ax * (v * ax).sum(axis=1)[:, None]
+
+    aw.pos += aw.vel * (dt * aw.free)
+
+    return iterations
@@ -0,0 +1,330 @@
+import math
+
+from engine import *
+
+########################
+#     UNION-FIND       #
+########################
+
+def find(parent, i):
+    # with path halving
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def union(parent, size, i, j):
+    i = find(parent, i)
+    j = find(parent, j)
+    if i == j:
+        return
+    if size[i] < size[j]:
+        i, j = j, i
+    parent[j] = i
+    size[i] += size[j]
+
+########################
+#       ISLANDS        #
+########################
+
+# a connected component of the point/link graph, with its links and the
+# forces on its points. Nothing outside it can push it around except the
+# floor, so it can be left alone entirely once it has come to rest
+class island():
+    def __init__(self):
+        self.points = []
+        self.links = []
+        self.forces = []
+
+        self.sleeping = False
+        self.still_time = 0
+        # (x0, y0, x1, y1)
+        self.bounds = None
+        # [(x, y, vx, vy)] of each point at the last check
+        self.last = None
+        # [x0, y0, x1, y1] each point has moved within since `window_time`
+        # ago, each point's speed summed over that time, the middles of
+        # the boxes over the window before, and how many windows in a row
+        # have been quiet
+        self.ranges = None
+        self.speeds = None
+        self.window_time = 0
+        self.middles = None
+        self.quiet = 0
+
+    def same_members(self, other):
+        return (len(self.points) == len(other.points) and len(self.links) == len(other.links)
+                and len(self.forces) == len(other.forces)
+                and set(self.points) == set(other.points) and set(self.links) == set(other.links)
+                and set(self.forces) == set(other.forces))
+
+# islands in order of their first point; each island's lists keep the
+# order they have in the world
+def find_islands(points, links, forces):
+    index = {p: i for i, p in enumerate(points)}
+    parent = list(range(len(points)))
+    size = [1] * len(points)
+    for l in links:
+        union(parent, size, index[l.p1], index[l.p2])
+
+    islands = []
+    by_root = {}
+    island_of = {}
+    for i, p in enumerate(points):
+        root = find(parent, i)
+        isl = by_root.get(root)
+        if isl is None:
+            isl = by_root[root] = island()
+            islands.append(isl)
+        isl.points.append(p)
+        island_of[p] = isl
+
+    for l in links:
+        island_of[l.p1].links.append(l)
+    for f in forces:
+        island_of[f.point].forces.append(f)
+
+    return islands, island_of
+
+########################
+#       SLEEPER        #
+########################
+
+# sim.sleeper = sleeper(sim) makes world.step() skip islands that have
+# been still for a while. Every `check_every` steps each awake island's
+# points are compared with the last check; if no point moved faster than
+# `sleep_speed` or changed velocity faster than `sleep_accel` (both
+# averaged over the interval, so floor contact jitter doesn't count) for
+# `sleep_time` seconds, the island's velocities are zeroed and it drops
+# out of the step.
+#
+# With little drag a structure never gets that still: it settles into a
+# small vibration about its rest shape that goes on for good. So an
+# island also sleeps once `jitter_windows` windows of `sleep_time` in a
+# row were quiet: every point stayed within a box smaller than `jitter`
+# times the island's size, its average speed stayed under `jitter_speed`
+# box sizes per sleep_time, and the middles of the boxes moved less than
+# a box size since the window before (it isn't sagging or sliding). The
+# windows in a row are what tell a vibration from a slow swing that
+# happens to be near a turning point for one window.
+#
+# A sleeping island wakes when an awake island's bounds come within
+# `margin` of it, when anything in it is added or removed (a new
+# const_force included), or on wake()/wake_all()
+class sleeper():
+    def __init__(self, sim, sleep_speed=0.05, sleep_accel=0.5, sleep_time=1, check_every=20, margin=1,
+                 jitter=0.01, jitter_speed=5, jitter_windows=3):
+        self.sim = sim
+        self.sleep_speed = sleep_speed
+        self.sleep_accel = sleep_accel
+        self.sleep_time = sleep_time
+        self.jitter = jitter
+        self.jitter_speed = jitter_speed
+        self.jitter_windows = jitter_windows
+        self.check_every = check_every
+        self.margin = margin
+
+        self.islands = []
+        self.island_of = {}
+        self.version = None
+        self.last_time = None
+        # (points, links, forces) that world.step() should run
+        self.active = (sim.points, sim.links, sim.forces)
+
+        self.sync()
+
+    def sync(self):
+        # rebuild the islands if the world was edited. An island keeps its
+        # state only if it has exactly the same points, links and forces
+        # as before, so an edit wakes whatever it touched
+        sim = self.sim
+        if self.version == sim.version:
+            return
+
+        islands, island_of = find_islands(sim.points, sim.links, sim.forces)
+        for isl in islands:
+            old = self.island_of.get(isl.points[0])
+            if old and isl.same_members(old):
+                isl.sleeping = old.sleeping
+                isl.still_time = old.still_time
+                isl.bounds = old.bounds
+                # the old snapshots are in the old island's point order
+                if old.last is not None and old.points == isl.points:
+                    isl.last = old.last
+                    isl.ranges = old.ranges
+                    isl.speeds = old.speeds
+                    isl.window_time = old.window_time
+                    isl.middles = old.middles
+                    isl.quiet = old.quiet
+
+        self.islands = islands
+        self.island_of = island_of
+        self.version = sim.version
+        self.refresh()
+
+    def refresh(self):
+        sim = self.sim
+        if not any(isl.sleeping for isl in self.islands):
+            self.active = (sim.points, sim.links, sim.forces)
+            return
+
+        island_of = self.island_of
+        self.active = ([p for p in sim.points if not island_of[p].sleeping],
+                       [l for l in sim.links if not island_of[l.p1].sleeping],
+                       [f for f in sim.forces if not island_of[f.point].sleeping])
+
+    def steps_to_check(self):
+        return self.check_every - self.sim.steps % self.check_every
+
+    def update(self):
+        # called by world.step() after every run of steps; only does
+        # anything on check steps
+        sim = self.sim
+        if sim.steps % self.check_every:
+            return
+        self.sync()
+
+        elapsed = sim.time - self.last_time if self.last_time is not None else 0
+        self.last_time = sim.time
+        changed = False
+
+        awake = []
+        for isl in self.islands:
+            if isl.sleeping:
+                continue
+            awake.append(isl)
+
+            state = [(p.pos.x, p.pos.y, p.vel.x, p.vel.y) for p in isl.points]
+            xs = [s[0] for s in state]
+            ys = [s[1] for s in state]
+            isl.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+            if isl.last is not None and elapsed > 0:
+                speed = 0
+                accel = 0
+                for (x, y, vx, vy), (x0, y0, vx0, vy0) in zip(state, isl.last):
+                    speed = max(speed, math.hypot(x - x0, y - y0))
+                    accel = max(accel, math.hypot(vx - vx0, vy - vy0))
+
+                if speed / elapsed < self.sleep_speed and accel / elapsed < self.sleep_accel:
+                    isl.still_time += elapsed
+                else:
+                    isl.still_time = 0
+
+            isl.last = state
+            if isl.still_time >= self.sleep_time or self.vibrating(isl, state, elapsed):
+                self.put_to_sleep(isl)
+                changed = True
+
+        if self.wake_touching([isl for isl in awake if not isl.sleeping]):
+            changed = True
+        if changed:
+            self.refresh()
+
+    def vibrating(self, isl, state, elapsed):
+        # the second rest test, see above. Grows each point's box by its
+        # position now, and judges the boxes once they span sleep_time
+        if isl.ranges is None:
+            isl.ranges = [[x, y, x, y] for x, y, vx, vy in state]
+            isl.speeds = [0] * len(state)
+            isl.window_time = 0
+            return False
+        speeds = isl.speeds
+        for i, (r, (x, y, vx, vy)) in enumerate(zip(isl.ranges, state)):
+            speeds[i] += math.hypot(vx, vy) * elapsed
+            if x < r[0]:
+                r[0] = x
+            elif x > r[2]:
+                r[2] = x
+            if y < r[1]:
+                r[1] = y
+            elif y > r[3]:
+                r[3] = y
+        isl.window_time += elapsed
+        if isl.window_time < self.sleep_time:
+            return False
+
+        x0, y0, x1, y1 = isl.bounds
+        tol = self.jitter * max(x1 - x0, y1 - y0)
+        span = max(max(r[2] - r[0], r[3] - r[1]) for r in isl.ranges)
+        speed = max(speeds) / isl.window_time
+        middles = [((r[0] + r[2]) / 2, (r[1] + r[3]) / 2) for r in isl.ranges]
+        drift = math.inf
+        if isl.middles is not None:
+            drift = max(math.hypot(x - x0, y - y0) for (x, y), (x0, y0) in zip(middles, isl.middles))
+
+        isl.middles = middles
+        isl.ranges = None
+        isl.speeds = None
+        if span < tol and drift < tol and speed < self.jitter_speed * tol / self.sleep_time:
+            isl.quiet += 1
+        else:
+            isl.quiet = 0
+        return isl.quiet >= self.jitter_windows
+
+    def put_to_sleep(self, isl):
+        for p in isl.points:
+            p.vel.set(0, 0)
+            p.clear_accel()
+        isl.sleeping = True
+        isl.last = None
+        isl.ranges = None
+        isl.speeds = None
+        isl.middles = None
+        isl.quiet = 0
+
+    def wake_touching(self, awake):
+        # sweep and prune on x over awake and sleeping bounds, waking any
+        # sleeping island an awake one overlaps
+        sleeping = [isl for isl in self.islands if isl.sleeping]
+        if not awake or not sleeping:
+            return False
+
+        m = self.margin
+        boxes = []
+        for isl in awake:
+            x0, y0, x1, y1 = isl.bounds
+            boxes.append((x0 - m, y0 - m, x1 + m, y1 + m, isl))
+        for isl in sleeping:
+            boxes.append(isl.bounds + (isl,))
+        boxes.sort(key=lambda box: box[0])
+
+        woken = False
+        open_boxes = []
+        for box in boxes:
+            x0, y0, x1, y1, isl = box
+            open_boxes = [o for o in open_boxes if o[2] >= x0]
+            for o in open_boxes:
+                other = o[4]
+                if other.sleeping != isl.sleeping and o[1] <= y1 and o[3] >= y0:
+                    self.wake(other if other.sleeping else isl, refresh=False)
+                    woken = True
+            open_boxes.append(box)
+        return woken
+
+    def wake(self, isl, refresh=True):
+        isl.sleeping = False
+        isl.still_time = 0
+        isl.last = None
+        isl.ranges = None
+        isl.speeds = None
+        isl.middles = None
+        isl.quiet = 0
+        if refresh:
+            self.refresh()
+
+    def wake_point(self, p):
+        self.sync()
+        isl = self.island_of.get(p)
+        if isl and isl.sleeping:
+            self.wake(isl)
+
+    def wake_all(self):
+        # for changes the sleeper can't see, e.g. gravity or a point moved
+        # by hand
+        for isl in self.islands:
+            self.wake(isl, refresh=False)
+        self.refresh()
+
+    def num_sleeping(self):
+        return sum(len(isl.points) for isl in self.islands if isl.sleeping)
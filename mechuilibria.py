@@ -1,50 +1,37 @@
 from tkinter import *
+import argparse
 import time
 
 from vector2 import *
-
-drag_coeff = 1E-5
-gravity = vec2(0, -9.81) # m/s^2
-dt = 0
+from engine import *
+from renderer import *
+from spatial import *
+import scenes
+import scenefile
+import profiler
+import islands
+import collision
+import history
+import background
+import diagnostics
+import groups
+import session
+
+paused = True
+
+# physics steps per displayed frame; None runs as many as it takes to
+# keep up with real time, up to max_steps_per_frame
+substeps_per_frame = None
+max_steps_per_frame = 400
+
+# the physics runs on a thread of its own (see background.py); the canvas
+# is redrawn from its latest frame every frame_ms milliseconds
+frame_ms = 16
 
 ########################
 #       CAMERA         #
 ########################
 
-class camera():
-    def __init__(self, name, pos, zoom, state):
-        self.name = name
-        self.pos = pos
-        self.zoom = zoom
-        self.state = state
-
-    def activate(self):
-        self.state = "active"
-
-    def deactivate(self):
-        self.state = "standby"
-
-    def set_pos(self, pos):
-        self.pos = pos
-
-    def set_zoom(self, zoom):
-        self.zoom = zoom
-
-    def move(self, movement):
-        self.pos += movement
-
-    def do_zoom(self, zoom):
-        self.zoom *= zoom
-
-    def get_state(self):
-        return self.state
-
-    def get_pos(self):
-        return self.pos
-
-    def get_zoom(self):
-        return self.zoom
-
 def get_active_cam():
     current_cam = None
 
@@ -57,177 +44,32 @@ def get_active_cam():
 
 def move_current_cam_left(event=None):
     get_active_cam().move(vec2(-30 * get_active_cam().get_zoom(), 0))
+    camera_moved()
 
 def move_current_cam_right(event=None):
     get_active_cam().move(vec2(30 * get_active_cam().get_zoom(), 0))
+    camera_moved()
 
 def move_current_cam_up(event=None):
     get_active_cam().move(vec2(0, 30 * get_active_cam().get_zoom()))
+    camera_moved()
 
 def move_current_cam_down(event=None):
     get_active_cam().move(vec2(0, -30 * get_active_cam().get_zoom()))
+    camera_moved()
 
 def zoom_current_cam_out(event=None):
     get_active_cam().do_zoom(2)
+    camera_moved()
 
 def zoom_current_cam_in(event=None):
     get_active_cam().do_zoom(0.5)
+    camera_moved()
 
-########################
-#       GROUND         #
-########################
-
-class ground():
-    def __init__(self, height, color, elasticity, k):
-        self.height = height
-        self.color = color
-        self.elasticity = elasticity
-        self.k = k
-
-    def get_height(self):
-        return self.height
-
-    def get_color(self):
-        return self.color
-
-    def apply_force(self, points):
-        for p in points:
-            # normal force
-            if p.get_pos().y < self.height:
-                p.apply_force(vec2(0, p.mass * p.vel.y * -1 * (self.elasticity + 1) / dt))
-                p.apply_force(gravity * p.mass)
-                p.pos.y = self.height
-
-            # friction
-            if p.get_pos().y <= self.height:
-                p.apply_force(vec2(p.vel.x, 0).normalized() * -1 * p.mass*gravity.mag()*self.k)
-
-########################
-#       LINK           #
-########################
-
-class rigid_link():
-    def __init__(self, name, p1, p2, color, k=1000):
-        self.name = name
-        self.p1 = p1
-        self.p2 = p2
-        self.dist = get_dist_between(p1, p2)
-        # spring coefficient
-        self.k = k
-        self.color = color
-
-    def get_k(self):
-        return self.k
-
-    def get_name(self):
-        return self.name
-
-    def get_color(self):
-        return self.color
-
-    def apply_force(self):
-        if get_dist_between(self.p1, self.p2) > self.dist:
-            self.p1.apply_force(self.p1.get_unit_vector_towards(self.p2) * self.k*abs(get_dist_between(self.p1, self.p2) - self.dist))
-            self.p2.apply_force(self.p2.get_unit_vector_towards(self.p1) * self.k*abs(get_dist_between(self.p1, self.p2) - self.dist))
-            
-        elif get_dist_between(self.p1, self.p2) < self.dist:
-            self.p1.apply_force(self.p1.get_unit_vector_towards(self.p2) * -self.k*abs(get_dist_between(self.p1, self.p2) - self.dist))
-            self.p2.apply_force(self.p2.get_unit_vector_towards(self.p1) * -self.k*abs(get_dist_between(self.p1, self.p2) - self.dist))
-
-    def get_midpoint(self):
-        return (self.p1.get_pos() + self.p2.get_pos())/2
-
-########################
-#     POINT MASS       #
-########################
-
-class point():
-    def __init__(self, name, pos, vel, color, mass=1, static=False):
-        self.name = name
-        self.pos = pos
-        self.vel = vel
-        self.accel = vec2()
-        self.mass = mass
-        self.static = static
-        self.color = color
-
-        self.limit_axis = None
-
-    def get_name(self):
-        return self.name
-    def get_pos(self):
-        return self.pos
-    def get_vel(self):
-        return self.vel
-    def get_mass(self):
-        return self.mass
-    def get_color(self):
-        return self.color
-
-    def get_unit_vector_towards(self, p2):
-        return (p2.pos - self.pos)/(p2.pos - self.pos).mag()
-    
-    def get_vector_towards(self, p2):
-        if type(p2) is point:
-            return p2.pos - self.pos
-        else:
-            return p2 - self.pos
-
-    def clear_accel(self):
-        # call this every tick to not have residual forces from
-        # previous frame
-        self.accel = vec2(0,0)
-
-    def apply_force(self, force):
-        self.accel += force/self.mass
-
-    def apply_gravity(self):
-        self.apply_force(gravity * self.mass)
-
-    def apply_drag(self):
-        self.apply_force((self.vel.normalized() * -1) * (self.vel.mag()**2) * drag_coeff)
-
-    def update_vel(self):
-        if not self.static:
-            self.vel += self.accel * dt
-
-        if self.limit_axis:
-            self.vel = self.limit_axis * self.vel.dot(self.limit_axis)
-
-    def update_pos(self):
-        if not self.static:
-            self.pos += self.vel * dt
-
-    def set_limit_axis(self, vec):
-        if vec == "x":
-            self.limit_axis = vec2(1,0)
-        elif vec == "y":
-            self.limit_axis = vec2(0, 1)
-        else:
-            self.limit_axis = vec.normalized()
-
-########################
-#    CONSTANT FORCE    #
-########################
-
-class const_force():
-    def __init__(self, name, point, force):
-        self.name = name
-        self.point = point
-        self.force = force
-
-    def apply(self):
-        self.point.apply_force(self.force)
-
-def get_dist_between(p1, p2):
-    if (type(p1) is point) and (type(p2) is point):
-        return (p1.pos - p2.pos).mag()
-    elif (type(p1) is point) and not (type(p2) is point):
-        return (p1.pos - p2).mag()
-    elif not (type(p1) is point) and (type(p2) is point):
-        return (p1 - p2.pos).mag()
-    else:
-        return (p1 - p2).mag()
+def camera_moved():
+    # goes through the physics thread only to be logged with a step number
+    cam = get_active_cam()
+    physics.send(session.edit("camera", x=cam.get_pos().x, y=cam.get_pos().y, zoom=cam.get_zoom()))
 
 def space2canvas(space_coords):
     current_cam = get_active_cam()
@@ -286,68 +128,49 @@ def right_clicked_on_canvas(event):
         adjust_com_buffer(x, y, "r")
 
 def adjust_com_buffer(x, y, click):
-    global calc_com_buffer
+    closest = get_closest_point_to_coords(x, y)
 
     if click == "l":
-        if not get_closest_point_to_coords(x, y) in calc_com_buffer:
-            calc_com_buffer.append(get_closest_point_to_coords(x, y))
+        calc_com_buffer.add(closest)
     elif click == "r":
-        if not len(calc_com_buffer) <= 0 and get_closest_point_to_coords(x, y) in calc_com_buffer:
-            calc_com_buffer.remove(get_closest_point_to_coords(x, y))
+        calc_com_buffer.discard(closest)
 
 def calc_com():
-    global calc_com_buffer
-    
-    com_x = 0
-    com_y = 0
-    com_mass = 0
-    
-    for p in calc_com_buffer:
-        com_mass += p.get_mass()
-        com_x += p.get_pos().x * p.get_mass()
-        com_y += p.get_pos().y * p.get_mass()
-
-    com_x = com_x / com_mass
-    com_y = com_y / com_mass
-
-    return (vec2(com_x, com_y), com_mass)
+    # cached by the group set until the next frame comes in
+    com_x, com_y = calc_com_buffer.centre_of_mass()
+    return (vec2(com_x, com_y), calc_com_buffer.total_mass())
 
 def apply_force_with_mouse(x, y, click):
-    global force_buffer
-
     if click == "r":
-        if not get_closest_point_to_coords(x, y) in force_buffer:
-            force_buffer.append(get_closest_point_to_coords(x, y))
-        else:
-            force_buffer.remove(get_closest_point_to_coords(x, y))
+        force_buffer.toggle(get_closest_point_to_coords(x, y))
 
     elif click == "l":
         for p in force_buffer:
             create_force(x, y, p)
-            force_buffer = []
+        force_buffer.clear()
 
 def create_force(x, y, point):
-    global forces
-    forces.append(const_force(name_field.get("1.0","end-1c"), point, point.get_vector_towards(vec2(x, y)) * 0.01))
+    px, py = view.position(point)
+    physics.send(session.edit("add_force", name=name_field.get("1.0","end-1c"), point=point,
+                              fx=(x - px) * 0.01, fy=(y - py) * 0.01))
 
 def delete_force(x, y):
-    global forces
     force_tbd = get_closest_force_to_coords(x, y)
 
     if force_tbd:
-        forces.remove(force_tbd)
-        del force_tbd
+        physics.send(session.edit("remove_force", force=force_tbd))
 
 def create_link(x, y):
     global linking_buffer
     
+    closest = get_closest_point_to_coords(x, y)
+
     if len(linking_buffer) == 0:
-        linking_buffer.append(get_closest_point_to_coords(x, y))
+        linking_buffer.append(closest)
     elif len(linking_buffer) == 1:
-        if not get_closest_point_to_coords(x, y) == linking_buffer[0]:
-            linking_buffer.append(get_closest_point_to_coords(x, y))
-            new_link = rigid_link(name_field.get("1.0","end-1c"), linking_buffer[0], linking_buffer[1], link_color_field.get("1.0","end-1c"), float(link_const_field.get("1.0","end-1c")))
-            links.append(new_link)
+        if not closest == linking_buffer[0]:
+            linking_buffer.append(closest)
+            physics.send(session.edit("add_link", name=name_field.get("1.0","end-1c"), p1=linking_buffer[0], p2=linking_buffer[1], color=link_color_field.get("1.0","end-1c"), k=float(link_const_field.get("1.0","end-1c"))))
 
         linking_buffer = []
 
@@ -355,58 +178,189 @@ def delete_link(x, y):
     link_tbd = get_closest_link_to_coords(x, y)
 
     if link_tbd:
-        links.remove(link_tbd)
-        del link_tbd
+        physics.send(session.edit("remove_link", link=link_tbd))
 
 def toggle_pause():
-    global dt
-    if dt > 0:
-        dt = 0
-    else:
-        dt = 0.0025
+    global paused
+    paused = not paused
+    physics.set_running(not paused)
 
-def get_closest_point_to_coords(x, y):
-    result = None
-    for p in points:
-        if not result or (vec2(x, y) - p.get_pos()).mag() < (vec2(x, y) - result.get_pos()).mag():
-            result = p
+def toggle_sleep():
+    physics.send(session.edit("sleep", on=sleepIslands.get()))
 
-    return result
+def toggle_collisions():
+    physics.send(session.edit("collisions", on=collisions.get()))
 
-def get_closest_link_to_coords(x, y):
-    result = None
-    for l in links:
-        if not result or (vec2(x, y) - l.get_midpoint()).mag() < (result.get_midpoint() - vec2(x, y)).mag():
-            result = l
+def toggle_energy():
+    physics.send(session.edit("energy", on=energyDiag.get()))
 
-    return result
+def set_scene(new_sim, new_cams=None, new_replay=None):
+    # the GUI only reads the world through `view`, the physics thread's
+    # latest frame, and changes it through physics.send()
+    global sim, stepper, renderer, picker, hist, physics, view, replay
+    global selection, force_buffer, linking_buffer, calc_com_buffer
 
-def get_closest_force_to_coords(x, y):
-    result = None
-    for f in forces:
-        if not result or ((vec2(x, y) - (f.point.get_pos() + f.force * 100)).mag() < (vec2(x, y) - (result.point.get_pos() + result.force * 100)).mag()):
-            result = f
+    if physics:
+        physics.close()
 
-    return result
+    sim = new_sim
+    replay = new_replay
+    if new_cams:
+        cameras[:] = new_cams
+
+    stepper = fixed_stepper(sim, substeps_per_frame, max_steps_per_frame)
+
+    tk_canvas.delete("all")
+    renderer = canvas_renderer(tk_canvas, 900, 500)
+
+    hist = None
+    if not replay:
+        hist = history.history(sim)
+        hist.capture()
+
+    # with --record, everything done to the world from here on is logged
+    # for session.py to replay
+    recorder = session.recorder(sim, args.record, cameras) if args.record and not replay else None
+    physics = background.physics_thread(sim, stepper, hist, replay, recorder=recorder).start()
+    view = physics.latest()
+    picker = view.picker
+
+    physics.set_running(not paused)
+    toggle_sleep()
+    toggle_collisions()
+    toggle_energy()
+    physics.profile(perfHUD.get())
+
+    # selected points, as named groups
+    selection = groups.group_set(view)
+    force_buffer = selection.new("force")
+    calc_com_buffer = selection.new("com")
+    linking_buffer = []
+
+def scrub_history(value):
+    # dragging the history slider pauses and rewinds to that frame; running
+    # on from there drops the frames after it
+    global paused
+    frame = int(float(value))
+    if replay or frame == view.history_position:
+        return
+    paused = True
+    physics.set_running(False)
+    physics.send(session.edit("rewind", frame=frame))
+
+def save_scene():
+    path = scene_file_field.get("1.0","end-1c")
+    physics.send(lambda sim: scenefile.save(sim, path, cameras))
+
+def save_profile():
+    perf.dump_json("profile.json")
+    perf.dump_csv("profile.csv")
+    # the physics thread's own timers, written from that thread
+    def command(sim):
+        if physics.profiler:
+            physics.profiler.dump_json("profile_physics.json")
+            physics.profiler.dump_csv("profile_physics.csv")
+    physics.send(command)
+
+def load_scene():
+    set_scene(*scenefile.load(scene_file_field.get("1.0","end-1c")))
+
+def get_closest_point_to_coords(x, y):
+    return picker.closest_point(x, y)
+
+def get_closest_link_to_coords(x, y):
+    return picker.closest_link(x, y)
+
+def get_closest_force_to_coords(x, y):
+    return picker.closest_force(x, y)
 
 def create_point(x, y):
-    new_point = point(name_field.get("1.0","end-1c"), vec2(x, y), vec2(), "seagreen", float(point_mass_field.get("1.0","end-1c")), staticPoint.get())
-    points.append(new_point)
+    physics.send(session.edit("add_point", name=name_field.get("1.0","end-1c"), x=x, y=y, color="seagreen", mass=float(point_mass_field.get("1.0","end-1c")), static=staticPoint.get()))
 
 def delete_point(x, y):
     point_tbd = get_closest_point_to_coords(x, y)
 
     if point_tbd:
+        # links and forces on the point are removed along with it; the
+        # buffers lose it once a frame without it comes back
+        physics.send(session.edit("remove_point", point=point_tbd))
+
+def draw_frame():
+    # runs every frame_ms on the Tk loop, drawing whatever frame the
+    # physics thread published last
+    global view, picker, history_range, profiling, frames_drawn
+    now = time.perf_counter()
+    root.after(frame_ms, draw_frame)
+
+    if click_op.get() == "cp":
+        instruction.set("Click to create point at\nmouse cursor position.\nSet name and mass in\ninput fields.")
+    elif click_op.get() == "dp":
+        instruction.set("Click to remove point \nclosest to mouse cursor.")
+    elif click_op.get() == "cl":
+        instruction.set("Click to select points\nto link. Set name and\nspring constant in\ninput fields.")
+    elif click_op.get() == "dl":
+        instruction.set("Click to remove link\nclosest to mouse cursor.")
+    elif click_op.get() == "af":
+        instruction.set("Right click to select\npoints to apply force to.\nLeft click to set the\nforce vector.")
+    elif click_op.get() == "rf":
+        instruction.set("Click to remove force\nclosest to mouse cursor.")
+    elif click_op.get() == "cm":
+        instruction.set("Left click to choose\nmasses to calculate\ncenter of mass. Right\nclick to remove mass.")
+
+    # only time the engine and renderer internals while the HUD is on
+    hud = perfHUD.get()
+    if hud != profiling:
+        physics.profile(hud)
+        perf.restart()
+        profiling = hud
+    renderer.profiler = perf if hud else None
+    if hud:
+        perf.begin_frame(now)
+
+    latest = physics.latest()
+    if latest.version != view.version:
+        # drop selected points that are gone from the world
+        selection.prune(latest.point_index)
+        linking_buffer[:] = [p for p in linking_buffer if p in latest.point_index]
+    view = latest
+    picker = view.picker
+    selection.sim = view
+
+    if len(calc_com_buffer) and calc_com_buffer.total_mass():
+        com_pos, com_mass = calc_com()
+    else:
+        com_pos = None
+
+    renderer.draw(view, get_active_cam(), force_buffer, linking_buffer, calc_com_buffer, com_pos,
+                  pointLabelType.get() if pointLabels.get() else None,
+                  linkLabelType.get() if linkLabels.get() else None)
+
+    if hud or energyDiag.get():
+        # the overlay text is only rebuilt a few times a second
+        if frames_drawn % 15 == 0:
+            parts = []
+            if hud:
+                parts.append(perf.text())
+                if view.hud:
+                    parts.append("physics thread\n" + view.hud)
+            if energyDiag.get() and view.energy:
+                parts.append(view.energy)
+            renderer.draw_hud("\n\n".join(parts))
+    else:
+        renderer.clear_hud()
+    frames_drawn += 1
+
+    if hud:
+        perf.add("render", time.perf_counter() - now)
+        perf.end_frame()
 
-        # if point is an end of a link, delete the link
-        # as well
-        for l in links:
-            if l.p1 == point_tbd or l.p2 == point_tbd:
-                links.remove(l)
-                del l
-        
-        points.remove(point_tbd)
-        del point_tbd
+    # keep the history slider on the frame the world is at
+    if not replay:
+        if history_range != view.history_range:
+            history_range = view.history_range
+            historyScale.configure(from_=history_range[0], to=history_range[1])
+        if int(historyScale.get()) != view.history_position:
+            historyScale.set(view.history_position)
 
 root = Tk()
 root.title("Mechuilibria")
@@ -449,9 +403,41 @@ link_label_type_k.grid(row=6, column=0)
 pauseResumeButton = Button(root, text="Pause/Resume", command=toggle_pause)
 pauseResumeButton.grid(row=7, column=0)
 
+# scene files
+saveSceneButton = Button(root, text="Save Scene", command=save_scene)
+saveSceneButton.grid(row=8, column=0)
+loadSceneButton = Button(root, text="Load Scene", command=load_scene)
+loadSceneButton.grid(row=9, column=0)
+
+# performance overlay
+perfHUD = IntVar()
+perfHUDCheck = Checkbutton(root, text="Perf. HUD", variable=perfHUD)
+perfHUDCheck.grid(row=10, column=0)
+saveProfileButton = Button(root, text="Save Profile", command=save_profile)
+saveProfileButton.grid(row=11, column=0)
+
+# stop stepping structures that have come to rest
+sleepIslands = IntVar()
+sleepIslandsCheck = Checkbutton(root, text="Sleep", variable=sleepIslands, command=toggle_sleep)
+sleepIslandsCheck.grid(row=12, column=0)
+
+# contacts between points and links
+collisions = IntVar()
+collisionsCheck = Checkbutton(root, text="Collisions", variable=collisions, command=toggle_collisions)
+collisionsCheck.grid(row=13, column=0)
+
+# energy and momentum totals on the canvas
+energyDiag = IntVar()
+energyDiagCheck = Checkbutton(root, text="Energy", variable=energyDiag, command=toggle_energy)
+energyDiagCheck.grid(row=14, column=0)
+
 tk_canvas = Canvas(root, width=900, height=500, bg="white")
 tk_canvas.grid(row=0, column=1, rowspan=15, columnspan=5)
 
+# rewind
+historyScale = Scale(root, from_=0, to=0, orient=HORIZONTAL, showvalue=0, length=900, command=scrub_history)
+historyScale.grid(row=15, column=1, columnspan=5)
+
 main_cam = camera("main_cam", vec2(100, 50), 1, "active")
 
 # canvas click
@@ -509,6 +495,12 @@ link_color_field_label.grid(row=17, column=4)
 link_color_field = Text(root, height=1, width=20)
 link_color_field.grid(row=18, column=4)
 
+scene_file_field_label = Label(root, text="Scene File (.json/.npz)")
+scene_file_field_label.grid(row=17, column=5)
+scene_file_field = Text(root, height=1, width=20)
+scene_file_field.grid(row=18, column=5)
+scene_file_field.insert("1.0", "scene.json")
+
 tk_canvas.bind('<Button-1>', clicked_on_canvas)
 tk_canvas.bind('<Button-3>', right_clicked_on_canvas)
 
@@ -520,171 +512,32 @@ root.bind("<Right>", move_current_cam_right)
 root.bind("<Control_L>", zoom_current_cam_out)
 root.bind("<Shift_L>", zoom_current_cam_in)
 
-# crane
-n0 = point("n0", vec2(-30,-100), vec2(), "seagreen", 1, static=True)
-n1 = point("n1", vec2(30,-100), vec2(), "seagreen", 1, static=True)
-n2 = point("n2", vec2(-30,0), vec2(), "seagreen", 1)
-n3 = point("n3", vec2(30,-0), vec2(), "seagreen", 1)
-n4 = point("n4", vec2(-30,100), vec2(), "seagreen", 1)
-n5 = point("n5", vec2(30,100), vec2(), "seagreen", 1)
-n6 = point("n6", vec2(-30,200), vec2(), "seagreen", 1)
-n7 = point("n7", vec2(30,200), vec2(), "seagreen", 1)
-
-t0 = point("t0", vec2(-150, 100), vec2(), "seagreen", 5)
-t1 = point("t1", vec2(-150, 200), vec2(), "seagreen", 7.5)
-
-z0 = point("z0", vec2(350, 200), vec2(), "seagreen", 1.5)
-z1 = point("z1", vec2(450, 200), vec2(), "seagreen", 1)
-z2 = point("z2", vec2(350, 160), vec2(), "seagreen", 1.5)
-z3 = point("z3", vec2(350, 50), vec2(50,0), "seagreen", 0.05)
-
-m0 = rigid_link("m0", n0, n1, "skyblue", 1000)
-m1 = rigid_link("m1", n2, n3, "skyblue", 1000)
-m2 = rigid_link("m2", n4, n5, "skyblue", 1000)
-m3 = rigid_link("m3", n6, n7, "skyblue", 1000)
-m4 = rigid_link("m4", n0, n2, "skyblue", 1000)
-m5 = rigid_link("m5", n2, n4, "skyblue", 1000)
-m6 = rigid_link("m6", n4, n6, "skyblue", 1000)
-m7 = rigid_link("m7", n1, n3, "skyblue", 1000)
-m8 = rigid_link("m8", n3, n5, "skyblue", 1000)
-m9 = rigid_link("m9", n5, n7, "skyblue", 1000)
-m10 = rigid_link("m10", n0, n3, "magenta4", 200)
-m11 = rigid_link("m11", n2, n5, "hotpink", 5000)
-m12 = rigid_link("m12", n4, n7, "magenta4", 200)
-
-r0 = rigid_link("r0", t0, n4, "skyblue", 1000)
-r1 = rigid_link("r1", t1, n6, "skyblue", 1000)
-r2 = rigid_link("r2", t0, t1, "skyblue", 1000)
-r3 = rigid_link("r3", t0, n6, "hotpink", 5000)
-
-f0 = rigid_link("f0", n7, z0, "skyblue", 1000)
-f1 = rigid_link("f1", n5, z0, "hotpink", 5000)
-f2 = rigid_link("f2", z0, z1, "skyblue", 1000)
-f3 = rigid_link("f3", n5, z2, "hotpink", 5000)
-f4 = rigid_link("f4", z2, z0, "skyblue", 1000)
-f5 = rigid_link("f5", z2, z1, "skyblue", 1000)
-f6 = rigid_link("f6", z2, n7, "skyblue", 1000)
-f7 = rigid_link("f7", z2, z3, "orange", 2)
-
 # lists of "things"
 cameras = [main_cam]
 
-floor = ground(-100, "green", 0.5, 0.8)
-
-points = [n0, n1, n2, n3, n4, n5, n6, n7,
-          t0, t1,
-          z0, z1, z2, z3]
-
-links = [m0, m1, m2, m3, m4, m5, m6, m7, m8, m9, m10, m11, m12,
-         r0, r1, r2, r3,
-         f0, f1, f2, f3, f4, f5, f6, f7]
-
-forces = []
-
-force_buffer = []
-
-linking_buffer = []
-
-calc_com_buffer = []
-
-while True:
-
-    if click_op.get() == "cp":
-        instruction.set("Click to create point at\nmouse cursor position.\nSet name and mass in\ninput fields.")
-    elif click_op.get() == "dp":
-        instruction.set("Click to remove point \nclosest to mouse cursor.")
-    elif click_op.get() == "cl":
-        instruction.set("Click to select points\nto link. Set name and\nspring constant in\ninput fields.")
-    elif click_op.get() == "dl":
-        instruction.set("Click to remove link\nclosest to mouse cursor.")
-    elif click_op.get() == "af":
-        instruction.set("Right click to select\npoints to apply force to.\nLeft click to set the\nforce vector.")
-    elif click_op.get() == "rf":
-        instruction.set("Click to remove force\nclosest to mouse cursor.")
-    elif click_op.get() == "cm":
-        instruction.set("Left click to choose\nmasses to calculate\ncenter of mass. Right\nclick to remove mass.")
-
-    if not dt == 0:
-        floor.apply_force(points)
-    tk_canvas.create_rectangle(-1000, space2canvas(vec2(0, floor.get_height())).y,
-                                1000, 500,
-                                fill=floor.get_color())
-
-    for f in forces:
-        tk_canvas.create_line(space2canvas(f.point.get_pos()).x, space2canvas(f.point.get_pos()).y,
-                              space2canvas(vec2(f.point.get_pos().x+f.force.x*100, f.point.get_pos().y)).x, space2canvas(vec2(f.point.get_pos().x, f.point.get_pos().y + f.force.y * 100)).y,
-                              fill="blue", arrow=LAST)
-        f.apply()
-
-    for p in force_buffer:
-        tk_canvas.create_oval(space2canvas(p.get_pos()).x-5, space2canvas(p.get_pos()).y-5,
-                              space2canvas(p.get_pos()).x+5, space2canvas(p.get_pos()).y+5,
-                              fill="blue")
-
-    for p in linking_buffer:
-        tk_canvas.create_oval(space2canvas(p.get_pos()).x-5, space2canvas(p.get_pos()).y-5,
-                              space2canvas(p.get_pos()).x+5, space2canvas(p.get_pos()).y+5,
-                              fill="red")
-
-    if len(calc_com_buffer):
-        for p in calc_com_buffer:
-            tk_canvas.create_oval(space2canvas(p.get_pos()).x-5, space2canvas(p.get_pos()).y-5,
-                              space2canvas(p.get_pos()).x+5, space2canvas(p.get_pos()).y+5,
-                              fill="#ffc100")
-        
-        com_pos, com_mass = calc_com()
-        tk_canvas.create_line(space2canvas(com_pos).x-8, space2canvas(com_pos).y-8,
-                              space2canvas(com_pos).x+8, space2canvas(com_pos).y+8,
-                              fill="#ffc100")
-
-        tk_canvas.create_line(space2canvas(com_pos).x-8, space2canvas(com_pos).y+8,
-                              space2canvas(com_pos).x+8, space2canvas(com_pos).y-8,
-                              fill="#ffc100")
-
-    for link in links:
-        if not dt == 0:
-            link.apply_force()
-        tk_canvas.create_line(space2canvas(link.p1.get_pos()).x, space2canvas(link.p1.get_pos()).y,
-                              space2canvas(link.p2.get_pos()).x, space2canvas(link.p2.get_pos()).y,
-                              fill=link.get_color())
-    
-    for p in points:
-        tk_canvas.create_oval(space2canvas(p.get_pos()).x-1, space2canvas(p.get_pos()).y-1,
-                              space2canvas(p.get_pos()).x+1, space2canvas(p.get_pos()).y+1,
-                              fill=p.get_color())
-
-        if not dt == 0:
-            p.apply_gravity()                    
-            p.apply_drag()
-            p.update_vel()
-            p.update_pos()
-
-    if pointLabels.get():
-        if pointLabelType.get() == "n":
-            for p in points:
-                tk_canvas.create_text(space2canvas(p.get_pos()).x-10, space2canvas(p.get_pos()).y-10,
-                                      text=p.get_name())
-        elif pointLabelType.get() == "m":
-            for p in points:
-                tk_canvas.create_text(space2canvas(p.get_pos()).x-10, space2canvas(p.get_pos()).y-10,
-                                      text=str(p.get_mass()))
-
-    if linkLabels.get():
-        if linkLabelType.get() == "n":
-            for l in links:
-                tk_canvas.create_text((space2canvas(l.p1.get_pos()).x + space2canvas(l.p2.get_pos()).x)/2,
-                                      (space2canvas(l.p1.get_pos()).y + space2canvas(l.p2.get_pos()).y)/2,
-                                      text=l.get_name(), fill=l.get_color())
-        elif linkLabelType.get() == "k":
-            for l in links:
-                tk_canvas.create_text((space2canvas(l.p1.get_pos()).x + space2canvas(l.p2.get_pos()).x)/2,
-                                      (space2canvas(l.p1.get_pos()).y + space2canvas(l.p2.get_pos()).y)/2,
-                                      text=str(l.get_k()), fill=l.get_color())
-    
-    root.update()
-    tk_canvas.delete("all")
-    
-    for p in points:
-        p.clear_accel()
-
+# a scene name or file can be given on the command line
+arg_parser = argparse.ArgumentParser(description="Mechuilibria")
+arg_parser.add_argument("scene", nargs="?", default="crane", help="scene name or .json/.npz scene file")
+arg_parser.add_argument("--replay", help="recording directory to play back instead of simulating (see trajectory.py)")
+arg_parser.add_argument("--record", help="directory to record this session's edits to, for replaying with session.py")
+args = arg_parser.parse_args()
+
+physics = None
+replay = None
+history_range = None
+profiling = False
+frames_drawn = 0
+perf = profiler.profiler()
+
+if args.replay:
+    import trajectory
+    recording = trajectory.trajectory(args.replay)
+    recorded_sim, recorded_cams = recording.scene()
+    set_scene(recorded_sim, recorded_cams, trajectory.replayer(recording, recorded_sim))
+elif args.scene.endswith(".json") or args.scene.endswith(".npz"):
+    set_scene(*scenefile.load(args.scene))
+else:
+    set_scene(scenes.get_scene(args.scene))
+
+draw_frame()
 root.mainloop()
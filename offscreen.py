@@ -0,0 +1,586 @@
+import argparse
+import math
+import multiprocessing
+import os
+import shutil
+import struct
+import subprocess
+import time
+import zlib
+
+import numpy as np
+
+from engine import *
+from renderer import camera, cam_transform
+import scenes
+import scenefile
+
+# Draws what the canvas shows (floor, forces, markers, centre of mass,
+# links, points, labels) into an RGB pixel array, without Tk or a
+# display, so a run can be turned into frames or a video much faster than
+# it plays. Frames are (height, width, 3) uint8 arrays; save() writes them
+# as .png or .ppm, and an encoder pipes them to ffmpeg.
+#
+# Everything per object is done as whole-array numpy operations: every
+# link's pixels are worked out and written in one go, and so on. There is
+# no Python loop per link or point (labels and markers aside), so the
+# number of numpy calls per frame stays the same however big the scene
+# is, while the time still grows with the links and points in view and
+# the pixels they cover. A recorded trajectory (see trajectory.py) can be
+# rendered on several processes at once with render_trajectory().
+
+########################
+#       COLOURS        #
+########################
+
+# the Tk colour names the scenes and the GUI use, plus the usual ones;
+# "#rrggbb" and "grayN" work too
+colors = {"white": (255, 255, 255), "black": (0, 0, 0), "red": (255, 0, 0), "green": (0, 255, 0),
+          "blue": (0, 0, 255), "yellow": (255, 255, 0), "cyan": (0, 255, 255), "magenta": (255, 0, 255),
+          "gray": (190, 190, 190), "grey": (190, 190, 190), "orange": (255, 165, 0),
+          "purple": (160, 32, 240), "brown": (165, 42, 42), "pink": (255, 192, 203),
+          "navy": (0, 0, 128), "gold": (255, 215, 0), "skyblue": (135, 206, 235),
+          "lightblue": (173, 216, 230), "seagreen": (46, 139, 87), "darkgreen": (0, 100, 0),
+          "hotpink": (255, 105, 180), "magenta4": (139, 0, 139), "steelblue": (70, 130, 180),
+          "tomato": (255, 99, 71), "violet": (238, 130, 238), "maroon": (176, 48, 96)}
+
+def rgb(color):
+    # (r, g, b) of a Tk colour; anything unknown comes out grey rather
+    # than stopping a long render
+    color = color.strip().lower()
+    if color in colors:
+        return colors[color]
+    if color.startswith("#") and len(color) == 7:
+        try:
+            return tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+        except ValueError:
+            pass
+    for prefix in ("gray", "grey"):
+        if color.startswith(prefix) and color[len(prefix):].isdigit():
+            v = round(min(int(color[len(prefix):]), 100) * 2.55)
+            return (v, v, v)
+    return colors["gray"]
+
+# pixel words are little-endian whatever the machine, so their first three
+# bytes are r, g and b
+word_dtype = np.dtype("<u4")
+
+def word(color):
+    # a colour as one of image's pixel words
+    r, g, b = rgb(color)
+    return r | g << 8 | b << 16
+
+########################
+#        FONT          #
+########################
+
+# 3x5 bitmap font: five rows of three bits per character, top to bottom.
+# Lower case is drawn as upper case
+glyphs = {" ": (0, 0, 0, 0, 0), "0": (7, 5, 5, 5, 7), "1": (2, 6, 2, 2, 7), "2": (7, 1, 7, 4, 7),
+          "3": (7, 1, 3, 1, 7), "4": (5, 5, 7, 1, 1), "5": (7, 4, 7, 1, 7), "6": (7, 4, 7, 5, 7),
+          "7": (7, 1, 1, 2, 2), "8": (7, 5, 7, 5, 7), "9": (7, 5, 7, 1, 7),
+          "A": (2, 5, 7, 5, 5), "B": (6, 5, 6, 5, 6), "C": (3, 4, 4, 4, 3), "D": (6, 5, 5, 5, 6),
+          "E": (7, 4, 6, 4, 7), "F": (7, 4, 6, 4, 4), "G": (3, 4, 5, 5, 3), "H": (5, 5, 7, 5, 5),
+          "I": (7, 2, 2, 2, 7), "J": (1, 1, 1, 5, 2), "K": (5, 5, 6, 5, 5), "L": (4, 4, 4, 4, 7),
+          "M": (5, 7, 7, 5, 5), "N": (6, 5, 5, 5, 5), "O": (2, 5, 5, 5, 2), "P": (6, 5, 6, 4, 4),
+          "Q": (2, 5, 5, 6, 3), "R": (6, 5, 6, 5, 5), "S": (3, 4, 2, 1, 6), "T": (7, 2, 2, 2, 2),
+          "U": (5, 5, 5, 5, 7), "V": (5, 5, 5, 5, 2), "W": (5, 5, 7, 7, 5), "X": (5, 5, 2, 5, 5),
+          "Y": (5, 5, 2, 2, 2), "Z": (7, 1, 2, 4, 7),
+          ".": (0, 0, 0, 0, 2), ",": (0, 0, 0, 2, 4), "-": (0, 0, 7, 0, 0), "+": (0, 2, 7, 2, 0),
+          ":": (0, 2, 0, 2, 0), "/": (1, 1, 2, 4, 4), "%": (5, 1, 2, 4, 5), "(": (1, 2, 2, 2, 1),
+          ")": (4, 2, 2, 2, 4), "_": (0, 0, 0, 0, 7), "=": (0, 7, 0, 7, 0), "?": (7, 1, 2, 0, 2)}
+
+glyph_w = 3
+glyph_h = 5
+# advance per character and per line
+char_w = glyph_w + 1
+line_h = glyph_h + 2
+
+# character -> (5, 3) bool mask
+glyph_masks = {c: np.array([[(row >> (2 - i)) & 1 for i in range(3)] for row in rows], dtype=bool)
+               for c, rows in glyphs.items()}
+
+def text_mask(text):
+    # one line of text as a bool mask, glyph_h high
+    if not text:
+        return np.zeros((glyph_h, 0), dtype=bool)
+    mask = np.zeros((glyph_h, len(text) * char_w - 1), dtype=bool)
+    for i, c in enumerate(text.upper()):
+        mask[:, i * char_w:i * char_w + glyph_w] = glyph_masks.get(c, glyph_masks["?"])
+    return mask
+
+########################
+#       IMAGE          #
+########################
+
+# an RGB pixel buffer with the drawing primitives the renderer needs.
+# Coordinates are canvas pixels: x to the right, y down. Each pixel is
+# one uint32 word (bytes r, g, b, unused), which numpy scatters several
+# times faster than three separate bytes; `pixels` is the (height, width,
+# 3) view of the same memory. Colours are given as word(name), or as an
+# array of words, one per object
+class image():
+    def __init__(self, width, height, background="white"):
+        self.width = width
+        self.height = height
+        # a blank frame to copy from, which is much quicker than filling
+        self.blank = np.full((height, width), word(background), dtype=word_dtype)
+        self.words = self.blank.copy()
+        self.flat = self.words.reshape(-1)
+        self.pixels = self.words.view(np.uint8).reshape(height, width, 4)[:, :, :3]
+
+    def clear(self):
+        np.copyto(self.words, self.blank)
+
+    def plot(self, xs, ys, color):
+        # set the pixels at integer (xs, ys) that are on the image; color
+        # is one word or one per pixel
+        keep = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if np.ndim(color):
+            color = color[keep]
+        self.flat[ys[keep] * self.width + xs[keep]] = color
+
+    def lines(self, ax, ay, bx, by, color):
+        # one-pixel segments, all in one go. color is one word or one per
+        # segment
+        ax, ay, bx, by, keep = clip_segments(ax, ay, bx, by, -1, -1, self.width, self.height)
+        if np.ndim(color):
+            color = color[keep]
+        if not len(ax):
+            return
+
+        # one sample per pixel along the longer axis
+        dx = bx - ax
+        dy = by - ay
+        counts = np.maximum(np.abs(dx), np.abs(dy)).astype(np.intp) + 1
+        seg = np.repeat(np.arange(len(ax)), counts)
+        starts = np.cumsum(counts) - counts
+        t = (np.arange(len(seg)) - starts[seg]) / np.maximum(counts - 1, 1)[seg]
+        xs = np.rint(ax[seg] + t * dx[seg]).astype(np.intp)
+        ys = np.rint(ay[seg] + t * dy[seg]).astype(np.intp)
+        self.plot(xs, ys, color[seg] if np.ndim(color) else color)
+
+    def squares(self, xs, ys, size, color):
+        # size x size squares centred on (xs, ys)
+        xs = np.rint(xs).astype(np.intp) - size // 2
+        ys = np.rint(ys).astype(np.intp) - size // 2
+        for oy in range(size):
+            for ox in range(size):
+                self.plot(xs + ox, ys + oy, color)
+
+    def discs(self, xs, ys, r, color):
+        oy, ox = np.mgrid[-r:r+1, -r:r+1]
+        inside = ox**2 + oy**2 <= r * r + r
+        ox = ox[inside]
+        oy = oy[inside]
+        for x, y in zip(np.rint(xs).astype(np.intp).tolist(), np.rint(ys).astype(np.intp).tolist()):
+            self.plot(ox + x, oy + y, color)
+
+    def rectangle(self, x0, y0, x1, y1, color):
+        x0 = max(int(round(x0)), 0)
+        y0 = max(int(round(y0)), 0)
+        x1 = min(int(round(x1)), self.width)
+        y1 = min(int(round(y1)), self.height)
+        if x0 < x1 and y0 < y1:
+            self.words[y0:y1, x0:x1] = color
+
+    def triangle(self, ax, ay, bx, by, cx, cy, color):
+        x0 = max(int(math.floor(min(ax, bx, cx))), 0)
+        x1 = min(int(math.ceil(max(ax, bx, cx))), self.width - 1)
+        y0 = max(int(math.floor(min(ay, by, cy))), 0)
+        y1 = min(int(math.ceil(max(ay, by, cy))), self.height - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        ys, xs = np.mgrid[y0:y1+1, x0:x1+1]
+        # same side of all three edges
+        e0 = (bx - ax) * (ys - ay) - (by - ay) * (xs - ax)
+        e1 = (cx - bx) * (ys - by) - (cy - by) * (xs - bx)
+        e2 = (ax - cx) * (ys - cy) - (ay - cy) * (xs - cx)
+        inside = ((e0 >= 0) & (e1 >= 0) & (e2 >= 0)) | ((e0 <= 0) & (e1 <= 0) & (e2 <= 0))
+        self.words[ys[inside], xs[inside]] = color
+
+    def arrows(self, ax, ay, bx, by, color, head=10, half_width=4):
+        # lines with a filled head at (bx, by), like Tk's arrow="last"
+        self.lines(ax, ay, bx, by, color)
+        for x0, y0, x1, y1 in zip(ax.tolist(), ay.tolist(), bx.tolist(), by.tolist()):
+            length = math.hypot(x1 - x0, y1 - y0)
+            if length < 1:
+                continue
+            ux = (x1 - x0) / length
+            uy = (y1 - y0) / length
+            h = min(head, length)
+            self.triangle(x1, y1, x1 - ux * h - uy * half_width, y1 - uy * h + ux * half_width,
+                          x1 - ux * h + uy * half_width, y1 - uy * h - ux * half_width, color)
+
+    def text(self, x, y, text, color, anchor="center"):
+        # anchor is "center" or "nw", as in Tk's create_text
+        rows = text.split("\n")
+        width = max(len(r) for r in rows) * char_w - 1
+        height = len(rows) * line_h - 2
+        if anchor == "center":
+            x -= width / 2
+            y -= height / 2
+        x = int(round(x))
+        y = int(round(y))
+        for i, row in enumerate(rows):
+            ys, xs = np.nonzero(text_mask(row))
+            self.plot(xs + x, ys + y + i * line_h, color)
+
+def clip_segments(ax, ay, bx, by, x0, y0, x1, y1):
+    # Liang-Barsky on arrays of segments: the parts inside the rectangle,
+    # and which of the segments have any
+    dx = bx - ax
+    dy = by - ay
+    t0 = np.zeros(len(ax))
+    t1 = np.ones(len(ax))
+    keep = np.ones(len(ax), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, ax - x0), (dx, x1 - ax), (-dy, ay - y0), (dy, y1 - ay)):
+            keep &= ~((p == 0) & (q < 0))
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+    t0 = t0[keep]
+    t1 = t1[keep]
+    ax = ax[keep]
+    ay = ay[keep]
+    dx = dx[keep]
+    dy = dy[keep]
+    return ax + t0 * dx, ay + t0 * dy, ax + t1 * dx, ay + t1 * dy, keep
+
+########################
+#        FILES         #
+########################
+
+def write_ppm(pixels, path):
+    height, width = pixels.shape[:2]
+    with open(path, "wb") as out:
+        out.write(b"P6\n%d %d\n255\n" % (width, height))
+        out.write(np.ascontiguousarray(pixels).tobytes())
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+def write_png(pixels, path, level=1):
+    # filter type 0 on every row; frames are mostly background, so even
+    # the fastest zlib level packs them well
+    height, width = pixels.shape[:2]
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * 3)
+    with open(path, "wb") as out:
+        out.write(b"\x89PNG\r\n\x1a\n")
+        out.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        out.write(png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)))
+        out.write(png_chunk(b"IEND", b""))
+
+def save(pixels, path):
+    if path.endswith(".ppm"):
+        write_ppm(pixels, path)
+    elif path.endswith(".png"):
+        write_png(pixels, path)
+    else:
+        raise ValueError("don't know how to write '" + path + "', use .png or .ppm")
+
+def is_pattern(out):
+    # "frames/%05d.png" is a frame sequence, anything else a video file
+    return "%" in out
+
+# pipes raw RGB frames to ffmpeg, which writes them as a video to path
+class encoder():
+    def __init__(self, path, width, height, fps=60, ffmpeg="ffmpeg", args=("-pix_fmt", "yuv420p")):
+        exe = shutil.which(ffmpeg)
+        if exe is None:
+            raise RuntimeError(ffmpeg + " not found; write a frame sequence instead, e.g. -o frames/%05d.png")
+        self.width = width
+        self.height = height
+        self.proc = subprocess.Popen([exe, "-y", "-loglevel", "error",
+                                      "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                      "-s", "%dx%d" % (width, height), "-r", str(fps), "-i", "-",
+                                      *args, path], stdin=subprocess.PIPE)
+        self.frames = 0
+
+    def write(self, frame):
+        # a pixel array, or its bytes as rendered by a worker
+        self.proc.stdin.write(frame if isinstance(frame, bytes) else np.ascontiguousarray(frame).tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.proc.stdin.closed:
+            return
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError("ffmpeg failed with exit code " + str(self.proc.returncode))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+########################
+#      RENDERER        #
+########################
+
+# draws a world into an image the way renderer.canvas_renderer draws it on
+# the canvas, taking the same arguments. sim is an engine.world or a
+# background.frame; draw() can also be given positions, an (N, 2) array in
+# the order of sim.points, to draw instead of the points' own, which is how
+# trajectories are drawn
+class offscreen_renderer():
+    # labels are dropped below this zoom (pixels per world unit) and when
+    # more than label_limit would show, as on the canvas
+    lod_scale = 0.5
+    label_limit = 200
+
+    def __init__(self, width=900, height=500, background="white"):
+        self.width = width
+        self.height = height
+        self.image = image(width, height, background)
+        self.topology = None
+
+    def sync_topology(self, sim):
+        # colours and indices, worked out again only when the world's
+        # points, links or forces change
+        key = (getattr(sim, "version", None), len(sim.points), len(sim.links), len(sim.forces))
+        if key == self.topology:
+            return
+        self.topology = key
+
+        index = getattr(sim, "point_index", None) or {p: i for i, p in enumerate(sim.points)}
+        by_name = {}
+        def color_array(objs):
+            table = [by_name.setdefault(o.get_color(), word(o.get_color())) for o in objs]
+            return np.array(table, dtype=word_dtype)
+
+        self.point_colors = color_array(sim.points)
+        self.link_colors = color_array(sim.links)
+        self.link_i = np.array([index[l.p1] for l in sim.links], dtype=np.intp)
+        self.link_j = np.array([index[l.p2] for l in sim.links], dtype=np.intp)
+        self.force_idx = np.array([index[f.point] for f in sim.forces], dtype=np.intp)
+        self.force_vec = np.array([(f.force.x, f.force.y) for f in sim.forces], dtype=np.float64).reshape(-1, 2)
+        self.index = index
+
+    def positions(self, sim, positions=None):
+        if positions is not None:
+            return np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if hasattr(sim, "positions"):
+            return np.array(sim.positions, dtype=np.float64).reshape(-1, 2)
+        return np.array([(p.pos.x, p.pos.y) for p in sim.points], dtype=np.float64).reshape(-1, 2)
+
+    def draw(self, sim, cam, force_buffer=(), linking_buffer=(), com_buffer=(), com=None,
+             point_labels=None, link_labels=None, positions=None, hud=None):
+        # returns the pixels, which are overwritten by the next draw()
+        img = self.image
+        img.clear()
+        self.sync_topology(sim)
+        s, ox, oy = cam_transform(cam, self.width, self.height)
+
+        # every point through the camera at once
+        pos = self.positions(sim, positions)
+        xs = pos[:, 0] * s + ox
+        ys = oy - pos[:, 1] * s
+
+        # in the canvas renderer's stacking order
+        if sim.floor:
+            top = oy - sim.floor.get_height() * s
+            img.rectangle(0, top, self.width, self.height, word(sim.floor.get_color()))
+            img.lines(np.array([0.0]), np.array([top]), np.array([self.width - 1.0]), np.array([top]),
+                      word("black"))
+
+        if len(self.force_idx):
+            fx = xs[self.force_idx]
+            fy = ys[self.force_idx]
+            img.arrows(fx, fy, fx + self.force_vec[:, 0] * 100 * s, fy - self.force_vec[:, 1] * 100 * s,
+                       word("blue"))
+
+        for buffer, color in ((force_buffer, "blue"), (linking_buffer, "red"), (com_buffer, "#ffc100")):
+            idx = [self.index[p] for p in buffer if p in self.index]
+            if idx:
+                img.discs(xs[idx], ys[idx], 5, word("black"))
+                img.discs(xs[idx], ys[idx], 4, word(color))
+
+        if com:
+            x = com.x * s + ox
+            y = oy - com.y * s
+            img.lines(np.array([x - 8, x - 8]), np.array([y - 8, y + 8]),
+                      np.array([x + 8, x + 8]), np.array([y + 8, y - 8]), word("#ffc100"))
+
+        if len(self.link_i):
+            img.lines(xs[self.link_i], ys[self.link_i], xs[self.link_j], ys[self.link_j], self.link_colors)
+
+        if len(xs):
+            img.squares(xs, ys, 3, self.point_colors)
+
+        if (point_labels or link_labels) and s >= self.lod_scale:
+            self.draw_labels(sim, xs, ys, point_labels, link_labels)
+
+        if hud:
+            img.text(8, 8, hud, word("gray20"), anchor="nw")
+        return img.pixels
+
+    def draw_labels(self, sim, xs, ys, point_labels, link_labels):
+        labels = []
+        w, h = self.width, self.height
+        if point_labels:
+            text = (lambda p: p.get_name()) if point_labels == "n" else (lambda p: str(p.get_mass()))
+            for p, x, y in zip(sim.points, xs.tolist(), ys.tolist()):
+                if 0 < x < w and 0 < y < h:
+                    labels.append((x - 10, y - 10, text(p), word("black")))
+        if link_labels:
+            text = (lambda l: l.get_name()) if link_labels == "n" else (lambda l: str(l.get_k()))
+            mx = ((xs[self.link_i] + xs[self.link_j]) / 2).tolist()
+            my = ((ys[self.link_i] + ys[self.link_j]) / 2).tolist()
+            for l, x, y, color in zip(sim.links, mx, my, self.link_colors):
+                if 0 < x < w and 0 < y < h:
+                    labels.append((x, y, text(l), color))
+        if len(labels) > self.label_limit:
+            return
+        for x, y, text, color in labels:
+            self.image.text(x, y, text, color)
+
+def fit_camera(positions, width=900, height=500, margin=1.1):
+    # a camera with all of positions in view
+    pos = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if not len(pos):
+        return camera("offscreen", vec2(0, 0), 1, "active")
+    lo = pos.min(axis=0)
+    hi = pos.max(axis=0)
+    centre = (lo + hi) / 2
+    zoom = max((hi[0] - lo[0]) / width, (hi[1] - lo[1]) / height, 1E-3) * margin
+    return camera("offscreen", vec2(float(centre[0]), float(centre[1])), zoom, "active")
+
+########################
+#     RENDER RUNS      #
+########################
+
+# render_run() simulates and draws frame by frame, on this process.
+# render_trajectory() draws a recording, split into runs of frames over
+# several processes: each worker opens the recording itself (the files
+# are memory-mapped, so nothing big is sent to it) and either writes its
+# frames as files or sends them back as bytes, in order, for an encoder
+
+def frame_sink(out, width, height, fps):
+    # (write(i, pixels), close()) for a frame pattern or a video file
+    if is_pattern(out):
+        folder = os.path.dirname(out)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        return (lambda i, pixels: save(pixels, out % i)), (lambda: None)
+    enc = encoder(out, width, height, fps)
+    return (lambda i, pixels: enc.write(pixels)), enc.close
+
+def render_run(sim, out, duration, fps=60, cam=None, width=900, height=500,
+               point_labels=None, link_labels=None):
+    # simulate sim for `duration` seconds and draw it `fps` times a
+    # second of simulated time; returns the number of frames
+    r = offscreen_renderer(width, height)
+    cam = cam or fit_camera(r.positions(sim), width, height)
+    frames = int(duration * fps)
+    start = sim.time
+    write, close = frame_sink(out, width, height, fps)
+    try:
+        for i in range(frames):
+            write(i, r.draw(sim, cam, point_labels=point_labels, link_labels=link_labels))
+            # to the time of the next frame rather than a whole number of
+            # steps per frame, which would drift off the video's clock
+            sim.run_until(start + (i + 1) / fps)
+    finally:
+        close()
+    return frames
+
+def render_frames(job):
+    # worker: draws frames of a recording; writes them to `out` if it is a
+    # pattern, otherwise returns them as bytes
+    import trajectory
+
+    path, frames, out, cam, width, height, point_labels, link_labels = job
+    traj = trajectory.trajectory(path)
+    sim, cams = traj.scene()
+    r = offscreen_renderer(width, height)
+    rendered = []
+    for i in frames:
+        pixels = r.draw(sim, cam, point_labels=point_labels, link_labels=link_labels, positions=traj.pos[i])
+        if out:
+            save(pixels, out % i)
+        else:
+            rendered.append(pixels.tobytes())
+    return rendered if not out else len(frames)
+
+def render_trajectory(path, out, cam=None, start=0, stop=None, every=1, fps=60, width=900, height=500,
+                      processes=None, chunk=16, point_labels=None, link_labels=None):
+    # returns the number of frames rendered
+    import trajectory
+
+    traj = trajectory.trajectory(path)
+    frames = list(range(start, len(traj) if stop is None else min(stop, len(traj)), every))
+    if cam is None:
+        active = [c for c in traj.scene()[1] if c.get_state() == "active"]
+        cam = active[0] if active else fit_camera(traj.pos[frames[0]] if frames else (), width, height)
+    del traj
+
+    pattern = is_pattern(out)
+    jobs = [(path, frames[i:i + chunk], out if pattern else None, cam, width, height,
+             point_labels, link_labels) for i in range(0, len(frames), chunk)]
+
+    if pattern:
+        folder = os.path.dirname(out)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with multiprocessing.Pool(processes) as pool:
+            return sum(pool.imap_unordered(render_frames, jobs))
+
+    with encoder(out, width, height, fps) as enc, multiprocessing.Pool(processes) as pool:
+        # imap keeps the runs of frames in order
+        for rendered in pool.imap(render_frames, jobs):
+            for frame in rendered:
+                enc.write(frame)
+    return enc.frames
+
+########################
+#        MAIN          #
+########################
+
+def parse_camera(text):
+    x, y, zoom = (float(v) for v in text.split(","))
+    return camera("offscreen", vec2(x, y), zoom, "active")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a scene or a recorded run to images or a video, without a display.")
+    parser.add_argument("source", help="a recording directory (see trajectory.py), or a scene name or file to simulate")
+    parser.add_argument("-o", "--out", required=True,
+                        help="frame pattern such as frames/%%05d.png (or .ppm), or a video file piped through ffmpeg")
+    parser.add_argument("-t", "--duration", type=float, default=10, help="seconds of simulated time, when simulating")
+    parser.add_argument("--fps", type=float, default=60, help="frames per second of simulated time (and of the video)")
+    parser.add_argument("-W", "--width", type=int, default=900)
+    parser.add_argument("-H", "--height", type=int, default=500)
+    parser.add_argument("--camera", type=parse_camera, help="x,y,zoom; by default the scene's camera, or everything in view")
+    parser.add_argument("--point-labels", choices=("n", "m"), help="label points with their name or mass")
+    parser.add_argument("--link-labels", choices=("n", "k"), help="label links with their name or stiffness")
+    parser.add_argument("--start", type=int, default=0, help="first frame of a recording to render")
+    parser.add_argument("--stop", type=int, help="frame of a recording to stop before")
+    parser.add_argument("--every", type=int, default=1, help="render every n-th frame of a recording")
+    parser.add_argument("-j", "--processes", type=int, help="render workers for a recording (default: all cores)")
+    args = parser.parse_args(argv)
+
+    if not is_pattern(args.out) and not shutil.which("ffmpeg"):
+        parser.error("ffmpeg not found; write a frame sequence instead, e.g. -o frames/%05d.png")
+
+    t = time.perf_counter()
+    if os.path.exists(os.path.join(args.source, "meta.json")):
+        frames = render_trajectory(args.source, args.out, args.camera, args.start, args.stop, args.every,
+                                   args.fps, args.width, args.height, args.processes,
+                                   point_labels=args.point_labels, link_labels=args.link_labels)
+    else:
+        if os.path.exists(args.source):
+            sim, cams = scenefile.load(args.source)
+        else:
+            sim, cams = scenes.get_scene(args.source), []
+        active = [c for c in cams if c.get_state() == "active"]
+        frames = render_run(sim, args.out, args.duration, args.fps, args.camera or (active[0] if active else None),
+                            args.width, args.height, args.point_labels, args.link_labels)
+    elapsed = time.perf_counter() - t
+    print("%d frames in %.1f s (%.0f frames/s)" % (frames, elapsed, frames / elapsed if elapsed else 0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import math
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import *
+import islands
+import soa
+
+# Steps the connected components of a world on several processes.
+#
+# Components only meet through the floor, which acts on each point on its
+# own, so any set of whole components can be stepped as an array_world of
+# its own. Each worker gets such a piece once, at the start. Positions and
+# velocities live in one shared-memory block that every worker reads its
+# rows from and writes them back to, so a step() call moves no state
+# through pipes at all.
+#
+# Within a piece, points, links and forces keep their order from the
+# whole world, so every per-point sum adds the same terms in the same
+# order and the explicit integrator gives bit-for-bit what
+# array_world.step() gives, whatever the number of workers. The implicit
+# integrator solves each piece separately: deterministic for a given
+# number of workers, but only equal to one big solve to within the CG
+# tolerance.
+
+########################
+#     COMPONENTS       #
+########################
+
+def component_labels(n, link_i, link_j):
+    # each point's component, as the index of some point in it
+    parent = list(range(n))
+    size = [1] * n
+    for i, j in zip(link_i.tolist(), link_j.tolist()):
+        islands.union(parent, size, i, j)
+    return np.array([islands.find(parent, i) for i in range(n)], dtype=np.intp)
+
+def assign_components(labels, count):
+    # worker of each point: biggest components first, each onto the
+    # least loaded worker so far
+    roots, sizes = np.unique(labels, return_counts=True)
+    loads = [0] * count
+    root_worker = np.zeros(len(labels), dtype=np.intp)
+    for c in np.argsort(-sizes, kind="stable").tolist():
+        w = loads.index(min(loads))
+        loads[w] += int(sizes[c])
+        root_worker[roots[c]] = w
+    return root_worker[labels]
+
+def split(aw, count):
+    # one dict per worker: its point indices and an array_world's worth of
+    # arrays for those points, renumbered from 0
+    point_worker = assign_components(component_labels(len(aw.pos), aw.link_i, aw.link_j), count)
+    link_worker = point_worker[aw.link_i]
+    force_worker = point_worker[aw.force_idx]
+
+    local = np.zeros(len(aw.pos), dtype=np.intp)
+    pieces = []
+    for w in range(count):
+        idx = np.flatnonzero(point_worker == w)
+        if not len(idx):
+            continue
+        local[idx] = np.arange(len(idx))
+        links = np.flatnonzero(link_worker == w)
+        forces = np.flatnonzero(force_worker == w)
+        pieces.append({"points": idx,
+                       "mass": aw.mass[idx], "static": aw.static[idx], "axis": aw.axis[idx],
+                       "link_i": local[aw.link_i[links]], "link_j": local[aw.link_j[links]],
+                       "rest": aw.rest[links], "k": aw.k[links],
+                       "force_idx": local[aw.force_idx[forces]], "force_vec": aw.force_vec[forces],
+                       "floor": aw.floor, "dt": aw.dt, "gravity": tuple(aw.gravity.tolist()),
+                       "drag_coeff": aw.drag_coeff, "integrator": aw.integrator})
+    return pieces
+
+def piece_world(piece, state):
+    idx = piece["points"]
+    return soa.array_world(state[0, idx], state[1, idx], piece["mass"], piece["static"],
+                           piece["link_i"], piece["link_j"], piece["rest"], piece["k"],
+                           piece["force_idx"], piece["force_vec"], piece["floor"],
+                           piece["dt"], piece["gravity"], piece["drag_coeff"],
+                           piece["axis"], piece["integrator"])
+
+def step_piece(aw, idx, state, n, t, steps):
+    # state is (2, N, 2): positions then velocities of the whole world
+    aw.pos[:] = state[0, idx]
+    aw.vel[:] = state[1, idx]
+    aw.time = t
+    aw.steps = steps
+    aw.step(n)
+    state[0, idx] = aw.pos
+    state[1, idx] = aw.vel
+    return aw.time, aw.steps, aw.cg_iterations
+
+########################
+#       WORKERS        #
+########################
+
+def worker(conn, shm_name, n, piece):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    state = np.ndarray((2, n, 2), dtype=np.float64, buffer=shm.buf)
+    aw = piece_world(piece, state)
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        conn.send(step_piece(aw, piece["points"], state, *job))
+
+    del state
+    shm.close()
+
+# with workers=1 the pieces are stepped in this process, one after the
+# other, through the same code; that is the serial reference
+class parallel_stepper():
+    def __init__(self, sim, workers=None):
+        # sim is an array_world, or an engine.world that is copied into one
+        # on every step() and synced back, like the implicit integrator
+        self.sim = sim
+        self.workers = workers or os.cpu_count() or 1
+        self.version = None
+        self.processes = []
+        self.shm = None
+        self.start()
+
+    def start(self):
+        sim = self.sim
+        if hasattr(sim, "link_lengths"):
+            self.aw = sim
+        else:
+            self.aw = soa.from_world(sim)
+            self.version = sim.version
+        if self.aw.integrator == "adaptive":
+            # each piece would pick its own dt and the pieces would drift apart in time
+            raise ValueError("the adaptive integrator can't be stepped in pieces")
+
+        n = len(self.aw.pos)
+        self.pieces = split(self.aw, self.workers)
+        if self.workers == 1:
+            self.local = [piece_world(piece, np.stack((self.aw.pos, self.aw.vel))) for piece in self.pieces]
+            return
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(2 * n * 2 * 8, 1))
+        self.state = np.ndarray((2, n, 2), dtype=np.float64, buffer=self.shm.buf)
+        for piece in self.pieces:
+            parent_end, child_end = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=worker, args=(child_end, self.shm.name, n, piece), daemon=True)
+            proc.start()
+            child_end.close()
+            self.processes.append((proc, parent_end))
+
+    def close(self):
+        for proc, conn in self.processes:
+            conn.send(None)
+            conn.close()
+        for proc, conn in self.processes:
+            proc.join()
+        self.processes = []
+
+        if self.shm is not None:
+            del self.state
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def step(self, n=1):
+        sim = self.sim
+        aw = self.aw
+        if aw is not sim:
+            # topology edits mean new components; anything else is picked
+            # up from the points
+            if sim.version != self.version:
+                self.close()
+                self.start()
+                aw = self.aw
+            else:
+                aw.pos[:] = [(p.pos.x, p.pos.y) for p in sim.points]
+                aw.vel[:] = [(p.vel.x, p.vel.y) for p in sim.points]
+            aw.time = sim.time
+            aw.steps = sim.steps
+
+        job = (n, aw.time, aw.steps)
+        if self.workers == 1:
+            state = np.stack((aw.pos, aw.vel))
+            results = [step_piece(w, piece["points"], state, *job) for w, piece in zip(self.local, self.pieces)]
+        else:
+            state = self.state
+            state[0] = aw.pos
+            state[1] = aw.vel
+            for proc, conn in self.processes:
+                conn.send(job)
+            results = [conn.recv() for proc, conn in self.processes]
+
+        aw.pos[:] = state[0]
+        aw.vel[:] = state[1]
+        if results:
+            aw.time, aw.steps = results[0][0], results[0][1]
+            aw.cg_iterations = max(r[2] for r in results)
+        else:
+            aw.step(n)
+
+        if aw is not sim:
+            aw.sync()
+            sim.time = aw.time
+            sim.steps = aw.steps
+
+    def run_until(self, t):
+        n = math.ceil((t - self.sim.time)/self.sim.dt - 1E-9)
+        if n > 0:
+            self.step(n)
@@ -0,0 +1,156 @@
+import collections
+import csv
+import json
+import time
+
+########################
+#      PROFILER        #
+########################
+
+# rolling per-phase timers and counters. Everything is kept over the last
+# `window` frames; each frame is also kept as a row (up to `history`
+# rows) for dumping to JSON/CSV. Timers are in seconds, reported in ms.
+#
+# A frame's period runs from the begin_frame() before it to its own, so
+# it includes whatever the loop waits for between frames (the Tk timer,
+# the physics thread's sleep); fps and per-second rates go by that. The
+# time from begin_frame() to end_frame() is the frame's work.
+class profiler():
+    def __init__(self, window=120, history=10000):
+        self.window = window
+        self.timers = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        self.periods = collections.deque(maxlen=window)
+        self.work_times = collections.deque(maxlen=window)
+        self.history = collections.deque(maxlen=history)
+
+        self.current = {}
+        self.frame_start = None
+        self.last_start = None
+        self.period = None
+        self.frames = 0
+
+        # counters whose per-second rate is worth showing in text()
+        self.rates = {"steps"}
+
+    def add(self, name, seconds):
+        # several adds within one frame accumulate
+        self.current[name] = self.current.get(name, 0) + seconds
+
+    def count(self, name, value=1):
+        self.current["#" + name] = self.current.get("#" + name, 0) + value
+
+    def begin_frame(self, now=None):
+        self.frame_start = time.perf_counter() if now is None else now
+        self.period = None
+        if self.last_start is not None:
+            self.period = self.frame_start - self.last_start
+        self.last_start = self.frame_start
+
+    def restart(self):
+        # frames weren't timed for a while; the next one starts afresh
+        # rather than having the gap as its period
+        self.last_start = None
+
+    def end_frame(self, now=None):
+        if self.frame_start is None:
+            return
+        now = time.perf_counter() if now is None else now
+        work = now - self.frame_start
+        # the first frame has nothing before it to measure a period from
+        period = work if self.period is None else self.period
+        self.work_times.append(work)
+        self.periods.append(period)
+        self.frames += 1
+
+        row = {"frame": self.frames, "period_ms": period * 1000, "work_ms": work * 1000}
+        for name, value in self.current.items():
+            if name.startswith("#"):
+                name = name[1:]
+                if not name in self.counters:
+                    self.counters[name] = collections.deque(maxlen=self.window)
+                self.counters[name].append(value)
+                row[name] = value
+            else:
+                if not name in self.timers:
+                    self.timers[name] = collections.deque(maxlen=self.window)
+                self.timers[name].append(value)
+                row[name + "_ms"] = value * 1000
+
+        # phases that didn't run this frame count as zero
+        for name, values in self.timers.items():
+            if not name in self.current:
+                values.append(0)
+        for name, values in self.counters.items():
+            if not "#" + name in self.current:
+                values.append(0)
+
+        self.history.append(row)
+        self.current = {}
+        self.frame_start = None
+
+    def mean_ms(self, name):
+        values = self.timers.get(name)
+        if not values:
+            return 0
+        return sum(values) / len(values) * 1000
+
+    def mean(self, name):
+        values = self.counters.get(name)
+        if not values:
+            return 0
+        return sum(values) / len(values)
+
+    def rate(self, name):
+        # counter per second of wall time, e.g. steps/sec
+        total_time = sum(self.periods)
+        values = self.counters.get(name)
+        if not values or not total_time:
+            return 0
+        return sum(values) / total_time
+
+    def summary(self):
+        period = sum(self.periods) / len(self.periods) if self.periods else 0
+        work = sum(self.work_times) / len(self.work_times) if self.work_times else 0
+        result = {"period_ms": period * 1000, "fps": 1 / period if period else 0, "work_ms": work * 1000}
+        for name in self.timers:
+            result[name + "_ms"] = self.mean_ms(name)
+        for name in self.counters:
+            result[name] = self.mean(name)
+            result[name + "_per_sec"] = self.rate(name)
+        return result
+
+    def text(self):
+        # a few lines for an on-screen overlay
+        s = self.summary()
+        lines = ["%.1f fps  %.2f ms/frame  %.2f ms work" % (s["fps"], s["period_ms"], s["work_ms"])]
+        for name in self.timers:
+            lines.append("%-14s %8.2f ms" % (name, s[name + "_ms"]))
+        for name in self.counters:
+            if name in self.rates:
+                lines.append("%-14s %8.0f  (%.0f/s)" % (name, s[name], s[name + "_per_sec"]))
+            else:
+                lines.append("%-14s %8.0f" % (name, s[name]))
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        with open(path, "w") as out:
+            json.dump({"summary": self.summary(), "frames": list(self.history)}, out, indent=1)
+
+    def dump_csv(self, path):
+        columns = ["frame", "period_ms", "work_ms"]
+        for row in self.history:
+            for c in row:
+                if not c in columns:
+                    columns.append(c)
+
+        with open(path, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=columns, restval=0)
+            writer.writeheader()
+            writer.writerows(self.history)
+
+    def dump(self, path):
+        if path.endswith(".csv"):
+            self.dump_csv(path)
+        else:
+            self.dump_json(path)
@@ -0,0 +1,374 @@
+import time
+
+from vector2 import *
+
+########################
+#       CAMERA         #
+########################
+
+class camera():
+    def __init__(self, name, pos, zoom, state):
+        self.name = name
+        self.pos = pos
+        self.zoom = zoom
+        self.state = state
+
+    def activate(self):
+        self.state = "active"
+
+    def deactivate(self):
+        self.state = "standby"
+
+    def set_pos(self, pos):
+        self.pos = pos
+
+    def set_zoom(self, zoom):
+        self.zoom = zoom
+
+    def move(self, movement):
+        self.pos += movement
+
+    def do_zoom(self, zoom):
+        self.zoom *= zoom
+
+    def get_state(self):
+        return self.state
+
+    def get_pos(self):
+        return self.pos
+
+    def get_zoom(self):
+        return self.zoom
+
+# space -> canvas is canvas = (x * scale + ox, oy - y * scale); work the
+# camera out once per frame instead of once per coordinate
+def cam_transform(cam, width=900, height=500):
+    scale = 1 / cam.get_zoom()
+    ox = width/2 - cam.get_pos().x * scale
+    oy = height/2 + cam.get_pos().y * scale
+    return scale, ox, oy
+
+def transform(points, scale, ox, oy, positions=None):
+    # the whole frame's worth of points through the camera in one pass,
+    # point -> (x, y) on the canvas. positions, if given, are (x, y) in
+    # the order of points to use instead of the points' own
+    if positions is not None:
+        return {p: (x * scale + ox, oy - y * scale) for p, (x, y) in zip(points, positions)}
+    return {p: (p.pos.x * scale + ox, oy - p.pos.y * scale) for p in points}
+
+########################
+#  RETAINED RENDERER   #
+########################
+
+# draws a world on a tkinter canvas, keeping one canvas item per object
+# and only moving it with coords() when it moved on screen. Items are
+# created and deleted when the world's points, links or forces change,
+# rather than rebuilding the whole item table every frame.
+class canvas_renderer():
+    # stacking order, bottom to top, same as the old immediate-mode loop
+    layers = ("floor", "force", "marker", "com", "link", "point", "label", "hud")
+
+    # Anything outside the canvas (plus `margin` pixels) is hidden rather
+    # than moved. Level of detail, in pixels per world unit:
+    #   below lod_scale, labels are dropped and points are thinned to one
+    #   dot per dot_px square of the canvas
+    #   links shorter than link_min_px on screen are merged into the same
+    #   dots at any zoom
+    #   labels are also dropped when more than label_limit would show
+    margin = 20
+    lod_scale = 0.5
+    link_min_px = 1.5
+    dot_px = 3
+    label_limit = 200
+
+    def __init__(self, canvas, width=900, height=500):
+        self.canvas = canvas
+        self.width = width
+        self.height = height
+
+        # group name -> {object: canvas item}
+        self.groups = {}
+        # canvas item -> last coords sent to Tk
+        self.coords = {}
+
+        self.topology = None
+        self.label_modes = (None, None)
+        self.restack = False
+
+        self.items_moved = 0
+
+        # canvas items currently hidden by culling or level of detail
+        self.hidden = set()
+        # pool of dot items standing in for thinned points and merged
+        # links, and the colour each was last given
+        self.dots = []
+        self.dot_colors = {}
+        self.dots_shown = 0
+
+        # set to a profiler.profiler to time the parts of draw()
+        self.profiler = None
+
+    def lap(self, name, start):
+        # adds the time since start to the profiler, returns now
+        now = time.perf_counter()
+        self.profiler.add(name, now - start)
+        return now
+
+    def sync_group(self, group, objs, create):
+        items = self.groups.setdefault(group, {})
+        if len(items) == len(objs) and all(o in items for o in objs):
+            return items
+
+        current = set(objs)
+        for obj in [o for o in items if o not in current]:
+            item = items.pop(obj)
+            self.canvas.delete(item)
+            self.coords.pop(item, None)
+            self.hidden.discard(item)
+
+        for obj in objs:
+            if obj not in items:
+                items[obj] = create(obj)
+                self.restack = True
+
+        return items
+
+    def clear_group(self, group):
+        for item in self.groups.pop(group, {}).values():
+            self.canvas.delete(item)
+            self.coords.pop(item, None)
+            self.hidden.discard(item)
+
+    def hide(self, item):
+        if not item in self.hidden:
+            self.canvas.itemconfigure(item, state="hidden")
+            self.hidden.add(item)
+
+    def show(self, item):
+        if item in self.hidden:
+            self.canvas.itemconfigure(item, state="normal")
+            self.hidden.discard(item)
+
+    def move(self, item, coords):
+        # tenths of a pixel are as fine as anyone can see
+        if len(coords) == 4:
+            a, b, c, d = coords
+            coords = (round(a, 1), round(b, 1), round(c, 1), round(d, 1))
+        else:
+            coords = tuple([round(c, 1) for c in coords])
+        if self.coords.get(item) != coords:
+            self.canvas.coords(item, *coords)
+            self.coords[item] = coords
+            self.items_moved += 1
+
+    def sync_topology(self, sim):
+        canvas = self.canvas
+        key = (getattr(sim, "version", None), len(sim.points), len(sim.links), len(sim.forces))
+        if key == self.topology:
+            return
+        self.topology = key
+
+        self.sync_group("link", sim.links,
+                        lambda l: canvas.create_line(0, 0, 0, 0, fill=l.get_color(), tags="link"))
+        self.sync_group("point", sim.points,
+                        lambda p: canvas.create_oval(0, 0, 0, 0, fill=p.get_color(), tags="point"))
+        self.sync_group("force", sim.forces,
+                        lambda f: canvas.create_line(0, 0, 0, 0, fill="blue", arrow="last", tags="force"))
+
+        # label texts depend on the objects too, rebuild them
+        self.clear_group("point_label")
+        self.clear_group("link_label")
+        self.label_modes = (None, None)
+
+    def sync_labels(self, sim, point_labels, link_labels):
+        canvas = self.canvas
+        if (point_labels, link_labels) == self.label_modes:
+            return
+        old_point, old_link = self.label_modes
+        self.label_modes = (point_labels, link_labels)
+
+        if point_labels != old_point:
+            self.clear_group("point_label")
+            if point_labels:
+                text = (lambda p: p.get_name()) if point_labels == "n" else (lambda p: str(p.get_mass()))
+                self.sync_group("point_label", sim.points,
+                                lambda p: canvas.create_text(0, 0, text=text(p), tags="label"))
+
+        if link_labels != old_link:
+            self.clear_group("link_label")
+            if link_labels:
+                text = (lambda l: l.get_name()) if link_labels == "n" else (lambda l: str(l.get_k()))
+                self.sync_group("link_label", sim.links,
+                                lambda l: canvas.create_text(0, 0, text=text(l), fill=l.get_color(), tags="label"))
+
+    def sync_markers(self, group, buffer, color):
+        canvas = self.canvas
+        items = self.sync_group(group, buffer,
+                                lambda p: canvas.create_oval(0, 0, 0, 0, fill=color, tags="marker"))
+        return items
+
+    def draw(self, sim, cam, force_buffer=(), linking_buffer=(), com_buffer=(), com=None,
+             point_labels=None, link_labels=None):
+        canvas = self.canvas
+        s, ox, oy = cam_transform(cam, self.width, self.height)
+        self.items_moved = 0
+        prof = self.profiler
+        if prof:
+            t = time.perf_counter()
+
+        self.sync_topology(sim)
+        self.sync_labels(sim, point_labels, link_labels)
+        if prof:
+            t = self.lap("render.sync", t)
+
+        # floor
+        if sim.floor:
+            floor_items = self.sync_group("floor", [sim.floor],
+                                          lambda g: canvas.create_rectangle(0, 0, 0, 0, fill=g.get_color(), tags="floor"))
+            self.move(floor_items[sim.floor], (-1000, oy - sim.floor.get_height() * s, 1000, self.height))
+
+        # each point goes through the camera exactly once per frame. sim
+        # can also be a background.frame, which carries its own positions
+        screen = transform(sim.points, s, ox, oy, getattr(sim, "positions", None))
+        m = self.margin
+        x0, y0, x1, y1 = -m, -m, self.width + m, self.height + m
+        lod = s < self.lod_scale
+        dot = self.dot_px
+        # (column, row) of a dot square -> colour
+        dots = {}
+
+        for p, item in self.groups["point"].items():
+            x, y = screen[p]
+            if not (x0 < x < x1 and y0 < y < y1):
+                self.hide(item)
+            elif lod:
+                key = (int(x // dot), int(y // dot))
+                if not key in dots:
+                    dots[key] = p.color
+                self.hide(item)
+            else:
+                self.show(item)
+                self.move(item, (x-1, y-1, x+1, y+1))
+
+        if prof:
+            t = self.lap("render.points", t)
+
+        min_px2 = self.link_min_px ** 2
+        for l, item in self.groups["link"].items():
+            ax, ay = screen[l.p1]
+            bx, by = screen[l.p2]
+            if ((ax < x0 and bx < x0) or (ax > x1 and bx > x1)
+                    or (ay < y0 and by < y0) or (ay > y1 and by > y1)):
+                self.hide(item)
+            elif (bx - ax)**2 + (by - ay)**2 < min_px2:
+                key = (int((ax + bx) / 2 // dot), int((ay + by) / 2 // dot))
+                if not key in dots:
+                    dots[key] = l.color
+                self.hide(item)
+            else:
+                self.show(item)
+                self.move(item, (ax, ay, bx, by))
+
+        self.draw_dots(dots)
+
+        for f, item in self.groups["force"].items():
+            ax, ay = screen[f.point]
+            bx = ax + f.force.x * 100 * s
+            by = ay - f.force.y * 100 * s
+            if ((ax < x0 and bx < x0) or (ax > x1 and bx > x1)
+                    or (ay < y0 and by < y0) or (ay > y1 and by > y1)):
+                self.hide(item)
+            else:
+                self.show(item)
+                self.move(item, (ax, ay, bx, by))
+
+        for group, buffer, color in (("force_buffer", force_buffer, "blue"),
+                                     ("linking_buffer", linking_buffer, "red"),
+                                     ("com_buffer", com_buffer, "#ffc100")):
+            for p, item in self.sync_markers(group, buffer, color).items():
+                x, y = screen[p]
+                self.move(item, (x-5, y-5, x+5, y+5))
+
+        # centre of mass cross
+        if com:
+            if not "com" in self.groups:
+                self.groups["com"] = {0: canvas.create_line(0, 0, 0, 0, fill="#ffc100", tags="com"),
+                                      1: canvas.create_line(0, 0, 0, 0, fill="#ffc100", tags="com")}
+                self.restack = True
+            x = com.x * s + ox
+            y = oy - com.y * s
+            self.move(self.groups["com"][0], (x-8, y-8, x+8, y+8))
+            self.move(self.groups["com"][1], (x-8, y+8, x+8, y-8))
+        else:
+            self.clear_group("com")
+
+        if prof:
+            t = self.lap("render.links", t)
+
+        point_label_items = self.groups.get("point_label", {})
+        link_label_items = self.groups.get("link_label", {})
+        anchors = {}
+        if not lod:
+            for p in point_label_items:
+                x, y = screen[p]
+                if x0 < x < x1 and y0 < y < y1:
+                    anchors[p] = (x-10, y-10)
+            for l in link_label_items:
+                ax, ay = screen[l.p1]
+                bx, by = screen[l.p2]
+                x, y = (ax + bx)/2, (ay + by)/2
+                if x0 < x < x1 and y0 < y < y1:
+                    anchors[l] = (x, y)
+            if len(anchors) > self.label_limit:
+                anchors = {}
+
+        for labels in (point_label_items, link_label_items):
+            for obj, item in labels.items():
+                if obj in anchors:
+                    self.show(item)
+                    self.move(item, anchors[obj])
+                else:
+                    self.hide(item)
+
+        if self.restack:
+            for layer in self.layers:
+                canvas.tag_raise(layer)
+            self.restack = False
+
+        if prof:
+            self.lap("render.labels", t)
+            prof.count("items", len(self.coords))
+            prof.count("items_moved", self.items_moved)
+            prof.count("items_hidden", len(self.hidden))
+            prof.count("dots", self.dots_shown)
+
+    def draw_dots(self, dots):
+        # one small square per occupied dot cell, from a pool of items
+        # that only grows; the unused end of the pool is hidden
+        canvas = self.canvas
+        d = self.dot_px
+        for i, ((cx, cy), color) in enumerate(dots.items()):
+            if i == len(self.dots):
+                self.dots.append(canvas.create_rectangle(0, 0, 0, 0, width=0, fill=color, tags="point"))
+                self.dot_colors[self.dots[i]] = color
+                self.restack = True
+            item = self.dots[i]
+            if self.dot_colors[item] != color:
+                canvas.itemconfigure(item, fill=color)
+                self.dot_colors[item] = color
+            self.show(item)
+            self.move(item, (cx * d, cy * d, cx * d + d, cy * d + d))
+
+        for item in self.dots[len(dots):self.dots_shown]:
+            self.hide(item)
+        self.dots_shown = len(dots)
+
+    def draw_hud(self, text):
+        # performance overlay in the top left corner of the canvas
+        items = self.sync_group("hud", ["hud"],
+                                lambda h: self.canvas.create_text(8, 8, anchor="nw", font=("Courier", 9),
+                                                                  fill="gray20", tags="hud"))
+        self.canvas.itemconfigure(items["hud"], text=text)
+
+    def clear_hud(self):
+        self.clear_group("hud")
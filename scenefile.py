@@ -0,0 +1,238 @@
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from engine import *
+from renderer import camera
+
+# .json is the readable form, one object per point/link/force.
+# .npz is the columnar form: one array per attribute, which loads straight
+# into a soa.array_world without building any objects (needs NumPy).
+format_version = 1
+
+########################
+#       SETTINGS       #
+########################
+
+def settings_of(sim, cams):
+    floor = sim.floor
+    gravity = sim.gravity
+    if hasattr(gravity, "x"):
+        gravity = (gravity.x, gravity.y)
+
+    return {"version": format_version,
+            "dt": sim.dt,
+            "gravity": [float(gravity[0]), float(gravity[1])],
+            "drag_coeff": sim.drag_coeff,
+            "integrator": getattr(sim, "integrator", "explicit"),
+            "time": sim.time,
+            "steps": sim.steps,
+            "floor": {"height": floor.height, "color": floor.color,
+                      "elasticity": floor.elasticity, "k": floor.k} if floor else None,
+            "cameras": [{"name": c.name, "pos": [c.pos.x, c.pos.y], "zoom": c.zoom, "state": c.state}
+                        for c in (cams or [])]}
+
+def check_version(settings, path):
+    if settings.get("version", 0) > format_version:
+        raise ValueError(path + " was written by a newer version of the scene format ("
+                         + str(settings["version"]) + " > " + str(format_version) + ")")
+
+def floor_of(settings):
+    f = settings["floor"]
+    if not f:
+        return None
+    return ground(f["height"], f["color"], f["elasticity"], f["k"])
+
+def cameras_of(settings):
+    return [camera(c["name"], vec2(c["pos"][0], c["pos"][1]), c["zoom"], c["state"])
+            for c in settings["cameras"]]
+
+def build_world(settings, points, links, forces):
+    sim = world(points, links, forces, floor_of(settings), settings["dt"],
+                vec2(settings["gravity"][0], settings["gravity"][1]),
+                settings["drag_coeff"], settings["integrator"])
+    sim.time = settings["time"]
+    sim.steps = settings["steps"]
+    return sim
+
+def make_link(name, p1, p2, color, k, rest):
+    l = rigid_link(name, p1, p2, color, k)
+    # keep the saved rest length rather than whatever the (possibly
+    # stretched) saved positions imply
+    l.dist = rest
+    return l
+
+########################
+#        JSON          #
+########################
+
+def save_json(sim, path, cams=None):
+    index = {p: i for i, p in enumerate(sim.points)}
+
+    data = settings_of(sim, cams)
+    data["points"] = [{"name": p.name, "pos": [p.pos.x, p.pos.y], "vel": [p.vel.x, p.vel.y],
+                       "color": p.color, "mass": p.mass, "static": bool(p.static),
+                       "limit_axis": [p.limit_axis.x, p.limit_axis.y] if p.limit_axis else None}
+                      for p in sim.points]
+    data["links"] = [{"name": l.name, "p1": index[l.p1], "p2": index[l.p2], "color": l.color,
+                      "k": l.k, "rest": l.dist}
+                     for l in sim.links]
+    data["forces"] = [{"name": f.name, "point": index[f.point], "force": [f.force.x, f.force.y]}
+                      for f in sim.forces]
+
+    with open(path, "w") as out:
+        json.dump(data, out, indent=1)
+
+def load_json(path):
+    with open(path) as src:
+        data = json.load(src)
+    check_version(data, path)
+
+    points = []
+    for d in data["points"]:
+        p = point(d["name"], vec2(d["pos"][0], d["pos"][1]), vec2(d["vel"][0], d["vel"][1]),
+                  d["color"], d["mass"], d["static"])
+        if d["limit_axis"]:
+            p.limit_axis = vec2(d["limit_axis"][0], d["limit_axis"][1])
+        points.append(p)
+
+    links = [make_link(d["name"], points[d["p1"]], points[d["p2"]], d["color"], d["k"], d["rest"])
+             for d in data["links"]]
+    forces = [const_force(d["name"], points[d["point"]], vec2(d["force"][0], d["force"][1]))
+              for d in data["forces"]]
+
+    return build_world(data, points, links, forces), cameras_of(data)
+
+########################
+#      COLUMNAR        #
+########################
+
+def columns_of(sim):
+    # array_world already is columns; names and colors ride along if it
+    # was loaded from a file
+    if hasattr(sim, "link_lengths"):
+        n, m, f = sim.get_num_points(), sim.get_num_links(), len(sim.force_idx)
+        names = decode_strings(getattr(sim, "strings", None) or {})
+        return {"pos": sim.pos, "vel": sim.vel, "mass": sim.mass, "static": sim.static, "axis": sim.axis,
+                "link_i": sim.link_i, "link_j": sim.link_j, "rest": sim.rest, "k": sim.k,
+                "force_idx": sim.force_idx, "force_vec": sim.force_vec,
+                "point_name": names.get("point_name", np.full(n, "")),
+                "point_color": names.get("point_color", np.full(n, "seagreen")),
+                "link_name": names.get("link_name", np.full(m, "")),
+                "link_color": names.get("link_color", np.full(m, "skyblue")),
+                "force_name": names.get("force_name", np.full(f, ""))}
+
+    points = sim.points
+    index = {p: i for i, p in enumerate(points)}
+    return {"pos": np.array([(p.pos.x, p.pos.y) for p in points], dtype=np.float64).reshape(-1, 2),
+            "vel": np.array([(p.vel.x, p.vel.y) for p in points], dtype=np.float64).reshape(-1, 2),
+            "mass": np.array([p.mass for p in points], dtype=np.float64),
+            "static": np.array([bool(p.static) for p in points], dtype=bool),
+            "axis": np.array([(p.limit_axis.x, p.limit_axis.y) if p.limit_axis else (0, 0) for p in points],
+                             dtype=np.float64).reshape(-1, 2),
+            "point_name": np.array([p.name for p in points], dtype=str),
+            "point_color": np.array([p.color for p in points], dtype=str),
+            "link_i": np.array([index[l.p1] for l in sim.links], dtype=np.int64),
+            "link_j": np.array([index[l.p2] for l in sim.links], dtype=np.int64),
+            "rest": np.array([l.dist for l in sim.links], dtype=np.float64),
+            "k": np.array([l.k for l in sim.links], dtype=np.float64),
+            "link_name": np.array([l.name for l in sim.links], dtype=str),
+            "link_color": np.array([l.color for l in sim.links], dtype=str),
+            "force_idx": np.array([index[f.point] for f in sim.forces], dtype=np.int64),
+            "force_vec": np.array([(f.force.x, f.force.y) for f in sim.forces], dtype=np.float64).reshape(-1, 2),
+            "force_name": np.array([f.name for f in sim.forces], dtype=str)}
+
+string_columns = ("point_name", "point_color", "link_name", "link_color", "force_name")
+
+# names and colours repeat a lot (every link "skyblue"), so each string
+# column is stored as its distinct values plus an int32 code per row
+def encode_strings(columns):
+    for name in string_columns:
+        values, codes = np.unique(columns.pop(name), return_inverse=True)
+        columns[name + ".values"] = values
+        columns[name + ".codes"] = codes.astype(np.int32)
+
+def decode_strings(strings):
+    return {name: values[codes] for name, (values, codes) in strings.items()}
+
+def save_npz(sim, path, cams=None):
+    columns = columns_of(sim)
+    encode_strings(columns)
+    for name in ("link_i", "link_j", "force_idx"):
+        if len(columns["pos"]) < 2**31:
+            columns[name] = columns[name].astype(np.int32)
+    columns["settings"] = np.array(json.dumps(settings_of(sim, cams)))
+
+    # uncompressed on purpose, loading speed is the point of this format
+    with open(path, "wb") as out:
+        np.savez(out, **columns)
+
+def read_npz(path):
+    with np.load(path, allow_pickle=False) as data:
+        columns = {name: data[name] for name in data.files}
+    settings = json.loads(str(columns.pop("settings")))
+    check_version(settings, path)
+
+    strings = {}
+    for name in string_columns:
+        strings[name] = (columns.pop(name + ".values"), columns.pop(name + ".codes"))
+    return settings, columns, strings
+
+def load_arrays(path):
+    # straight into an array_world, no per-point Python objects at all
+    import soa
+
+    settings, c, strings = read_npz(path)
+    aw = soa.array_world(c["pos"], c["vel"], c["mass"], c["static"],
+                         c["link_i"], c["link_j"], c["rest"], c["k"],
+                         c["force_idx"], c["force_vec"], floor_of(settings),
+                         settings["dt"], settings["gravity"], settings["drag_coeff"],
+                         c["axis"], settings["integrator"])
+    aw.time = settings["time"]
+    aw.steps = settings["steps"]
+    # kept encoded, only decoded if the world gets saved again
+    aw.strings = strings
+    return aw, cameras_of(settings)
+
+def load_npz(path):
+    settings, c, strings = read_npz(path)
+    c.update(decode_strings(strings))
+
+    pos = c["pos"].tolist()
+    vel = c["vel"].tolist()
+    axis = c["axis"].tolist()
+    points = [point(name, vec2(x, y), vec2(vx, vy), color, mass, static)
+              for name, (x, y), (vx, vy), color, mass, static
+              in zip(c["point_name"].tolist(), pos, vel, c["point_color"].tolist(),
+                     c["mass"].tolist(), c["static"].tolist())]
+    for i in c["axis"].any(axis=1).nonzero()[0].tolist():
+        points[i].limit_axis = vec2(axis[i][0], axis[i][1])
+
+    links = [make_link(name, points[i], points[j], color, k, rest)
+             for name, i, j, color, k, rest
+             in zip(c["link_name"].tolist(), c["link_i"].tolist(), c["link_j"].tolist(),
+                    c["link_color"].tolist(), c["k"].tolist(), c["rest"].tolist())]
+    forces = [const_force(name, points[i], vec2(fx, fy))
+              for name, i, (fx, fy) in zip(c["force_name"].tolist(), c["force_idx"].tolist(), c["force_vec"].tolist())]
+
+    return build_world(settings, points, links, forces), cameras_of(settings)
+
+########################
+#      DISPATCH        #
+########################
+
+# save(sim, "bridge.json") / save(sim, "bridge.npz"); load() returns
+# (world, cameras)
+def save(sim, path, cams=None):
+    if path.endswith(".npz"):
+        save_npz(sim, path, cams)
+    else:
+        save_json(sim, path, cams)
+
+def load(path):
+    if path.endswith(".npz"):
+        return load_npz(path)
+    return load_json(path)
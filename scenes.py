@@ -0,0 +1,155 @@
+from engine import *
+
+########################
+#       CRANE          #
+########################
+
+def crane():
+    n0 = point("n0", vec2(-30,-100), vec2(), "seagreen", 1, static=True)
+    n1 = point("n1", vec2(30,-100), vec2(), "seagreen", 1, static=True)
+    n2 = point("n2", vec2(-30,0), vec2(), "seagreen", 1)
+    n3 = point("n3", vec2(30,-0), vec2(), "seagreen", 1)
+    n4 = point("n4", vec2(-30,100), vec2(), "seagreen", 1)
+    n5 = point("n5", vec2(30,100), vec2(), "seagreen", 1)
+    n6 = point("n6", vec2(-30,200), vec2(), "seagreen", 1)
+    n7 = point("n7", vec2(30,200), vec2(), "seagreen", 1)
+
+    t0 = point("t0", vec2(-150, 100), vec2(), "seagreen", 5)
+    t1 = point("t1", vec2(-150, 200), vec2(), "seagreen", 7.5)
+
+    z0 = point("z0", vec2(350, 200), vec2(), "seagreen", 1.5)
+    z1 = point("z1", vec2(450, 200), vec2(), "seagreen", 1)
+    z2 = point("z2", vec2(350, 160), vec2(), "seagreen", 1.5)
+    z3 = point("z3", vec2(350, 50), vec2(50,0), "seagreen", 0.05)
+
+    m0 = rigid_link("m0", n0, n1, "skyblue", 1000)
+    m1 = rigid_link("m1", n2, n3, "skyblue", 1000)
+    m2 = rigid_link("m2", n4, n5, "skyblue", 1000)
+    m3 = rigid_link("m3", n6, n7, "skyblue", 1000)
+    m4 = rigid_link("m4", n0, n2, "skyblue", 1000)
+    m5 = rigid_link("m5", n2, n4, "skyblue", 1000)
+    m6 = rigid_link("m6", n4, n6, "skyblue", 1000)
+    m7 = rigid_link("m7", n1, n3, "skyblue", 1000)
+    m8 = rigid_link("m8", n3, n5, "skyblue", 1000)
+    m9 = rigid_link("m9", n5, n7, "skyblue", 1000)
+    m10 = rigid_link("m10", n0, n3, "magenta4", 200)
+    m11 = rigid_link("m11", n2, n5, "hotpink", 5000)
+    m12 = rigid_link("m12", n4, n7, "magenta4", 200)
+
+    r0 = rigid_link("r0", t0, n4, "skyblue", 1000)
+    r1 = rigid_link("r1", t1, n6, "skyblue", 1000)
+    r2 = rigid_link("r2", t0, t1, "skyblue", 1000)
+    r3 = rigid_link("r3", t0, n6, "hotpink", 5000)
+
+    f0 = rigid_link("f0", n7, z0, "skyblue", 1000)
+    f1 = rigid_link("f1", n5, z0, "hotpink", 5000)
+    f2 = rigid_link("f2", z0, z1, "skyblue", 1000)
+    f3 = rigid_link("f3", n5, z2, "hotpink", 5000)
+    f4 = rigid_link("f4", z2, z0, "skyblue", 1000)
+    f5 = rigid_link("f5", z2, z1, "skyblue", 1000)
+    f6 = rigid_link("f6", z2, n7, "skyblue", 1000)
+    f7 = rigid_link("f7", z2, z3, "orange", 2)
+
+    floor = ground(-100, "green", 0.5, 0.8)
+
+    points = [n0, n1, n2, n3, n4, n5, n6, n7,
+              t0, t1,
+              z0, z1, z2, z3]
+
+    links = [m0, m1, m2, m3, m4, m5, m6, m7, m8, m9, m10, m11, m12,
+             r0, r1, r2, r3,
+             f0, f1, f2, f3, f4, f5, f6, f7]
+
+    return world(points, links, [], floor)
+
+########################
+#      GENERATORS      #
+########################
+
+# procedural scenes of roughly n points, for benchmarks and load tests
+
+def truss(n=100, spacing=10, k=1000):
+    # two-chord lattice truss resting on static supports at both ends
+    columns = max(n // 2, 2)
+    bottom = [point("b" + str(i), vec2(i * spacing, 0), vec2(), "seagreen", 1, static=(i == 0 or i == columns - 1))
+              for i in range(columns)]
+    top = [point("t" + str(i), vec2(i * spacing, spacing), vec2(), "seagreen", 1)
+           for i in range(columns)]
+
+    links = []
+    for i in range(columns):
+        links.append(rigid_link("v" + str(i), bottom[i], top[i], "skyblue", k))
+        if i:
+            links.append(rigid_link("bc" + str(i), bottom[i-1], bottom[i], "skyblue", k))
+            links.append(rigid_link("tc" + str(i), top[i-1], top[i], "skyblue", k))
+            links.append(rigid_link("d" + str(i), bottom[i-1], top[i], "magenta4", k))
+
+    return world(bottom + top, links, [], ground(-10, "green", 0.5, 0.8))
+
+def chain(n=100, spacing=5, k=1000):
+    # laid out horizontally, hanging from its first point
+    points = [point("c" + str(i), vec2(i * spacing, 0), vec2(), "seagreen", 1, static=(i == 0))
+              for i in range(max(n, 2))]
+    links = [rigid_link("l" + str(i), points[i-1], points[i], "orange", k)
+             for i in range(1, len(points))]
+    return world(points, links, [], ground(-(len(points) + 1) * spacing, "green", 0.5, 0.8))
+
+def cloth(n=100, spacing=5, k=500):
+    # square grid with shear links, pinned along its top edge
+    side = max(int(round(n ** 0.5)), 2)
+    grid = [[point("c" + str(i) + "_" + str(j), vec2(i * spacing, -j * spacing), vec2(), "seagreen", 0.1,
+                   static=(j == 0 and i % 4 == 0))
+             for j in range(side)] for i in range(side)]
+
+    links = []
+    for i in range(side):
+        for j in range(side):
+            if i:
+                links.append(rigid_link("h", grid[i-1][j], grid[i][j], "skyblue", k))
+            if j:
+                links.append(rigid_link("v", grid[i][j-1], grid[i][j], "skyblue", k))
+            if i and j:
+                links.append(rigid_link("s", grid[i-1][j-1], grid[i][j], "hotpink", k / 4))
+
+    points = [p for column in grid for p in column]
+    return world(points, links, [], ground(-2 * side * spacing, "green", 0.5, 0.8))
+
+def cranes(n=100, spacing=700):
+    # copies of the crane side by side, about n points in total
+    copies = max(n // 14, 1)
+    points = []
+    links = []
+    for c in range(copies):
+        part = crane()
+        offset = vec2(c * spacing, 0)
+        for p in part.points:
+            p.name = p.name + "." + str(c)
+            p.pos = p.pos + offset
+        for l in part.links:
+            l.name = l.name + "." + str(c)
+        points += part.points
+        links += part.links
+
+    return world(points, links, [], ground(-100, "green", 0.5, 0.8))
+
+# name -> function returning a fresh world, for anything that only gets to
+# pass a scene around as a string (command lines, worker processes)
+builders = {"crane": crane,
+            "truss": truss,
+            "chain": chain,
+            "cloth": cloth,
+            "cranes": cranes}
+
+def get_scene(name):
+    # scene files work anywhere a scene name does
+    if name.endswith(".json") or name.endswith(".npz"):
+        import scenefile
+        return scenefile.load(name)[0]
+
+    # "truss:1000" passes a size to the generator
+    name, _, size = name.partition(":")
+    if not name in builders:
+        raise ValueError("unknown scene '" + name + "', expected one of: " + ", ".join(sorted(builders)))
+    if size:
+        return builders[name](int(size))
+    return builders[name]()
@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from array import array
+
+from engine import *
+import scenefile
+import islands
+import collision
+import diagnostics
+import profiler
+
+# Recording of an interactive session, for replaying it headless as a
+# benchmark. A session is a directory:
+#
+#   scene.json    the world as it was when recording started
+#   events.jsonl  one event per line, each with the step it happened at
+#
+# Every change the GUI makes to the world is an edit (below), run on the
+# physics thread between steps; the thread's recorder logs it with the
+# world's step count just before running it. Points, links and forces are
+# logged by their place in the world's lists at that moment, so the same
+# edits at the same steps rebuild the same world. world.step(n) gives the
+# same result as n calls of step(1), sleeping and contacts included, so
+# replaying is stepping to each event's step and applying it, even though
+# the GUI stepped in small wall-clock sized chunks. `--split` replays in
+# such chunks too, to check that this still holds.
+#
+# Events:
+#   add_point     name, x, y, color, mass, static
+#   remove_point  point
+#   add_link      name, p1, p2, color, k
+#   remove_link   link
+#   add_force     name, point, fx, fy
+#   remove_force  force
+#   sleep, collisions, energy   on
+#   run           on (pause/resume)
+#   rewind        frame (of the GUI's history), to (its step count)
+#   camera        x, y, zoom
+#   end           checksum of the final state
+
+########################
+#        EDITS         #
+########################
+
+# a change to make to the world, holding whatever it refers to as
+# objects. The GUI picks objects from a frame that can be a step or two
+# behind the world, so an edit whose objects are gone by the time it
+# runs is dropped
+class edit():
+    def __init__(self, kind, **args):
+        self.kind = kind
+        self.args = args
+
+    def resolve(self, sim, owner):
+        # the edit as an event: objects replaced by their numbers, or None
+        # if it no longer applies
+        event = {"kind": self.kind}
+        for key, value in self.args.items():
+            if isinstance(value, point):
+                i = sim.point_index.get(value)
+            elif isinstance(value, rigid_link):
+                i = sim.link_index.get(value)
+            elif isinstance(value, const_force):
+                i = sim.force_index.get(value)
+            else:
+                event[key] = value
+                continue
+            if i is None:
+                return None
+            event[key] = i
+
+        if self.kind == "rewind":
+            event["to"] = owner.hist.steps_of(event["frame"])
+        return event
+
+def apply(sim, event, owner):
+    # owner is whatever runs the world: a background.physics_thread, or a
+    # player. It handles run, rewind and camera
+    kind = event["kind"]
+    if kind == "add_point":
+        sim.add_point(point(event["name"], vec2(event["x"], event["y"]), vec2(), event["color"],
+                            event["mass"], event["static"]))
+    elif kind == "remove_point":
+        sim.remove_point(sim.points[event["point"]])
+    elif kind == "add_link":
+        sim.add_link(rigid_link(event["name"], sim.points[event["p1"]], sim.points[event["p2"]],
+                                event["color"], event["k"]))
+    elif kind == "remove_link":
+        sim.remove_link(sim.links[event["link"]])
+    elif kind == "add_force":
+        sim.add_force(const_force(event["name"], sim.points[event["point"]], vec2(event["fx"], event["fy"])))
+    elif kind == "remove_force":
+        sim.remove_force(sim.forces[event["force"]])
+
+    elif kind in ("sleep", "collisions") and event["on"] and sim.integrator == "implicit":
+        raise ValueError("the implicit integrator doesn't do sleeping or contacts")
+    elif kind == "sleep":
+        if event["on"] and not sim.sleeper:
+            sim.sleeper = islands.sleeper(sim)
+        elif not event["on"] and sim.sleeper:
+            sim.sleeper.wake_all()
+            sim.sleeper = None
+    elif kind == "collisions":
+        if event["on"] and not sim.collider:
+            sim.collider = collision.collider(sim)
+        elif not event["on"]:
+            sim.collider = None
+    elif kind == "energy":
+        if event["on"] and not sim.diagnostics:
+            sim.diagnostics = diagnostics.diagnostics(sim)
+        elif not event["on"]:
+            sim.diagnostics = None
+
+    elif kind == "run":
+        owner.running = event["on"]
+    elif kind == "rewind":
+        owner.rewind(event)
+    elif kind == "camera":
+        owner.camera(event)
+    else:
+        raise ValueError("unknown event '" + kind + "'")
+
+def checksum(sim):
+    # of positions and velocities, to tell whether a replay ended where
+    # the session did
+    state = array("d")
+    for p in sim.points:
+        state.extend((p.pos.x, p.pos.y, p.vel.x, p.vel.y))
+    return hashlib.sha1(state.tobytes()).hexdigest()
+
+########################
+#      RECORDER        #
+########################
+
+class recorder():
+    def __init__(self, sim, path, cams=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        scenefile.save(sim, os.path.join(path, "scene.json"), cams)
+        self.out = open(os.path.join(path, "events.jsonl"), "w")
+        self.events = 0
+
+    def log(self, steps, event):
+        event = dict(event)
+        event["step"] = steps
+        self.out.write(json.dumps(event) + "\n")
+        self.events += 1
+
+    def close(self, sim):
+        if self.out.closed:
+            return
+        self.log(sim.steps, {"kind": "end", "checksum": checksum(sim)})
+        self.out.close()
+
+########################
+#       PLAYER         #
+########################
+
+def load(path):
+    sim, cams = scenefile.load(os.path.join(path, "scene.json"))
+    with open(os.path.join(path, "events.jsonl")) as src:
+        events = [json.loads(line) for line in src if line.strip()]
+    return sim, cams, events
+
+# replays a session headless and as fast as it goes, timing the steps
+# between events and the events themselves. The GUI's history is not
+# replayed; instead the world is checkpointed at exactly the steps the
+# session later rewinds to, on the way there
+class player():
+    def __init__(self, path, split=None):
+        self.sim, self.cams, self.events = load(path)
+        # most steps per step() call, None for as many as it takes
+        self.split = split
+        self.running = False
+        self.cam = None
+
+        # step -> checkpoint of the world at that step, taken before the
+        # events at it, for the rewinds to come
+        self.targets = sorted({e["to"] for e in self.events if e["kind"] == "rewind"})
+        self.checkpoints = {}
+
+        # one row per event, see play()
+        self.rows = []
+        self.matches = None
+
+    def rewind(self, event):
+        self.sim.restore(self.checkpoints[event["to"]])
+
+    def camera(self, event):
+        self.cam = (event["x"], event["y"], event["zoom"])
+
+    def checkpoint_here(self):
+        if self.sim.steps in self.targets:
+            self.checkpoints[self.sim.steps] = self.sim.checkpoint()
+
+    def step_to(self, target):
+        sim = self.sim
+        if target < sim.steps:
+            raise RuntimeError("session diverged: event at step " + str(target)
+                               + " but the world is at step " + str(sim.steps))
+        for s in self.targets:
+            if sim.steps < s <= target:
+                self.step(s - sim.steps)
+                self.checkpoint_here()
+        if sim.steps < target:
+            self.step(target - sim.steps)
+
+    def step(self, n):
+        if not self.split:
+            self.sim.step(n)
+            return
+        while n > 0:
+            run = min(n, self.split)
+            self.sim.step(run)
+            n -= run
+
+    def play(self, progress=None):
+        # returns the rows: step, kind, steps (since the last event),
+        # step_ms (stepping to this event) and event_ms (applying it).
+        # progress(row) is called after each event
+        sim = self.sim
+        clock = time.perf_counter
+        self.checkpoint_here()
+
+        for event in self.events:
+            start_steps = sim.steps
+            t = clock()
+            self.step_to(event["step"])
+            t2 = clock()
+            steps = sim.steps - start_steps
+            if event["kind"] == "end":
+                self.matches = checksum(sim) == event["checksum"]
+            else:
+                apply(sim, event, self)
+            row = {"step": event["step"], "kind": event["kind"], "steps": steps,
+                   "step_ms": (t2 - t) * 1000, "event_ms": (clock() - t2) * 1000}
+            self.rows.append(row)
+            if progress:
+                progress(row)
+        return self.rows
+
+    def summary(self):
+        rows = self.rows
+        steps = sum(r["steps"] for r in rows)
+        step_ms = sum(r["step_ms"] for r in rows)
+        event_ms = sum(r["event_ms"] for r in rows)
+        return {"events": len(rows), "steps": steps, "step_ms": step_ms, "event_ms": event_ms,
+                "steps_per_sec": steps / step_ms * 1000 if step_ms else 0,
+                "matches": self.matches}
+
+def report(rows, out, slowest=10):
+    # the stretches between events with the highest cost per step
+    stretches = sorted([r for r in rows if r["steps"]], key=lambda r: -r["step_ms"] / r["steps"])
+    out.write("%-8s %-14s %8s %10s %10s\n" % ("step", "until", "steps", "ms", "ms/step"))
+    for r in stretches[:slowest]:
+        out.write("%-8d %-14s %8d %10.2f %10.4f\n" % (r["step"], r["kind"], r["steps"], r["step_ms"],
+                                                   r["step_ms"] / r["steps"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded GUI session headless and time it.")
+    parser.add_argument("session", help="session directory (python mechuilibria.py --record DIR)")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="replays to run, the best one is reported")
+    parser.add_argument("--profile", help="time each phase of the step and write the profile here (.json/.csv)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every event as it is replayed")
+    parser.add_argument("--split", type=int, default=4,
+                        help="also replay at most this many steps per step() call and check it ends the same (0 to skip)")
+    args = parser.parse_args(argv)
+
+    best = None
+    for i in range(args.repeat):
+        p = player(args.session)
+        if args.profile:
+            # the whole replay as one frame
+            p.sim.profiler = profiler.profiler()
+            p.sim.profiler.begin_frame()
+        progress = None
+        if args.verbose:
+            progress = lambda r: print("%8d %-14s %8d steps %9.2f ms %7.3f ms" % (
+                r["step"], r["kind"], r["steps"], r["step_ms"], r["event_ms"]))
+        p.play(progress)
+        if best is None or p.summary()["step_ms"] < best.summary()["step_ms"]:
+            best = p
+
+    s = best.summary()
+    print("%d events, %d steps in %.1f ms (%.0f steps/s), events %.1f ms" % (
+        s["events"], s["steps"], s["step_ms"], s["steps_per_sec"], s["event_ms"]))
+    failed = s["matches"] is False
+    if s["matches"] is not None:
+        print("final state " + ("matches the session" if s["matches"] else "DIFFERS from the session"))
+    report(best.rows, sys.stdout)
+    if args.profile:
+        best.sim.profiler.end_frame()
+        best.sim.profiler.dump(args.profile)
+
+    if args.split:
+        p = player(args.session, args.split)
+        p.play()
+        same = checksum(p.sim) == checksum(best.sim)
+        print("replayed %d steps per call: %s" % (args.split, "same final state" if same else "DIFFERENT final state"))
+        failed = failed or not same
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import math
+
+import numpy as np
+
+from engine import *
+import implicit
+
+########################
+#     ARRAY WORLD      #
+########################
+
+# structure-of-arrays version of engine.world: the same physics, but
+# every point and link lives in a row of a numpy array and each phase
+# of a step is one vectorized pass over all of them
+class array_world():
+    def __init__(self, pos, vel, mass, static, link_i, link_j, rest, k,
+                 force_idx=None, force_vec=None, floor=None,
+                 dt=0.0025, gravity=(0, -9.81), drag_coeff=drag_coeff, axis=None,
+                 integrator="explicit"):
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(-1, 2)
+        self.vel = np.ascontiguousarray(vel, dtype=np.float64).reshape(-1, 2)
+        self.mass = np.ascontiguousarray(mass, dtype=np.float64)
+        self.static = np.ascontiguousarray(static, dtype=bool)
+
+        self.link_i = np.ascontiguousarray(link_i, dtype=np.intp)
+        self.link_j = np.ascontiguousarray(link_j, dtype=np.intp)
+        self.rest = np.ascontiguousarray(rest, dtype=np.float64)
+        self.k = np.ascontiguousarray(k, dtype=np.float64)
+
+        if force_idx is None:
+            force_idx = np.zeros(0, dtype=np.intp)
+            force_vec = np.zeros((0, 2))
+        self.force_idx = np.ascontiguousarray(force_idx, dtype=np.intp)
+        self.force_vec = np.ascontiguousarray(force_vec, dtype=np.float64).reshape(-1, 2)
+
+        # (N, 2) unit axes, rows of zeros mean "not limited"
+        if axis is None:
+            axis = np.zeros_like(self.pos)
+        self.axis = np.ascontiguousarray(axis, dtype=np.float64).reshape(-1, 2)
+
+        self.floor = floor
+        self.dt = dt
+        self.gravity = np.array([gravity[0], gravity[1]], dtype=np.float64)
+        self.drag_coeff = drag_coeff
+
+        # "explicit" (semi-implicit Euler, like engine.world),
+        # "implicit" (backward Euler, see implicit.py) or "adaptive"
+        # (explicit with step doubling, see engine.world)
+        self.integrator = integrator
+        self.cg_iterations = 0
+        self.tolerance = 1E-2
+        self.dt_min = 1E-5
+        self.dt_max = 0.05
+        self.last_dt = dt
+        self.rejected_steps = 0
+
+        self.time = 0
+        self.steps = 0
+        # set to a diagnostics.diagnostics to sample energy and momentum,
+        # in a vectorized pass of its own every `every` steps
+        self.diagnostics = None
+
+        # object world this was built from, if any (see sync())
+        self.points = None
+
+        self.update_masks()
+
+    def update_masks(self):
+        # call after changing static flags or limit axes in place
+        self.free = (~self.static).astype(np.float64)[:, None]
+        self.limited = np.flatnonzero(self.axis.any(axis=1))
+
+    def get_num_points(self):
+        return len(self.pos)
+
+    def get_num_links(self):
+        return len(self.link_i)
+
+    def link_lengths(self):
+        d = self.pos[self.link_j] - self.pos[self.link_i]
+        return np.hypot(d[:, 0], d[:, 1])
+
+    def net_forces(self):
+        n = len(self.pos)
+        pos = self.pos
+        vel = self.vel
+        mass = self.mass
+        dt = self.dt
+        g = self.gravity
+
+        fx = np.zeros(n)
+        fy = np.zeros(n)
+
+        floor = self.floor
+        if floor:
+            # normal force, same impulse-like response as ground.apply_force
+            below = pos[:, 1] < floor.height
+            if below.any():
+                m = mass[below]
+                fy[below] += m * vel[below, 1] * -1 * (floor.elasticity + 1) / dt
+                fx[below] += g[0] * m
+                fy[below] += g[1] * m
+                pos[below, 1] = floor.height
+
+            # friction
+            on = pos[:, 1] <= floor.height
+            if on.any():
+                fx[on] -= np.sign(vel[on, 0]) * mass[on] * math.hypot(g[0], g[1]) * floor.k
+
+        if len(self.force_idx):
+            fx += np.bincount(self.force_idx, weights=self.force_vec[:, 0], minlength=n)
+            fy += np.bincount(self.force_idx, weights=self.force_vec[:, 1], minlength=n)
+
+        if len(self.link_i):
+            d = pos[self.link_j] - pos[self.link_i]
+            length = np.hypot(d[:, 0], d[:, 1])
+            # force on p1 along p1 -> p2; zero-length links push nowhere
+            scale = np.divide(self.k * (length - self.rest), length,
+                              out=np.zeros_like(length), where=length > 0)
+            lfx = d[:, 0] * scale
+            lfy = d[:, 1] * scale
+            fx += np.bincount(self.link_i, weights=lfx, minlength=n)
+            fy += np.bincount(self.link_i, weights=lfy, minlength=n)
+            fx -= np.bincount(self.link_j, weights=lfx, minlength=n)
+            fy -= np.bincount(self.link_j, weights=lfy, minlength=n)
+
+        # gravity
+        fx += g[0] * mass
+        fy += g[1] * mass
+
+        # drag, -v_hat * |v|^2 * c
+        speed = np.hypot(vel[:, 0], vel[:, 1])
+        fx -= vel[:, 0] * speed * self.drag_coeff
+        fy -= vel[:, 1] * speed * self.drag_coeff
+
+        return np.column_stack((fx, fy))
+
+    def explicit_step(self, dt):
+        accel = self.net_forces() / self.mass[:, None]
+
+        self.vel += accel * (dt * self.free)
+        if len(self.limited):
+            ax = self.axis[self.limited]
+            v = self.vel[self.limited]
+            self.vel[self.limited] = ax * (v * ax).sum(axis=1)[:, None]
+
+        self.pos += self.vel * (dt * self.free)
+
+    def adaptive_step(self):
+        # step doubling, as engine.world.step_adaptive
+        pos = self.pos.copy()
+        vel = self.vel.copy()
+        h = tried = self.dt
+        while True:
+            self.dt = h
+            self.explicit_step(h)
+            full_pos = self.pos.copy()
+            full_vel = self.vel.copy()
+
+            self.pos[:] = pos
+            self.vel[:] = vel
+            self.dt = h / 2
+            self.explicit_step(h / 2)
+            self.explicit_step(h / 2)
+
+            err = 0
+            if len(pos):
+                err = max(np.abs(self.pos - full_pos).max(), h * np.abs(self.vel - full_vel).max())
+            if err <= self.tolerance or h <= self.dt_min:
+                break
+            self.rejected_steps += 1
+            h = next_dt(h, err, self.tolerance, self.dt_min, h)
+            self.pos[:] = pos
+            self.vel[:] = vel
+
+        self.last_dt = h
+        self.dt = next_dt(h, err, self.tolerance, self.dt_min, h if h < tried else self.dt_max)
+        return h
+
+    def step(self, n=1):
+        diag = self.diagnostics
+        for i in range(n):
+            if diag and self.steps % diag.every == 0:
+                diag.measure()
+
+            dt = self.dt
+            if self.integrator == "implicit":
+                self.cg_iterations = implicit.backward_euler_step(self)
+            elif self.integrator == "adaptive":
+                dt = self.adaptive_step()
+            else:
+                self.explicit_step(dt)
+
+            self.steps += 1
+            self.time += dt
+
+    def run_until(self, t, max_steps=None):
+        if self.integrator == "adaptive":
+            run_until_adaptive(self, t, max_steps)
+            return
+
+        n = math.ceil((t - self.time)/self.dt - 1E-9)
+        if max_steps is not None:
+            n = min(n, max_steps)
+        if n > 0:
+            self.step(n)
+
+    def sync(self):
+        # write positions and velocities back into the point objects
+        # this array world was built from
+        for p, (x, y), (vx, vy) in zip(self.points, self.pos.tolist(), self.vel.tolist()):
+            p.pos.set(x, y)
+            p.vel.set(vx, vy)
+
+    def load(self, sim):
+        # positions and velocities, and the settings a world can change
+        # without its version changing, from the object world this array
+        # world was built from (the other way round from sync())
+        self.pos[:] = [(p.pos.x, p.pos.y) for p in sim.points]
+        self.vel[:] = [(p.vel.x, p.vel.y) for p in sim.points]
+        self.floor = sim.floor
+        self.dt = sim.dt
+        self.gravity[:] = (sim.gravity.x, sim.gravity.y)
+        self.drag_coeff = sim.drag_coeff
+        self.integrator = sim.integrator
+        self.time = sim.time
+        self.steps = sim.steps
+
+def from_world(sim):
+    points = sim.points
+    index = {p: i for i, p in enumerate(points)}
+
+    pos = [(p.pos.x, p.pos.y) for p in points]
+    vel = [(p.vel.x, p.vel.y) for p in points]
+    axis = [(p.limit_axis.x, p.limit_axis.y) if p.limit_axis else (0, 0) for p in points]
+
+    result = array_world(pos, vel,
+                         [p.mass for p in points],
+                         [bool(p.static) for p in points],
+                         [index[l.p1] for l in sim.links],
+                         [index[l.p2] for l in sim.links],
+                         [l.dist for l in sim.links],
+                         [l.k for l in sim.links],
+                         [index[f.point] for f in sim.forces],
+                         [(f.force.x, f.force.y) for f in sim.forces],
+                         floor=sim.floor, dt=sim.dt,
+                         gravity=(sim.gravity.x, sim.gravity.y),
+                         drag_coeff=sim.drag_coeff, axis=axis,
+                         integrator=sim.integrator)
+
+    result.tolerance = sim.tolerance
+    result.dt_min = sim.dt_min
+    result.dt_max = sim.dt_max
+    result.points = points
+    result.time = sim.time
+    result.steps = sim.steps
+    return result
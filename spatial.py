@@ -0,0 +1,217 @@
+import math
+
+########################
+#     UNIFORM GRID     #
+########################
+
+# buckets (x, y) positions into square cells so nearest-item queries only
+# look at the cells around the query point
+class uniform_grid():
+    def __init__(self, items, positions, cell=None):
+        self.items = items
+        self.positions = positions
+        self.cells = {}
+
+        if not positions:
+            self.cell = 1
+            self.blocks = {}
+            return
+
+        xs = [x for x, y in positions]
+        ys = [y for x, y in positions]
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        self.max_x = max(xs)
+        self.max_y = max(ys)
+
+        if cell is None:
+            # about two items per cell on average, and no finer than one
+            # cell per item along the longer side so long thin scenes
+            # (chains, a row of points) don't end up with huge empty grids
+            w = self.max_x - self.min_x
+            h = self.max_y - self.min_y
+            cell = max(math.sqrt(2 * w * h / len(positions)), max(w, h) / len(positions))
+            if cell <= 0:
+                cell = 1
+        self.cell = cell
+
+        cells = self.cells
+        floor = math.floor
+        keys = [(floor(x / cell), floor(y / cell)) for x, y in positions]
+        for i, key in enumerate(keys):
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [i]
+            else:
+                bucket.append(i)
+
+        # occupied cells grouped into blocks of block x block cells, for
+        # queries far away from everything (see scan())
+        self.block = 8
+        self.blocks = {}
+        for kx, ky in cells:
+            key = (kx // self.block, ky // self.block)
+            if key in self.blocks:
+                self.blocks[key].append((kx, ky))
+            else:
+                self.blocks[key] = [(kx, ky)]
+
+        self.min_cx = math.floor(self.min_x / cell)
+        self.min_cy = math.floor(self.min_y / cell)
+        self.max_cx = math.floor(self.max_x / cell)
+        self.max_cy = math.floor(self.max_y / cell)
+
+    def nearest(self, x, y):
+        # ties go to the item that comes first, like a linear scan would
+        if not self.positions:
+            return None
+
+        cell = self.cell
+        cells = self.cells
+        positions = self.positions
+        cx = math.floor(x / cell)
+        cy = math.floor(y / cell)
+
+        # rings closer than the occupied block of cells are all empty
+        gap = max(self.min_cx - cx, cx - self.max_cx, self.min_cy - cy, cy - self.max_cy, 0)
+        last = max(cx - self.min_cx, self.max_cx - cx, cy - self.min_cy, self.max_cy - cy)
+        r = max(gap - 1, 0)
+
+        best = None
+        best_dist = math.inf
+        visited = 0
+        while r <= last:
+            keys = ring(cx, cy, r)
+            visited += len(keys)
+            if r > self.block or visited > len(cells):
+                # far from everything: walking more rings would cost more
+                # than going through the occupied blocks directly
+                return self.items[self.scan(x, y, best, best_dist)]
+
+            for key in keys:
+                bucket = cells.get(key)
+                if bucket:
+                    for i in bucket:
+                        px, py = positions[i]
+                        d = (px - x)**2 + (py - y)**2
+                        if d < best_dist or (d == best_dist and i < best):
+                            best = i
+                            best_dist = d
+
+            # anything in ring r+1 is at least r cells away
+            if best is not None and math.sqrt(best_dist) <= r * cell:
+                break
+            r += 1
+
+        return self.items[best]
+
+    def scan(self, x, y, best, best_dist):
+        # finish a nearest query block by block, closest blocks first,
+        # stopping once the next block is further than the best so far
+        size = self.cell * self.block
+        candidates = []
+        for (bx, by) in self.blocks:
+            dx = max(bx * size - x, 0, x - (bx + 1) * size)
+            dy = max(by * size - y, 0, y - (by + 1) * size)
+            candidates.append((dx*dx + dy*dy, bx, by))
+        candidates.sort()
+
+        cells = self.cells
+        positions = self.positions
+        for block_dist, bx, by in candidates:
+            if block_dist > best_dist:
+                break
+            for key in self.blocks[(bx, by)]:
+                for i in cells[key]:
+                    px, py = positions[i]
+                    d = (px - x)**2 + (py - y)**2
+                    if d < best_dist or (d == best_dist and i < best):
+                        best = i
+                        best_dist = d
+        return best
+
+def ring(cx, cy, r):
+    if r == 0:
+        return [(cx, cy)]
+
+    keys = []
+    for i in range(-r, r + 1):
+        keys.append((cx + i, cy - r))
+        keys.append((cx + i, cy + r))
+    for j in range(-r + 1, r):
+        keys.append((cx - r, cy + j))
+        keys.append((cx + r, cy + j))
+    return keys
+
+########################
+#     PICKING INDEX    #
+########################
+
+# nearest point / link midpoint / force arrow tip for mouse picking. The
+# grids are built for the state the world is in and rebuilt when it has
+# stepped or changed since. For a background.frame, the physics thread
+# builds them (build()) before it publishes the frame, so the GUI only
+# ever queries.
+class pick_index():
+    kinds = ("point", "link", "force")
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.grids = {}
+
+    def stamp(self):
+        sim = self.sim
+        return (getattr(sim, "version", None), sim.steps,
+                len(sim.points), len(sim.links), len(sim.forces))
+
+    def grid(self, kind):
+        # the grid of kind, built if there is no up to date one
+        stamp = self.stamp()
+        cached = self.grids.get(kind)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        grid = uniform_grid(*self.items(kind))
+        self.grids[kind] = (stamp, grid)
+        return grid
+
+    def build(self):
+        for kind in self.kinds:
+            self.grid(kind)
+        return self
+
+    def items(self, kind):
+        # (items, positions) of kind
+        sim = self.sim
+        if hasattr(sim, "positions"):
+            # a background.frame has positions as they were when it was
+            # taken, and the links and forces as places in them
+            positions = sim.positions
+            if kind == "point":
+                return sim.points, positions
+            if kind == "link":
+                return sim.links, [((positions[i][0] + positions[j][0])/2, (positions[i][1] + positions[j][1])/2)
+                                   for i, j in sim.link_ends]
+            return sim.forces, [(positions[i][0] + f.force.x * 100, positions[i][1] + f.force.y * 100)
+                                for f, i in zip(sim.forces, sim.force_points)]
+
+        if kind == "point":
+            items = list(sim.points)
+            return items, [(p.pos.x, p.pos.y) for p in items]
+        if kind == "link":
+            items = list(sim.links)
+            return items, [((l.p1.pos.x + l.p2.pos.x)/2, (l.p1.pos.y + l.p2.pos.y)/2) for l in items]
+        items = list(sim.forces)
+        return items, [(f.point.pos.x + f.force.x * 100, f.point.pos.y + f.force.y * 100) for f in items]
+
+    def nearest(self, kind, x, y):
+        return self.grid(kind).nearest(x, y)
+
+    def closest_point(self, x, y):
+        return self.nearest("point", x, y)
+
+    def closest_link(self, x, y):
+        return self.nearest("link", x, y)
+
+    def closest_force(self, x, y):
+        return self.nearest("force", x, y)
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import sys
+import time
+
+from engine import *
+import scenes
+import diagnostics
+import islands
+
+########################
+#     PARAMETERS       #
+########################
+
+# how each sweep parameter is applied to a freshly built world
+def set_link_k(sim, value):
+    for l in sim.links:
+        l.k = value
+
+def scale_link_k(sim, value):
+    for l in sim.links:
+        l.k *= value
+
+def set_point_mass(sim, value):
+    for p in sim.points:
+        p.mass = value
+
+def scale_point_mass(sim, value):
+    for p in sim.points:
+        p.mass *= value
+
+def set_drag_coeff(sim, value):
+    sim.drag_coeff = value
+
+def set_floor_elasticity(sim, value):
+    sim.floor.elasticity = value
+
+def set_floor_k(sim, value):
+    sim.floor.k = value
+
+def scale_forces(sim, value):
+    for f in sim.forces:
+        f.force = f.force * value
+
+def set_dt(sim, value):
+    sim.dt = value
+
+def set_integrator(sim, value):
+    sim.integrator = value
+
+parameters = {"link_k": set_link_k,
+              "link_k_scale": scale_link_k,
+              "point_mass": set_point_mass,
+              "mass_scale": scale_point_mass,
+              "drag_coeff": set_drag_coeff,
+              "floor_elasticity": set_floor_elasticity,
+              "floor_k": set_floor_k,
+              "force_scale": scale_forces,
+              "dt": set_dt,
+              "integrator": set_integrator}
+
+# parameters that only make sense for a scene with a floor
+floor_parameters = {"floor_elasticity", "floor_k"}
+
+def expand_grid(grid):
+    # {"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[n] for n in names])]
+
+########################
+#       VARIANT        #
+########################
+
+def point_columns(points):
+    names = [p.get_name() for p in points]
+    if len(set(names)) < len(names) or not all(names):
+        names = ["p" + str(i) for i in range(len(points))]
+    return names
+
+def state_of(sim):
+    # positions, velocities and link lengths as plain lists for either
+    # kind of world
+    if hasattr(sim, "link_lengths"):
+        return sim.pos.tolist(), sim.vel.tolist(), sim.link_lengths().tolist()
+
+    pos = [(p.pos.x, p.pos.y) for p in sim.points]
+    vel = [(p.vel.x, p.vel.y) for p in sim.points]
+    lengths = [get_dist_between(l.p1, l.p2) for l in sim.links]
+    return pos, vel, lengths
+
+def extent(points):
+    # the longer side of the points' bounding box
+    xs = [p.pos.x for p in points]
+    ys = [p.pos.y for p in points]
+    return max(max(xs, default=0) - min(xs, default=0), max(ys, default=0) - min(ys, default=0))
+
+def run_variant(job):
+    scene, params, duration, sample_every, settle_tol, settle_window, backend = job
+
+    sim = scenes.get_scene(scene)
+    for name, value in params.items():
+        parameters[name](sim, value)
+
+    columns = point_columns(sim.points)
+    rest = [l.dist for l in sim.links]
+    # settling is judged against the size, as built, of the structure
+    # each point belongs to (of the whole scene for a lone point)
+    tols = dict.fromkeys(sim.points, settle_tol * extent(sim.points))
+    for isl in islands.find_islands(sim.points, sim.links, sim.forces)[0]:
+        size = extent(isl.points)
+        if size > 0:
+            for p in isl.points:
+                tols[p] = settle_tol * size
+    tols = [tols[p] for p in sim.points]
+    if backend == "soa":
+        import soa
+        sim = soa.from_world(sim)
+    # energy totals once per sample; a blow-up ends the variant early
+    sim.diagnostics = diag = diagnostics.diagnostics(sim, every=sample_every, history=1, links=False)
+
+    max_strain = 0
+    settle_time = 0
+    # [x0, y0, x1, y1] each point has moved within since window_start
+    ranges = None
+    window_start = sim.time
+    start = time.perf_counter()
+    exploded = False
+
+    # counted in steps, as adding up dt drifts: 800 steps of 0.0025 come
+    # to just under 2 s. The adaptive integrator's dt varies, so it goes
+    # by time
+    adaptive = sim.integrator == "adaptive"
+    total = round(duration / sim.dt)
+    while (sim.time < duration - 1E-9) if adaptive else (sim.steps < total):
+        sim.step(sample_every if adaptive else min(sample_every, total - sim.steps))
+        pos, vel, lengths = state_of(sim)
+
+        if diag.blown_up is not None or not all(math.isfinite(x) and math.isfinite(y) for x, y in pos):
+            exploded = True
+            break
+
+        strain = max([abs(l - r) / r for l, r in zip(lengths, rest) if r > 0], default=0)
+        max_strain = max(max_strain, strain)
+
+        # settle time is the end of the last sample at which some point
+        # had moved further than tol within the current settle_window.
+        # A speed limit would call a slow swing settled and a small fast
+        # vibration not
+        if ranges is None or sim.time - window_start >= settle_window:
+            ranges = [[x, y, x, y] for x, y in pos]
+            window_start = sim.time
+        else:
+            for r, (x, y) in zip(ranges, pos):
+                if x < r[0]:
+                    r[0] = x
+                elif x > r[2]:
+                    r[2] = x
+                if y < r[1]:
+                    r[1] = y
+                elif y > r[3]:
+                    r[3] = y
+            if any(max(r[2] - r[0], r[3] - r[1]) > tol for r, tol in zip(ranges, tols)):
+                settle_time = sim.time
+
+    row = dict(params)
+    row["steps"] = sim.steps
+    row["wall_time"] = time.perf_counter() - start
+    row["exploded"] = exploded
+    row["max_strain"] = max_strain
+    row["energy_gain"] = diag.worst_gain
+    row["blown_up"] = diag.blown_up if diag.blown_up is not None else ""
+    # and it has to have stayed settled for a whole window since, which a
+    # slow swing near the end of its arc doesn't
+    settled = not exploded and sim.time - settle_time >= settle_window - 1E-9
+    row["settle_time"] = settle_time if settled else ""
+
+    pos = state_of(sim)[0]
+    for name, (x, y) in zip(columns, pos):
+        row[name + ".x"] = x
+        row[name + ".y"] = y
+
+    return row
+
+########################
+#       SWEEP          #
+########################
+
+# runs every combination in grid on a process pool and returns one row
+# (a dict) per combination, in grid order
+def sweep(scene, grid, duration=10, sample_every=40, settle_tol=0.01, settle_window=3,
+          backend="object", processes=None):
+    if floor_parameters & set(grid) and scenes.get_scene(scene).floor is None:
+        raise ValueError("scene '" + scene + "' has no floor to set " + ", ".join(sorted(floor_parameters & set(grid))) + " on")
+
+    jobs = [(scene, params, duration, sample_every, settle_tol, settle_window, backend)
+            for params in expand_grid(grid)]
+
+    if processes == 1:
+        return [run_variant(job) for job in jobs]
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(run_variant, jobs, chunksize=1)
+
+def write_table(rows, out):
+    columns = []
+    for row in rows:
+        for c in row:
+            if not c in columns:
+                columns.append(c)
+
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(rows)
+
+def parse_value(text):
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+def parse_param(text):
+    # "name=v1,v2,..." or "name=start:stop:count" for an evenly spaced range
+    name, _, values = text.partition("=")
+    if not name in parameters:
+        raise argparse.ArgumentTypeError("unknown parameter '" + name + "', expected one of: " + ", ".join(parameters))
+
+    if values.count(":") == 2:
+        start, stop, count = values.split(":")
+        start, stop, count = float(start), float(stop), int(count)
+        if count < 2:
+            return name, [start]
+        return name, [start + (stop - start) * i / (count - 1) for i in range(count)]
+
+    return name, [parse_value(v) for v in values.split(",")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a scene headless across a grid of parameters.")
+    parser.add_argument("scene", help="scene name (" + ", ".join(sorted(scenes.builders)) + ")")
+    parser.add_argument("-p", "--param", action="append", type=parse_param, default=[],
+                        help="name=v1,v2,... or name=start:stop:count, repeatable (" + ", ".join(parameters) + ")")
+    parser.add_argument("-t", "--duration", type=float, default=10, help="simulated seconds per variant")
+    parser.add_argument("--sample-every", type=int, default=40, help="steps between metric samples")
+    parser.add_argument("--settle-tol", type=float, default=0.01,
+                        help="fraction of the structure's size its points may still move by and count as settled")
+    parser.add_argument("--settle-window", type=float, default=3, help="simulated seconds the movement is measured over")
+    parser.add_argument("--backend", choices=("object", "soa"), default="object")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("-o", "--out", help="CSV file to write, default stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        rows = sweep(args.scene, dict(args.param), args.duration, args.sample_every,
+                     args.settle_tol, args.settle_window, args.backend, args.processes)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.out:
+        with open(args.out, "w", newline="") as out:
+            write_table(rows, out)
+    else:
+        write_table(rows, sys.stdout)
+
+if __name__ == "__main__":
+    main()
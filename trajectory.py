@@ -0,0 +1,209 @@
+import json
+import os
+
+import numpy as np
+
+from engine import *
+import scenefile
+
+# A recording is a directory:
+#
+#   meta.json     sizes, sampling interval, frame count
+#   scene.npz     the world as it was when recording started (topology,
+#                 names, colours), see scenefile.py
+#   time.f64      (frames,)       simulated time of each frame
+#   pos.f64       (frames, N, 2)  point positions
+#   vel.f64       (frames, N, 2)  point velocities
+#   lengths.f64   (frames, M)     link lengths
+#
+# The .f64 files are raw little-endian float64, so anything that can
+# memory-map a file can read slices of them without loading the rest.
+
+dtype = np.dtype("<f8")
+
+def frame_state(sim):
+    # (pos, vel, lengths) arrays for either kind of world
+    if hasattr(sim, "link_lengths"):
+        return sim.pos, sim.vel, sim.link_lengths()
+
+    points = sim.points
+    pos = np.array([(p.pos.x, p.pos.y) for p in points], dtype=np.float64).reshape(-1, 2)
+    vel = np.array([(p.vel.x, p.vel.y) for p in points], dtype=np.float64).reshape(-1, 2)
+    index = {p: i for i, p in enumerate(points)}
+    i = np.array([index[l.p1] for l in sim.links], dtype=np.intp)
+    j = np.array([index[l.p2] for l in sim.links], dtype=np.intp)
+    d = pos[j] - pos[i]
+    return pos, vel, np.hypot(d[:, 0], d[:, 1])
+
+########################
+#      RECORDER        #
+########################
+
+# appends frames to the files through a memory-mapped window of `chunk`
+# frames; when the window is full it is flushed and the next one mapped,
+# so memory use stays the same however long the run is
+class recorder():
+    def __init__(self, sim, path, every=1, chunk=256):
+        self.sim = sim
+        self.path = path
+        self.every = every
+        self.chunk = chunk
+
+        os.makedirs(path, exist_ok=True)
+        scenefile.save(sim, os.path.join(path, "scene.npz"))
+
+        pos, vel, lengths = frame_state(sim)
+        self.n_points = len(pos)
+        self.n_links = len(lengths)
+        self.frames = 0
+
+        # per stream: file name and shape of one frame
+        self.streams = {"time": (), "pos": (self.n_points, 2), "vel": (self.n_points, 2), "lengths": (self.n_links,)}
+        self.files = {}
+        self.windows = {}
+        self.window_start = 0
+        for name in self.streams:
+            self.files[name] = open(os.path.join(path, name + ".f64"), "wb+")
+
+        self.write_meta()
+
+    def write_meta(self):
+        meta = {"n_points": self.n_points, "n_links": self.n_links, "frames": self.frames,
+                "every": self.every, "dt": self.sim.dt, "dtype": dtype.str}
+        with open(os.path.join(self.path, "meta.json"), "w") as out:
+            json.dump(meta, out)
+
+    def map_window(self):
+        self.flush_window()
+        self.window_start = self.frames
+
+        for name, shape in self.streams.items():
+            frame_bytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+            f = self.files[name]
+            f.truncate((self.frames + self.chunk) * frame_bytes)
+            if frame_bytes:
+                self.windows[name] = np.memmap(f, dtype=dtype, mode="r+",
+                                               offset=self.frames * frame_bytes,
+                                               shape=(self.chunk,) + shape)
+            else:
+                self.windows[name] = np.zeros((self.chunk,) + shape, dtype=dtype)
+
+    def flush_window(self):
+        for window in self.windows.values():
+            if isinstance(window, np.memmap):
+                window.flush()
+        self.windows = {}
+
+    def capture(self):
+        pos, vel, lengths = frame_state(self.sim)
+        if len(pos) != self.n_points or len(lengths) != self.n_links:
+            raise ValueError("points or links were added or removed while recording")
+
+        if not self.windows or self.frames - self.window_start >= self.chunk:
+            self.map_window()
+
+        row = self.frames - self.window_start
+        self.windows["time"][row] = self.sim.time
+        self.windows["pos"][row] = pos
+        self.windows["vel"][row] = vel
+        self.windows["lengths"][row] = lengths
+        self.frames += 1
+
+    def step(self, n=1):
+        # step the world n times, capturing every `every` steps
+        while n > 0:
+            todo = min(n, self.every - self.sim.steps % self.every)
+            self.sim.step(todo)
+            n -= todo
+            if self.sim.steps % self.every == 0:
+                self.capture()
+
+    def close(self):
+        self.flush_window()
+        # drop the unused tail of the last window
+        for name, shape in self.streams.items():
+            f = self.files[name]
+            f.truncate(self.frames * dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+            f.close()
+        self.write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def record(sim, path, steps, every=1, chunk=256):
+    with recorder(sim, path, every, chunk) as rec:
+        rec.capture()
+        rec.step(steps)
+    return trajectory(path)
+
+########################
+#     TRAJECTORY       #
+########################
+
+# read side: every stream is a read-only memmap of the whole file, so
+# slicing touches only the frames asked for
+class trajectory():
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as src:
+            self.meta = json.load(src)
+
+        self.frames = self.meta["frames"]
+        n, m = self.meta["n_points"], self.meta["n_links"]
+        self.time = self.open("time", ())
+        self.pos = self.open("pos", (n, 2))
+        self.vel = self.open("vel", (n, 2))
+        self.lengths = self.open("lengths", (m,))
+
+    def open(self, name, shape):
+        if self.frames == 0 or 0 in shape:
+            return np.zeros((self.frames,) + shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name + ".f64"), dtype=dtype, mode="r",
+                         shape=(self.frames,) + shape)
+
+    def __len__(self):
+        return self.frames
+
+    def scene(self):
+        # the recorded world as (world, cameras), positioned at frame 0
+        return scenefile.load(os.path.join(self.path, "scene.npz"))
+
+    def frame_at(self, t):
+        # last frame recorded at or before simulated time t
+        i = int(np.searchsorted(self.time, t, side="right")) - 1
+        return min(max(i, 0), self.frames - 1)
+
+########################
+#      REPLAYER        #
+########################
+
+# drives a world's points from a recording instead of simulating them,
+# so the canvas can show a run without recomputing it
+class replayer():
+    def __init__(self, traj, sim):
+        self.traj = traj
+        self.sim = sim
+        self.frame = 0
+        self.time = traj.time[0] if len(traj) else 0
+
+    def show(self, i):
+        self.frame = i
+        pos = self.traj.pos[i].tolist()
+        vel = self.traj.vel[i].tolist()
+        for p, (x, y), (vx, vy) in zip(self.sim.points, pos, vel):
+            p.pos.set(x, y)
+            p.vel.set(vx, vy)
+        self.sim.time = float(self.traj.time[i])
+
+    def advance(self, elapsed):
+        # move on by `elapsed` seconds of simulated time, wrapping around
+        # at the end of the recording
+        if not len(self.traj):
+            return
+        self.time += elapsed
+        if self.time > self.traj.time[-1]:
+            self.time = self.traj.time[0]
+        self.show(self.traj.frame_at(self.time))
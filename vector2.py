@@ -1,4 +1,8 @@
+import math
+
 class vec2:
+    __slots__ = ("x", "y")
+
     def __init__(self, x=0, y=0):
         self.x = x
         self.y = y
@@ -7,14 +11,33 @@ class vec2:
         return self.x * ov.x + self.y * ov.y
 
     def mag(self):
-        return (self.x**2 + self.y**2)**(0.5)
+        return math.hypot(self.x, self.y)
 
     def normalized(self):
-        if self.mag():
-            return vec2(self.x/self.mag(), self.y/self.mag())
+        mag = self.mag()
+        if mag:
+            return vec2(self.x/mag, self.y/mag)
         else:
             return vec2()
 
+    def copy(self):
+        return vec2(self.x, self.y)
+
+    def dist(self, ov):
+        return math.hypot(self.x - ov.x, self.y - ov.y)
+
+    # in-place helpers for the hot paths; they modify and return self
+    def set(self, x, y):
+        self.x = x
+        self.y = y
+        return self
+
+    def add_scaled(self, ov, s):
+        # self += ov * s without the temporary
+        self.x += ov.x * s
+        self.y += ov.y * s
+        return self
+
     def __repr__(self):
         return "<" + str(self.x) + ", " + str(self.y) + ">"
 
@@ -30,3 +53,22 @@ class vec2:
     def __truediv__(self, s):
         return vec2(self.x / s, self.y / s)
 
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, s):
+        self.x *= s
+        self.y *= s
+        return self
+
+    def __itruediv__(self, s):
+        self.x /= s
+        self.y /= s
+        return self